@@ -0,0 +1,53 @@
+"""
+Benchmark for EloCalculator.calculate_elo_ratings_for_each_match.
+
+Tiles a processed season from data/processed-data into inputs of 380 to 380k matches, and times the calculation
+(replay, building the per-match output and writing it to a CSV file) at each size. The time per match should stay
+roughly constant as the number of matches grows.
+
+Run from the project root:
+    python -m benchmarks.bench_each_match
+"""
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from elo_ratings_calculator import EloCalculator
+
+SEASON_FILE = './data/processed-data/19-20.csv'
+SIZES = [380, 3800, 38000, 380000]
+
+
+def tile_season(season, nb_matches):
+    """
+    Repeats a season until it has `nb_matches` matches, shifting the timestamps of each copy so they stay in order.
+    """
+    nb_copies = -(-nb_matches // len(season))
+    span = season['date-start-timestamp'].max() - season['date-start-timestamp'].min() + 1
+    copies = []
+    for i in range(nb_copies):
+        copy = season.copy()
+        copy['date-start-timestamp'] += i * span
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True).iloc[:nb_matches]
+
+
+def main():
+    elo_calculator = EloCalculator('csv', SEASON_FILE)
+    season = elo_calculator.data
+    print(f"{'matches':>10} {'seconds':>10} {'us/match':>10}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for nb_matches in SIZES:
+            elo_calculator.data = tile_season(season, nb_matches)
+            start = time.perf_counter()
+            elo_calculator.calculate_elo_ratings_for_each_match('csv', os.path.join(output_dir, 'index.csv'))
+            elapsed = time.perf_counter() - start
+            print(f'{nb_matches:>10} {elapsed:>10.3f} {elapsed / nb_matches * 1e6:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Consistency checks of the vectorised code paths against their reference implementations.
+
+Each check runs on the processed seasons in data/processed-data, prints its largest discrepancy against its tolerance,
+and the script exits with status 1 if a check fails.
+
+Run from the project root:
+    python -m benchmarks.consistency_checks
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_each_match import tile_season
+from elo_ratings_calculator import EloCalculator, ClassicElo, GoalDifferenceElo, Glicko2, RatingEngine
+from elo_ratings_calculator.replay_kernel import replay_elo_ratings
+from simulation import SeasonSimulator
+from csv_handler import CSVHandler
+
+SEASON_FILE = './data/processed-data/19-20.csv'
+MATCH_RESULTS_FILE = './data/results/elo-ratings/19-20/match-data/index.csv'
+# largest difference in rating points allowed between the batched ClassicElo update and the replay kernel
+RATING_TOLERANCE = 1e-6
+# number of standard errors a simulated probability may be away from its exact value
+SAMPLING_TOLERANCE = 5
+
+
+class BatchedClassicElo(ClassicElo):
+    """
+    ClassicElo replayed in batches with its vectorised `update`, instead of with the replay kernel.
+    """
+    def replay(self, home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends=()):
+        return RatingEngine.replay(self, home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends)
+
+
+def check_batched_elo(nb_matches=38000):
+    """
+    Checks that replaying a tiled season in batches with the vectorised ClassicElo update gives the ratings of the replay kernel.
+    """
+    elo_calculator = EloCalculator('csv', SEASON_FILE)
+    elo_calculator.data = tile_season(elo_calculator.data, nb_matches)
+    teams, home_idx, away_idx, home_goals, away_goals, _ = elo_calculator._encoded_matches()
+    initial_ratings = np.full(len(teams), float(elo_calculator.initial_rating))
+    batched = BatchedClassicElo().replay(home_idx, away_idx, home_goals, away_goals, initial_ratings)
+    kernel = replay_elo_ratings(home_idx, away_idx, home_goals, away_goals, initial_ratings,
+                                elo_calculator.k_factors, elo_calculator.k_thresholds, elo_calculator.home_advantage)
+    discrepancy = max(np.abs(batched['post_home'] - kernel[2]).max(), np.abs(batched['post_away'] - kernel[3]).max())
+    return 'batched ClassicElo vs replay kernel (rating points)', discrepancy, RATING_TOLERANCE
+
+
+def check_side_by_side_elo():
+    """
+    Checks that the ClassicElo ratings replayed side by side with other engines are those of the replay kernel, bit for bit.
+    """
+    elo_calculator = EloCalculator('csv', SEASON_FILE)
+    replays = elo_calculator.replay_engines([ClassicElo(), GoalDifferenceElo(), Glicko2()])
+    kernel = elo_calculator.replay_matches()
+    discrepancy = max(np.abs(replays['elo'][column] - kernel[column]).max() for column in ['post_home', 'post_away'])
+    return 'ClassicElo side by side vs replay kernel (rating points)', discrepancy, 0.0
+
+
+def check_equal_strength_simulation(nb_simulations=200000):
+    """
+    Checks that teams of equal strength have equal simulated probabilities: before the first matchweek every team has the
+    initial rating and no goal difference, so each has a title probability of 1 / n_teams and a relegation probability of
+    relegated / n_teams. Returns the largest distance from those values, in standard errors.
+    """
+    season_simulator = SeasonSimulator(EloCalculator('csv', './data/processed-data/22-23.csv'), nb_simulations=nb_simulations, max_workers=1)
+    summary = season_simulator.simulate(week=0)['summary']
+    n_teams = len(summary)
+    discrepancy = 0.0
+    for column, probability in [('Title', 1 / n_teams), ('Relegation', season_simulator.relegated / n_teams)]:
+        standard_error = np.sqrt(probability * (1 - probability) / nb_simulations)
+        discrepancy = max(discrepancy, np.abs(summary[column].to_numpy() - probability).max() / standard_error)
+    return 'equal-strength title and relegation probabilities (standard errors)', discrepancy, SAMPLING_TOLERANCE
+
+
+def check_replay_without_odds():
+    """
+    Checks that match data with only the team names, goals and timestamps, without the bookmakers odds, is replayed to the
+    same weekly ratings as the full processed match data. Returns infinity if the ratings cannot be calculated.
+    """
+    elo_calculator = EloCalculator('csv', SEASON_FILE)
+    without_odds = EloCalculator('csv', SEASON_FILE)
+    without_odds.data = without_odds.data[['home-name', 'away-name', 'home-result', 'away-result', 'date-start-timestamp']]
+    snapshots = without_odds.calculate_weekly_snapshots()
+    if snapshots is None:
+        return 'weekly ratings without the odds columns (rating points)', np.inf, 0.0
+    discrepancy = np.abs(snapshots.to_numpy() - elo_calculator.calculate_weekly_snapshots().to_numpy()).max()
+    return 'weekly ratings without the odds columns (rating points)', discrepancy, 0.0
+
+
+def check_scatter_last_n_matches():
+    """
+    Checks that the Elo vs bookmakers scatter data holds the last `last_n_matches` matches, none for 0 and every match when
+    there are fewer. Returns the largest difference in the number of matches.
+    """
+    from grapher.plots.plot_elo_bookies_scatter import scatter_data
+    match_results = CSVHandler(use_cache=False).read_csv(MATCH_RESULTS_FILE)['data']
+    discrepancy = 0
+    for last_n_matches in [0, 1, 180, len(match_results), len(match_results) + 10]:
+        data = scatter_data(match_results, last_n_matches)
+        # every match is either a home win or a home loss
+        nb_matches = len(data['home_win'][0]) + len(data['home_loss'][0])
+        discrepancy = max(discrepancy, abs(nb_matches - min(last_n_matches, len(match_results))))
+    return 'scatter data of the last n matches (matches)', discrepancy, 0
+
+
+def check_batch_render_backend():
+    """
+    Checks that rendering scatter graphs in this process leaves the matplotlib backend of the caller unchanged. Returns 1 if
+    the backend has changed.
+    """
+    import tempfile
+    import matplotlib
+    from grapher.batch_render import render_scatter_batch
+    backend = matplotlib.get_backend()
+    matplotlib.use('pdf')
+    with tempfile.TemporaryDirectory() as output_dir:
+        render_scatter_batch([{'csv_file': MATCH_RESULTS_FILE, 'output_file': os.path.join(output_dir, 'scatter.png')}], max_workers=1)
+    changed = matplotlib.get_backend() != 'pdf'
+    matplotlib.use(backend)
+    return 'matplotlib backend changed by a serial batch render', int(changed), 0
+
+
+CHECKS = [check_batched_elo, check_side_by_side_elo, check_equal_strength_simulation, check_replay_without_odds,
+          check_scatter_last_n_matches, check_batch_render_backend]
+
+
+def main():
+    failed = False
+    for check in CHECKS:
+        name, discrepancy, tolerance = check()
+        status = 'ok' if discrepancy <= tolerance else 'FAILED'
+        failed = failed or status == 'FAILED'
+        print(f'{name:<65} {discrepancy:>12.3e} {tolerance:>12.3e} {status}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Benchmark suite for the Elo pipeline.
+
+Times JSONProcessor, the EloCalculator methods, CSVHandler I/O and plot_elo_bookies_scatter on synthetic leagues
+(see benchmarks/synthetic.py) of several sizes, as well as the startup time of the command line interface in main.py,
+and saves the timings to a JSON file. Passing the results of an earlier run with --compare prints the change of each
+timing and flags the regressions.
+
+Run from the project root:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --sizes small medium --output before.json
+    python -m benchmarks.run_benchmarks --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_matches, write_raw_json
+
+# name: (number of teams, number of seasons)
+SIZES = {
+    'small': (20, 1),
+    'medium': (20, 10),
+    'large': (20, 100),
+}
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# a timing is flagged as a regression when it is this much slower than the compared run
+DEFAULT_THRESHOLD = 1.2
+
+
+def benchmark_cases(workdir, matches):
+    """
+    Returns the benchmarked functions for one synthetic league, as a list of (name, function) pairs.
+    The inputs of the functions are prepared here, so only the benchmarked work is timed.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    from csv_handler import CSVHandler
+    from elo_ratings_calculator import EloCalculator, ClassicElo, GoalDifferenceElo, Glicko2, OrderedLogitModel, ResultCache
+    from evaluation import Evaluator
+    from grapher.plots import plot_elo_bookies_scatter
+    from match_results_generator import JSONProcessor
+    from match_store import MatchStore
+    from rating_archive import RatingArchive
+    from rating_service import RatingService
+    from simulation import SeasonSimulator
+
+    raw_dir = os.path.join(workdir, 'raw')
+    processed_file = os.path.join(workdir, 'processed.csv')
+    match_file = os.path.join(workdir, 'each-match.csv')
+    write_raw_json(matches, raw_dir)
+    CSVHandler(use_cache=False).write_csv(matches, processed_file)
+
+    elo_calculator = EloCalculator('csv', processed_file)
+    nb_weeks = elo_calculator.rating_history().nb_matchweeks
+    mid_season = int(matches['date-start-timestamp'].iloc[len(matches) // 2])
+    elo_calculator.calculate_elo_ratings_for_each_match('csv', match_file)
+    match_results = CSVHandler(use_cache=False).read_csv(match_file)['data']
+    rating_service = RatingService()
+    rating_service.add_season('benchmark', elo_calculator)
+    team = matches['home-name'].iloc[0]
+    cached_handler = CSVHandler()
+    cached_match_file = os.path.join(workdir, 'each-match-cached.csv')
+    cached_calculator = EloCalculator('csv', processed_file, result_cache=ResultCache(os.path.join(workdir, 'result-cache')))
+    cached_calculator.calculate_elo_ratings_for_each_match('csv', cached_match_file)
+    archive_dir = os.path.join(workdir, 'archive')
+    elo_calculator.archive_weekly_ratings(RatingArchive(archive_dir), '', 'benchmark')
+    cached_handler.read_csv(processed_file)
+
+    return [
+        ('json_processor.generate_match_results_csv',
+         lambda: JSONProcessor(raw_dir, os.path.join(workdir, 'json-processor.csv')).generate_match_results_csv()),
+        ('csv_handler.write_csv', lambda: CSVHandler(use_cache=False).write_csv(matches, os.path.join(workdir, 'written.csv'))),
+        ('csv_handler.read_csv', lambda: CSVHandler(use_cache=False).read_csv(processed_file)),
+        ('csv_handler.read_csv (cached)', lambda: cached_handler.read_csv(processed_file)),
+        ('match_store.from_dataframe', lambda: MatchStore.from_dataframe(matches)),
+        ('elo_calculator.read_data', lambda: elo_calculator.read_data('csv', processed_file)),
+        ('elo_calculator.replay_matches', lambda: elo_calculator.replay_matches()),
+        ('elo_calculator.replay_engines (elo, goal difference elo, glicko2)',
+         lambda: elo_calculator.replay_engines([ClassicElo(), GoalDifferenceElo(), Glicko2()])),
+        ('rating_history.as_of', lambda: elo_calculator.rating_history().as_of(mid_season)),
+        ('rating_service.rating', lambda: rating_service.rating('benchmark', team, timestamp=mid_season)),
+        ('rating_service.table (uncached)', lambda: (rating_service.cache.clear(), rating_service.table('benchmark', timestamp=mid_season))),
+        ('elo_calculator.calculate_elo_ratings_for_one_week',
+         lambda: elo_calculator.calculate_elo_ratings_for_one_week('csv', os.path.join(workdir, 'one-week.csv'), nb_weeks)),
+        ('elo_calculator.calculate_weekly_snapshots', lambda: elo_calculator.calculate_weekly_snapshots(nb_weeks)),
+        ('elo_calculator.calculate_elo_ratings_for_each_week (consolidated)',
+         lambda: elo_calculator.calculate_elo_ratings_for_each_week('csv', os.path.join(workdir, 'weeks.csv'), nb_weeks, consolidated=True)),
+        ('elo_calculator.archive_weekly_ratings',
+         lambda: elo_calculator.archive_weekly_ratings(RatingArchive(os.path.join(workdir, 'appended-archive')), '', 'benchmark')),
+        ('rating_archive.read (open and read every week)', lambda: RatingArchive(archive_dir).read('', 'benchmark').sum()),
+        ('elo_calculator.calculate_elo_ratings_for_each_match',
+         lambda: elo_calculator.calculate_elo_ratings_for_each_match('csv', match_file)),
+        ('outcome_model.fit', lambda: OrderedLogitModel().fit_calculators([elo_calculator])),
+        ('elo_calculator.calculate_elo_ratings_for_each_match (result cache hit)',
+         lambda: EloCalculator('csv', processed_file, result_cache=cached_calculator.result_cache).calculate_elo_ratings_for_each_match('csv', cached_match_file)),
+        ('evaluator.evaluate', lambda: Evaluator().evaluate({'benchmark': elo_calculator})),
+        ('season_simulator.simulate (100k seasons from mid-season)',
+         lambda: SeasonSimulator(elo_calculator, nb_simulations=100000, max_workers=1).simulate(nb_weeks // 2)),
+        ('plot_elo_bookies_scatter',
+         lambda: plot_elo_bookies_scatter(match_results, 'benchmark', False, os.path.join(workdir, 'scatter.png'),
+                                          last_n_matches=len(match_results))),
+    ]
+
+
+def startup_cases():
+    """
+    Returns the startup benchmarks, as a list of (name, function) pairs. Each function starts a new Python interpreter,
+    so the timings include the interpreter startup and the imports of the command.
+    """
+    def run_python(*args):
+        return lambda: subprocess.run([sys.executable, *args], cwd=PROJECT_DIR, check=True, stdout=subprocess.DEVNULL)
+
+    return [
+        ('startup.python', run_python('-c', 'pass')),
+        ('startup.main --help', run_python('main.py', '--help')),
+        # the imports of the rate and weekly commands
+        ('startup.import elo_ratings_calculator', run_python('-c', 'import main, elo_ratings_calculator')),
+        # the imports of the plot command
+        ('startup.import grapher', run_python('-c', 'import main, grapher')),
+    ]
+
+
+def time_function(function, repeats):
+    """
+    Calls a function `repeats` times and returns the wall-clock time of each call, in seconds.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(sizes, repeats, benchmarks=None):
+    """
+    Runs the benchmarks on a synthetic league of each size.
+
+    Args:
+        sizes (list): The names of the sizes to run, keys of SIZES.
+        repeats (int): The number of times each benchmark is timed.
+        benchmarks (list, optional): Only run the benchmarks whose name contains one of these strings.
+
+    Returns:
+        list: One dict per benchmark and size, with the best and median timings.
+    """
+    results = []
+    for name, function in startup_cases():
+        if benchmarks and not any(pattern in name for pattern in benchmarks):
+            continue
+        timings = time_function(function, repeats)
+        results.append({'benchmark': name, 'size': 'startup', 'nb_matches': 0,
+                        'best': min(timings), 'median': statistics.median(timings), 'repeats': repeats})
+        print(f"{name:<68} {'startup':>7} {0:>8} {results[-1]['best']:>10.4f} {results[-1]['median']:>10.4f}")
+    for size in sizes:
+        nb_teams, nb_seasons = SIZES[size]
+        matches = generate_matches(nb_teams, nb_seasons)
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, function in benchmark_cases(workdir, matches):
+                if benchmarks and not any(pattern in name for pattern in benchmarks):
+                    continue
+                timings = time_function(function, repeats)
+                result = {'benchmark': name, 'size': size, 'nb_matches': len(matches),
+                          'best': min(timings), 'median': statistics.median(timings), 'repeats': repeats}
+                results.append(result)
+                print(f"{name:<68} {size:>7} {len(matches):>8} {result['best']:>10.4f} {result['median']:>10.4f}")
+    return results
+
+
+def compare(results, previous_results, threshold=DEFAULT_THRESHOLD):
+    """
+    Prints the change of the best timing of each benchmark from an earlier run.
+
+    Returns:
+        list: The (benchmark, size) of the timings that are more than `threshold` times slower.
+    """
+    previous = {(result['benchmark'], result['size']): result['best'] for result in previous_results}
+    regressions = []
+    print(f"\n{'benchmark':<68} {'size':>7} {'before':>10} {'after':>10} {'ratio':>7}")
+    for result in results:
+        key = (result['benchmark'], result['size'])
+        if key not in previous:
+            continue
+        ratio = result['best'] / previous[key] if previous[key] else float('inf')
+        flag = ' REGRESSION' if ratio > threshold else ''
+        print(f"{key[0]:<68} {key[1]:>7} {previous[key]:>10.4f} {result['best']:>10.4f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the Elo pipeline on synthetic leagues.')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small', 'medium'],
+                        help='the sizes of the synthetic leagues (default: small medium)')
+    parser.add_argument('--repeats', type=int, default=3, help='the number of times each benchmark is timed (default: 3)')
+    parser.add_argument('--benchmarks', nargs='+', help='only run the benchmarks whose name contains one of these strings')
+    parser.add_argument('--output', help='the JSON file to save the results to (default: benchmarks/results/<date>.json)')
+    parser.add_argument('--compare', help='the JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'the slowdown ratio flagged as a regression (default: {DEFAULT_THRESHOLD})')
+    args = parser.parse_args(argv)
+
+    print(f"{'benchmark':<68} {'size':>7} {'matches':>8} {'best (s)':>10} {'median (s)':>10}")
+    results = run(args.sizes, args.repeats, args.benchmarks)
+
+    created = datetime.datetime.now()
+    output = args.output or os.path.join(RESULTS_DIR, f"{created.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'created': created.isoformat(timespec='seconds'), 'python': platform.python_version(),
+                   'platform': platform.platform(), 'results': results}, f, indent=2)
+    print(f'\nResults saved to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Synthetic league generator for the benchmarks.
+
+Generates seasons of double round-robin fixtures between teams of random strength. The goals of each match are drawn
+from Poisson distributions, and the bookmakers odds are derived from the same model with a margin, so the Elo ratings
+and the odds are realistically correlated. The matches are returned in the schema of the processed data written by
+JSONProcessor (see data/processed-data), and can also be written as raw JSON files for JSONProcessor to process.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+PROCESSED_COLUMNS = ['home-name', 'away-name', 'home-result', 'away-result', 'home-win', 'away-win', 'home-odds-avg',
+                     'home-odds-max', 'draw-odds-avg', 'draw-odds-max', 'away-odds-avg', 'away-odds-max', 'date-start-timestamp']
+
+# 2019-08-09 19:00 UTC, the first match of the 19-20 season
+DEFAULT_START_TIMESTAMP = 1565377200
+SECONDS_PER_WEEK = 7 * 24 * 3600
+# the weeks between the start of two consecutive seasons
+WEEKS_PER_SEASON = 52
+# kick-off offsets within a round, in seconds: Saturday 12:30, 15:00 and 17:30, Sunday 14:00 and 16:30
+KICK_OFF_OFFSETS = [0, 9000, 18000, 91800, 100800]
+MAX_GOALS = 10
+
+
+def round_robin(nb_teams):
+    """
+    Returns the fixtures of a double round-robin season with the circle method, as a list of rounds of (home, away) team ids.
+    Every team plays every other team once at home and once away, and plays once in each round.
+    """
+    if nb_teams % 2:
+        raise ValueError('The number of teams must be even')
+    teams = list(range(nb_teams))
+    rounds = []
+    for i in range(nb_teams - 1):
+        pairs = [(teams[j], teams[nb_teams - 1 - j]) for j in range(nb_teams // 2)]
+        # alternate the home side of the fixed team, so home and away games are spread over the season
+        rounds.append([(away, home) if (i + j) % 2 else (home, away) for j, (home, away) in enumerate(pairs)])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds + [[(away, home) for home, away in matches] for matches in rounds]
+
+
+def _outcome_probabilities(home_rate, away_rate):
+    # the probabilities of a home win, a draw and an away win of independent Poisson scores, up to MAX_GOALS goals
+    goals = np.arange(MAX_GOALS + 1)
+    log_factorials = np.cumsum(np.log(np.maximum(goals, 1)))
+    home = np.exp(goals * np.log(home_rate[:, None]) - home_rate[:, None] - log_factorials)
+    away = np.exp(goals * np.log(away_rate[:, None]) - away_rate[:, None] - log_factorials)
+    scores = home[:, :, None] * away[:, None, :]
+    home_win = np.tril(np.ones((MAX_GOALS + 1, MAX_GOALS + 1)), -1)
+    draw = np.eye(MAX_GOALS + 1)
+    p_home = (scores * home_win).sum(axis=(1, 2))
+    p_draw = (scores * draw).sum(axis=(1, 2))
+    p_away = (scores * home_win.T).sum(axis=(1, 2))
+    total = p_home + p_draw + p_away
+    return p_home / total, p_draw / total, p_away / total
+
+
+def generate_matches(nb_teams=20, nb_seasons=1, league='League', seed=0, start_timestamp=DEFAULT_START_TIMESTAMP,
+                     margin=0.05, home_advantage=0.25):
+    """
+    Generates the processed match data of a synthetic league.
+
+    Args:
+        nb_teams (int): The number of teams, an even number. Each season has nb_teams * (nb_teams - 1) matches.
+        nb_seasons (int): The number of consecutive seasons.
+        league (str): The name of the league, used in the team names.
+        seed (int): The seed of the random number generator.
+        start_timestamp (int): The kick-off time of the first match.
+        margin (float): The bookmakers margin of the average odds.
+        home_advantage (float): The home advantage, in log goals.
+
+    Returns:
+        pd.DataFrame: The matches, in the schema of JSONProcessor's output and in chronological order.
+    """
+    rng = np.random.default_rng(seed)
+    teams = np.array([f'{league} Team {i + 1:02d}' for i in range(nb_teams)], dtype=object)
+    attack = rng.normal(0, 0.25, nb_teams)
+    defence = rng.normal(0, 0.25, nb_teams)
+
+    rounds = round_robin(nb_teams)
+    fixtures = np.array([match for matches in rounds for match in matches])
+    nb_rounds = len(rounds)
+    matches_per_round = nb_teams // 2
+    round_of_match = np.repeat(np.arange(nb_rounds), matches_per_round)
+    offsets = np.array(KICK_OFF_OFFSETS)[np.arange(matches_per_round) * len(KICK_OFF_OFFSETS) // matches_per_round]
+
+    seasons = []
+    for season in range(nb_seasons):
+        # the strengths of the teams drift between seasons
+        attack += rng.normal(0, 0.05, nb_teams)
+        defence += rng.normal(0, 0.05, nb_teams)
+        home, away = fixtures[:, 0], fixtures[:, 1]
+        home_rate = np.exp(0.2 + home_advantage + attack[home] - defence[away])
+        away_rate = np.exp(0.2 + attack[away] - defence[home])
+        home_goals = rng.poisson(home_rate)
+        away_goals = rng.poisson(away_rate)
+
+        # decimal odds with a margin, the best price a little above the average one
+        probabilities = _outcome_probabilities(home_rate, away_rate)
+        odds = {}
+        for outcome, probability in zip(['home', 'draw', 'away'], probabilities):
+            avg_odds = np.round(1 / (probability * (1 + margin)), 2)
+            max_odds = np.round(avg_odds * (1 + rng.uniform(0.02, 0.1, len(avg_odds))), 2)
+            # JSONProcessor stores the odds as fractional odds
+            odds[f'{outcome}-odds-avg'] = np.round(avg_odds - 1, 2)
+            odds[f'{outcome}-odds-max'] = np.round(max_odds - 1, 2)
+
+        timestamps = (start_timestamp + season * WEEKS_PER_SEASON * SECONDS_PER_WEEK
+                      + round_of_match * SECONDS_PER_WEEK + np.tile(offsets, nb_rounds))
+        seasons.append(pd.DataFrame({
+            'home-name': teams[home],
+            'away-name': teams[away],
+            'home-result': home_goals,
+            'away-result': away_goals,
+            'home-win': home_goals > away_goals,
+            'away-win': away_goals > home_goals,
+            **odds,
+            'date-start-timestamp': timestamps.astype(np.int64),
+        }))
+    matches = pd.concat(seasons, ignore_index=True)
+    return matches.sort_values('date-start-timestamp', kind='stable', ignore_index=True)[PROCESSED_COLUMNS]
+
+
+def generate_leagues(nb_leagues=1, nb_teams=20, nb_seasons=1, seed=0):
+    """
+    Generates several independent synthetic leagues.
+
+    Returns:
+        dict: The processed match data of each league, keyed by league name.
+    """
+    return {f'League {i + 1}': generate_matches(nb_teams, nb_seasons, league=f'League {i + 1}', seed=seed + i)
+            for i in range(nb_leagues)}
+
+
+def _winner(goals, other_goals):
+    if goals > other_goals:
+        return 'win'
+    if goals < other_goals:
+        return 'lose'
+    return 'draw'
+
+
+def write_raw_json(matches, folder_path, rows_per_file=50):
+    """
+    Writes processed match data as raw JSON files in the format JSONProcessor reads: pages of `d.rows`, newest match first
+    within each page, with the pages in chronological order of their file names. Processing the folder with JSONProcessor
+    gives back the same matches.
+
+    Args:
+        matches (pd.DataFrame): The matches, as returned by `generate_matches`.
+        folder_path (str): The folder to write the files to. It is created if it does not exist.
+        rows_per_file (int): The number of matches in each file.
+
+    Returns:
+        list: The paths of the files written.
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    records = matches.to_dict('records')
+    nb_files = -(-len(records) // rows_per_file)
+    width = max(2, len(str(nb_files - 1)))
+    file_paths = []
+    for i in range(nb_files):
+        rows = []
+        for match in reversed(records[i * rows_per_file:(i + 1) * rows_per_file]):
+            home_goals, away_goals = int(match['home-result']), int(match['away-result'])
+            rows.append({
+                'home-name': match['home-name'],
+                'away-name': match['away-name'],
+                'result': f'{home_goals}:{away_goals}',
+                'homeResult': home_goals,
+                'awayResult': away_goals,
+                'home-winner': _winner(home_goals, away_goals),
+                'away-winner': _winner(away_goals, home_goals),
+                'odds': [{'avgOdds': round(match[f'{outcome}-odds-avg'] + 1, 2), 'maxOdds': round(match[f'{outcome}-odds-max'] + 1, 2)}
+                         for outcome in ['home', 'draw', 'away']],
+                'date-start-timestamp': int(match['date-start-timestamp']),
+            })
+        file_path = os.path.join(folder_path, f'page-{i:0{width}d}.json')
+        with open(file_path, 'w') as f:
+            json.dump({'d': {'total': len(records), 'rows': rows}}, f)
+        file_paths.append(file_path)
+    return file_paths
@@ -1,6 +1,7 @@
 import pandas as pd
 from .csv_io import CSVReader
 from .csv_io import CSVWriter
+from .csv_io import CSVCache
 
 class CSVHandler:
     """
@@ -9,6 +10,7 @@ class CSVHandler:
     Attributes:
         read_csv_handler (CSVReadHandler): Object for handling the reading of CSV files.
         write_csv_handler (CSVWriteHandler): Object for handling the writing of Pandas DataFrames to CSV files.
+        cache (CSVCache): Columnar binary cache of the CSV files read, or None if `use_cache` is False.
 
     Methods:
         read_csv(csv_file: str) -> Dict[str, Union[str, pd.DataFrame]]:
@@ -21,9 +23,10 @@ class CSVHandler:
     Raises:
         None
     """
-    def __init__(self):
-        self.read_csv_handler = CSVReader()
-        self.write_csv_handler = CSVWriter()
+    def __init__(self, use_cache=True):
+        self.cache = CSVCache() if use_cache else None
+        self.read_csv_handler = CSVReader(self.cache)
+        self.write_csv_handler = CSVWriter(self.cache)
 
     def read_csv(self, csv_file):
         return self.read_csv_handler.read_csv(csv_file)
@@ -1,2 +1,3 @@
 from .csv_reader import CSVReader
 from .csv_writer import CSVWriter
+from .csv_cache import CSVCache
@@ -0,0 +1,100 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+# version of the cache layout, bumped when it changes so old caches are ignored
+CACHE_VERSION = 1
+
+
+class CSVCache:
+    """
+    Class for caching the contents of CSV files as typed, columnar binary files, so repeated reads skip parsing the CSV text.
+
+    The cache of a CSV file is a hidden directory next to it (e.g. `.index.csv.cache` for `index.csv`), holding one `.npy` file per column
+    and a `meta.json` file with the column names and types and the modification time and size of the CSV file. A cache is only used
+    while the CSV file's modification time and size match, so it never needs to be invalidated by hand. Numeric and boolean columns
+    are memory-mapped when loaded. Text columns are dictionary-encoded, as memory-mapped integer codes into a small array of distinct
+    values, which is much faster to load than one string per row. Files with missing text values are not cached.
+
+    Attributes:
+        None
+
+    Methods:
+        cache_dir(csv_file: str) -> str: Returns the path of the cache directory of a CSV file.
+        load(csv_file: str) -> pd.DataFrame: Returns the cached contents of a CSV file, or None if there is no up to date cache.
+        store(csv_file: str, df: pd.DataFrame) -> bool: Caches the contents of a CSV file, and returns whether it could be cached.
+        invalidate(csv_file: str): Deletes the cache of a CSV file.
+
+    Raises:
+        None
+    """
+
+    def __init__(self):
+        pass
+
+    def cache_dir(self, csv_file):
+        directory, file_name = os.path.split(csv_file)
+        return os.path.join(directory, f'.{file_name}.cache')
+
+    def _source_key(self, csv_file):
+        stat = os.stat(csv_file)
+        return {'version': CACHE_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def load(self, csv_file):
+        cache_dir = self.cache_dir(csv_file)
+        try:
+            with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            if meta['source'] != self._source_key(csv_file):
+                return None
+            columns = {}
+            for i, (name, dtype, dictionary_encoded) in enumerate(meta['columns']):
+                values = np.load(os.path.join(cache_dir, f'{i}.npy'), mmap_mode='r')
+                if dictionary_encoded:
+                    distinct_values = np.load(os.path.join(cache_dir, f'{i}.values.npy')).astype(object)
+                    columns[name] = pd.Series(distinct_values[values], dtype=dtype)
+                else:
+                    columns[name] = values
+            return pd.DataFrame(columns, columns=[name for name, _, _ in meta['columns']])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, csv_file, df):
+        columns = []
+        arrays = []
+        for name in df.columns:
+            column = df[name]
+            if column.dtype.kind in 'biuf':
+                arrays.append((column.to_numpy(), None))
+            else:
+                codes, distinct_values = pd.factorize(column)
+                # only complete text columns can be dictionary-encoded
+                if (codes < 0).any() or not all(isinstance(value, str) for value in distinct_values):
+                    return False
+                arrays.append((codes.astype(np.int32), np.asarray(distinct_values, dtype=str)))
+            columns.append([name, str(column.dtype), arrays[-1][1] is not None])
+        try:
+            source = self._source_key(csv_file)
+            cache_dir = self.cache_dir(csv_file)
+            os.makedirs(cache_dir, exist_ok=True)
+            # write each file under a temporary name and move it into place, so readers never see a partial file,
+            # and write the metadata last so the cache is only used once all the columns are in place
+            for i, (values, distinct_values) in enumerate(arrays):
+                for suffix, array in (('npy', values), ('values.npy', distinct_values)):
+                    if array is None:
+                        continue
+                    temporary_file = os.path.join(cache_dir, f'{i}.{os.getpid()}.tmp.npy')
+                    np.save(temporary_file, array)
+                    os.replace(temporary_file, os.path.join(cache_dir, f'{i}.{suffix}'))
+            temporary_file = os.path.join(cache_dir, f'meta.{os.getpid()}.tmp')
+            with open(temporary_file, 'w') as f:
+                json.dump({'source': source, 'columns': columns}, f)
+            os.replace(temporary_file, os.path.join(cache_dir, 'meta.json'))
+            return True
+        except OSError:
+            return False
+
+    def invalidate(self, csv_file):
+        shutil.rmtree(self.cache_dir(csv_file), ignore_errors=True)
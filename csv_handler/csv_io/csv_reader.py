@@ -1,11 +1,14 @@
+import os
 import pandas as pd
+from logger import Instrumentation, timed
 
 class CSVReader:
     """
     Class for handling the reading of CSV files.
 
     Attributes:
-        None
+        cache (CSVCache): Optional cache of the parsed contents of CSV files. If set, up to date cached contents are returned
+            instead of parsing the file, and parsed files are added to the cache.
 
     Methods:
         read_csv(csv_file: str) -> Dict[str, Union[str, pd.DataFrame]]:
@@ -15,9 +18,10 @@ class CSVReader:
     Raises:
         None
     """
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        self.cache = cache
 
+    @timed('csv.read')
     def read_csv(self, csv_file):
         if not isinstance(csv_file, str):
             return {'error': f'Error: {csv_file} is not a string'}
@@ -25,7 +29,18 @@ class CSVReader:
             return {'error': f'Error: {csv_file} is not a .csv file'}
         
         try:
+            if self.cache is not None:
+                df = self.cache.load(csv_file)
+                if df is not None:
+                    Instrumentation().count('csv files read from cache')
+                    return {'data': df}
             df = pd.read_csv(csv_file, na_values=["N/A", "-", "?"])
+            instrumentation = Instrumentation()
+            if instrumentation.enabled:
+                instrumentation.count('csv bytes read', os.path.getsize(csv_file))
+                instrumentation.count('csv rows read', len(df))
+            if self.cache is not None:
+                self.cache.store(csv_file, df)
             return {'data': df}
         except FileNotFoundError:
             return {'error': f'Error: The file {csv_file} could not be found'}
@@ -1,11 +1,12 @@
 import pandas as pd
+from logger import Instrumentation, timed
 
 class CSVWriter:
     """
     Class for handling the writing of Pandas DataFrames to CSV files.
 
     Attributes:
-        None
+        cache (CSVCache): Optional cache of the parsed contents of CSV files, cleared for the files that are written.
 
     Methods:
         write_csv(df: pd.DataFrame, output_file: str) -> Dict[str, str]:
@@ -16,16 +17,20 @@ class CSVWriter:
         None
     """
     
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        self.cache = cache
 
+    @timed('csv.write')
     def write_csv(self, df, output_file):
         if not isinstance(df, pd.DataFrame) or df.empty:
             return {'error': 'Error: No data in the dataframe to save.'}
         if not output_file.endswith('.csv'):
             return {'error': f'Error: The output file {output_file} is not a .csv file'}
         try:
+            if self.cache is not None:
+                self.cache.invalidate(output_file)
             df.to_csv(output_file, index=False)
+            Instrumentation().count('csv rows written', len(df))
             return {'message': f'Data saved to {output_file}'}
         except IOError:
             return {'error': f'Error: The directory specified in {output_file} does not exist. Please specify a valid directory.'}
@@ -1,2 +1,2 @@
 from .database import Database
-# from .sql_handler import execute_query
\ No newline at end of file
+from .connection import ConnectionPool
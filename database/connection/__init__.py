@@ -1 +1,2 @@
-from .db_connector import DBConnector
\ No newline at end of file
+from .db_connector import DBConnector
+from .connection_pool import ConnectionPool
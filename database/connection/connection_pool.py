@@ -0,0 +1,87 @@
+import threading
+
+
+class ConnectionPool:
+    """
+    A pool of open database connections, shared by every DBConnector (and so every Database instance) in the process
+    that connects with the same settings. Connections are handed out by `acquire` and returned by `release`
+    instead of being closed, so they are reused rather than reopened for each Database instance.
+
+    Attributes:
+        connect (callable): A function that opens a new connection.
+        max_idle (int): The maximum number of idle connections kept open. Connections released beyond it are closed.
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, connect, max_idle=4):
+        """
+        Initialises an empty pool.
+
+        Args:
+            connect (callable): A function that opens a new connection.
+            max_idle (int, optional): The maximum number of idle connections kept open. Defaults to 4.
+        """
+        self.connect = connect
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, key, connect, max_idle=4):
+        """
+        Returns the pool for a set of connection settings, creating it if it does not exist yet.
+
+        Args:
+            key (tuple): The connection settings identifying the pool.
+            connect (callable): A function that opens a new connection with those settings.
+            max_idle (int, optional): The maximum number of idle connections kept open by a new pool.
+        """
+        with cls._pools_lock:
+            if key not in cls._pools:
+                cls._pools[key] = cls(connect, max_idle)
+            return cls._pools[key]
+
+    @classmethod
+    def close_all(cls):
+        """
+        Closes the idle connections of every pool, e.g. before the process exits.
+        """
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+        for pool in pools:
+            pool.close()
+
+    def acquire(self):
+        """
+        Returns an idle connection, or opens a new one if there is none.
+        """
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.connect()
+
+    def release(self, connection):
+        """
+        Returns a connection to the pool. Any open transaction is rolled back first.
+        """
+        try:
+            connection.rollback()
+        except Exception:
+            # the connection is broken, do not reuse it
+            connection.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """
+        Closes the idle connections of the pool.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
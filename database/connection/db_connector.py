@@ -1,48 +1,84 @@
 import os
-import psycopg2
-from dotenv import load_dotenv
+import sqlite3
+from .connection_pool import ConnectionPool
+
+# supported database backends
+BACKENDS = ('postgres', 'sqlite')
+
+
+def load_environment():
+    """
+    Loads the connection details from a .env file into the environment variables, if python-dotenv is installed.
+    """
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
 
-load_dotenv()
 
 class DBConnector:
     """
-    A class for connecting to a PostgreSQL database using the psycopg2 library. 
-    The connection details are stored in environment variables.
+    A class for connecting to a PostgreSQL database using the psycopg2 library, or to a SQLite database file
+    (e.g. for local runs and tests). The backend and connection details are stored in environment variables:
+    DB_BACKEND ('postgres' or 'sqlite', defaults to 'postgres'), DB_HOST, DB_PORT, DB_NAME, DB_USER and DB_PASSWORD
+    for PostgreSQL, and DB_PATH for SQLite. Connections come from a ConnectionPool shared by every DBConnector
+    with the same connection details.
     """
-    def __init__(self):
+    def __init__(self, backend=None, database=None):
         """
         Initialises the connection attribute to None.
+
+        Args:
+            backend (str, optional): 'postgres' or 'sqlite'. Defaults to the DB_BACKEND environment variable.
+            database (str, optional): The database name (PostgreSQL) or file path (SQLite). Defaults to DB_NAME or DB_PATH.
         """
+        load_environment()
+        self.backend = backend or os.getenv("DB_BACKEND", "postgres")
+        self.database = database
         self.connection = None
+        self.pool = None
+
+    def _settings(self):
+        if self.backend == 'sqlite':
+            return (self.backend, self.database or os.getenv("DB_PATH", "elo-ratings.db"))
+        return (self.backend, os.getenv("DB_HOST"), os.getenv("DB_PORT"), self.database or os.getenv("DB_NAME"),
+                os.getenv("DB_USER"), os.getenv("DB_PASSWORD"))
+
+    def _open_connection(self, settings):
+        if self.backend == 'sqlite':
+            return sqlite3.connect(settings[1], check_same_thread=False)
+        import psycopg2
+        _, host, port, dbname, user, password = settings
+        return psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
 
     def connect(self):
         """
-        Connects to the database using the connection details stored in environment variables. 
+        Connects to the database using the connection details stored in environment variables.
         If the connection attribute is not None, the existing connection is returned.
-        
+
         Returns:
-            psycopg2 connection object.
+            psycopg2 or sqlite3 connection object.
         """
         if self.connection:
             return self.connection
+        if self.backend not in BACKENDS:
+            print(f"Error connecting to the database: Details: invalid backend {self.backend}. Choose from {BACKENDS}.")
+            return
 
         try:
-            self.connection = psycopg2.connect(
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT"),
-                dbname=os.getenv("DB_NAME"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD")
-            )
-            print("Successfully connected to the database.")
+            settings = self._settings()
+            self.pool = ConnectionPool.get(settings, lambda: self._open_connection(settings))
+            self.connection = self.pool.acquire()
         except Exception as e:
             print(f"Error connecting to the database: Details: {e}")
         return self.connection
 
     def close(self):
         """
-        Closes the connection to the database, if the connection attribute is not None.
+        Returns the connection to the pool, if the connection attribute is not None.
+        Use ConnectionPool.close_all() to close the pooled connections.
         """
         if self.connection:
-            self.connection.close()
-            print("Successfully closed the connection to the database.")
+            self.pool.release(self.connection)
+            self.connection = None
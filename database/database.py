@@ -1,13 +1,40 @@
-from dotenv import load_dotenv
 from .connection import DBConnector
 from .queries import ExecuteQuery
-
-load_dotenv()
+from .queries import BulkTransfer
+from logger import Instrumentation, timed
 
 class Database:
-    def __init__(self):
-        self.conn = DBConnector().connect()
-        self.execute_query = ExecuteQuery(self.conn)
+    """
+    Class for accessing the database. Each instance takes a connection from the pool shared by all the
+    instances with the same connection details, and `close` returns it to the pool.
+
+    Attributes:
+        conn: The active database connection, or None if the connection failed.
+        execute_query (ExecuteQuery): Executes, batches, fetches and streams queries on the connection.
+        bulk_transfer (BulkTransfer): Loads DataFrames into tables and reads query results into DataFrames.
+
+    Methods:
+        read_dataframe(query, params=None) -> pd.DataFrame: Runs a query and returns its results as a DataFrame.
+        write_dataframe(df, table, if_exists='replace') -> int: Loads a DataFrame into a table and returns the number of rows loaded.
+        close(): Returns the connection to the pool.
+    """
+    def __init__(self, backend=None, database=None):
+        self.connector = DBConnector(backend, database)
+        self.conn = self.connector.connect()
+        self.execute_query = ExecuteQuery(self.conn) if self.conn else None
+        self.bulk_transfer = BulkTransfer(self.execute_query) if self.conn else None
+
+    @timed('db.read')
+    def read_dataframe(self, query, params=None):
+        df = self.bulk_transfer.read_dataframe(query, params)
+        Instrumentation().count('db rows read', len(df))
+        return df
+
+    @timed('db.write')
+    def write_dataframe(self, df, table, if_exists='replace'):
+        nb_rows = self.bulk_transfer.write_dataframe(df, table, if_exists)
+        Instrumentation().count('db rows written', nb_rows)
+        return nb_rows
 
     def close(self):
-        self.conn.close()
+        self.connector.close()
@@ -1 +1,2 @@
-from .execute_query import ExecuteQuery
\ No newline at end of file
+from .execute_query import ExecuteQuery
+from .bulk_transfer import BulkTransfer
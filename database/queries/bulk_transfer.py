@@ -0,0 +1,103 @@
+import io
+import pandas as pd
+
+
+def quote_identifier(name):
+    """
+    Quotes a table or column name, e.g. 'home-name' becomes '"home-name"'.
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class BulkTransfer:
+    """Class for loading DataFrames into database tables and unloading query results into DataFrames.
+
+    With PostgreSQL, DataFrames are loaded with COPY ... FROM STDIN, which sends the whole table in one
+    statement. With SQLite they are loaded with batched inserts in a single transaction. Query results are
+    streamed in batches (on a server-side cursor with PostgreSQL) and assembled into one DataFrame.
+
+    Args:
+        execute_query (ExecuteQuery): The query executor of an active database connection.
+    """
+    def __init__(self, execute_query):
+        """
+        Initialises the BulkTransfer class with the query executor of an active database connection.
+
+        Args:
+            execute_query (ExecuteQuery): The query executor of an active database connection.
+        """
+        self.execute_query = execute_query
+        self.connection = execute_query.connection
+        self.is_sqlite = execute_query.is_sqlite
+
+    def _column_type(self, dtype):
+        if pd.api.types.is_bool_dtype(dtype):
+            return 'INTEGER' if self.is_sqlite else 'BOOLEAN'
+        if pd.api.types.is_integer_dtype(dtype):
+            return 'INTEGER' if self.is_sqlite else 'BIGINT'
+        if pd.api.types.is_float_dtype(dtype):
+            return 'REAL' if self.is_sqlite else 'DOUBLE PRECISION'
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return 'TEXT' if self.is_sqlite else 'TIMESTAMP'
+        return 'TEXT'
+
+    def write_dataframe(self, df, table, if_exists='replace', batch_size=10000):
+        """Load a DataFrame into a table.
+
+        Args:
+            df (pd.DataFrame): The data to load. The table columns are named and typed after the DataFrame columns.
+            table (str): The name of the table.
+            if_exists (str, optional): 'replace' to drop and recreate the table, or 'append' to add the rows to it. Defaults to 'replace'.
+            batch_size (int, optional): The number of rows inserted at a time with SQLite. Defaults to 10000.
+
+        Returns:
+            int: The number of rows loaded.
+        """
+        if if_exists not in ('replace', 'append'):
+            raise ValueError(f"Invalid if_exists value: {if_exists}. Choose 'replace' or 'append'.")
+        columns = ', '.join(f'{quote_identifier(name)} {self._column_type(dtype)}' for name, dtype in df.dtypes.items())
+        try:
+            if if_exists == 'replace':
+                self.execute_query.execute_query(f'DROP TABLE IF EXISTS {quote_identifier(table)}', commit=False)
+            self.execute_query.execute_query(f'CREATE TABLE IF NOT EXISTS {quote_identifier(table)} ({columns})', commit=False)
+            column_names = ', '.join(quote_identifier(name) for name in df.columns)
+            if self.is_sqlite:
+                placeholders = ', '.join('?' for _ in df.columns)
+                # convert NumPy scalars and timestamps to types sqlite3 can bind
+                rows = df.astype(object).where(df.notna(), None)
+                for name, dtype in df.dtypes.items():
+                    if pd.api.types.is_datetime64_any_dtype(dtype):
+                        rows[name] = df[name].dt.strftime('%Y-%m-%d %H:%M:%S').astype(object).where(df[name].notna(), None)
+                self.execute_query.execute_many(f'INSERT INTO {quote_identifier(table)} ({column_names}) VALUES ({placeholders})',
+                                                rows.itertuples(index=False, name=None), batch_size=batch_size, commit=False)
+            else:
+                buffer = io.StringIO()
+                df.to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                with self.connection.cursor() as cursor:
+                    cursor.copy_expert(f'COPY {quote_identifier(table)} ({column_names}) FROM STDIN WITH (FORMAT csv)', buffer)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return len(df)
+
+    def read_dataframe(self, query, params=None, batch_size=10000):
+        """Run a query and return its results as a DataFrame, streaming the rows in batches.
+
+        Args:
+            query (str): The SQL query to be executed.
+            params (list, optional): A list of parameters to be passed to the query. Defaults to None.
+            batch_size (int, optional): The number of rows fetched at a time. Defaults to 10000.
+
+        Returns:
+            pd.DataFrame: The results of the query.
+        """
+        columns = []
+        frames = []
+        for columns, rows in self.execute_query.stream(query, params, batch_size):
+            if rows:
+                frames.append(pd.DataFrame.from_records(rows, columns=columns))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
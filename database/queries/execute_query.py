@@ -1,37 +1,145 @@
-import psycopg2
-from psycopg2 import sql
+import sqlite3
+import itertools
+
 
 class ExecuteQuery:
     """Class for executing database queries.
-    
+
     This class provides a convenient way to execute SQL queries on the database. The query is executed using an active
-    connection and the results are automatically committed. 
-    
+    connection and the results are automatically committed. It can also execute a query for many rows of parameters in
+    batches, and fetch or stream the results of a query.
+
     Args:
-        connection (psycopg2.extensions.connection): An active database connection.
+        connection (psycopg2.extensions.connection or sqlite3.Connection): An active database connection.
     """
     def __init__(self, connection):
         """
         Initialises the ExecuteQuery class with an active database connection.
-        
+
         Args:
-            connection (psycopg2.extensions.connection): An active database connection.
+            connection (psycopg2.extensions.connection or sqlite3.Connection): An active database connection.
         """
         self.connection = connection
+        self.is_sqlite = isinstance(connection, sqlite3.Connection)
+        # parameter placeholder of the backend
+        self.placeholder = '?' if self.is_sqlite else '%s'
 
-    def execute_query(self, query, params=None):
+    def _query(self, query):
+        if self.is_sqlite:
+            return query
+        from psycopg2 import sql
+        return sql.SQL(query)
+
+    def execute_query(self, query, params=None, commit=True):
         """Execute a query on the database.
-        
+
         This method executes a provided SQL query on the database using an active connection. If a list of parameters
         is provided, they will be passed to the query. The results of the query are automatically committed.
-        
+
         Args:
             query (str): The SQL query to be executed.
             params (list, optional): A list of parameters to be passed to the query. Defaults to None.
+            commit (bool, optional): Whether to commit after the query. Defaults to True.
         """
-        with self.connection.cursor() as cursor:
+        cursor = self.connection.cursor()
+        try:
             if params:
-                cursor.execute(sql.SQL(query), params)
+                cursor.execute(self._query(query), params)
             else:
-                cursor.execute(sql.SQL(query))
-        self.connection.commit()
+                cursor.execute(self._query(query))
+        finally:
+            cursor.close()
+        if commit:
+            self.connection.commit()
+
+    def execute_many(self, query, rows, batch_size=1000, commit=True):
+        """Execute a query once for each row of parameters, in batches.
+
+        The rows are sent to the database `batch_size` at a time and committed once at the end, instead of
+        executing and committing one statement per row.
+
+        Args:
+            query (str): The SQL query to be executed, with one placeholder per parameter.
+            rows (iterable): The parameters of each execution.
+            batch_size (int, optional): The number of rows sent at a time. Defaults to 1000.
+            commit (bool, optional): Whether to commit after the last batch. Defaults to True.
+
+        Returns:
+            int: The number of rows executed.
+        """
+        nb_rows = 0
+        rows = iter(rows)
+        cursor = self.connection.cursor()
+        try:
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                if self.is_sqlite:
+                    cursor.executemany(query, batch)
+                else:
+                    from psycopg2.extras import execute_batch
+                    execute_batch(cursor, query, batch, page_size=batch_size)
+                nb_rows += len(batch)
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        if commit:
+            self.connection.commit()
+        return nb_rows
+
+    def fetch_all(self, query, params=None):
+        """Execute a query and return all of its results.
+
+        Args:
+            query (str): The SQL query to be executed.
+            params (list, optional): A list of parameters to be passed to the query. Defaults to None.
+
+        Returns:
+            tuple: (columns, rows), the column names and a list of the result rows.
+        """
+        columns = []
+        rows = []
+        for columns, batch in self.stream(query, params):
+            rows.extend(batch)
+        return columns, rows
+
+    def stream(self, query, params=None, batch_size=10000):
+        """Execute a query and yield its results in batches.
+
+        With PostgreSQL the query runs on a server-side (named) cursor, so only one batch of results is held
+        in memory at a time. With SQLite the results are fetched from the cursor one batch at a time.
+
+        Args:
+            query (str): The SQL query to be executed.
+            params (list, optional): A list of parameters to be passed to the query. Defaults to None.
+            batch_size (int, optional): The number of rows per batch. Defaults to 10000.
+
+        Yields:
+            tuple: (columns, rows), the column names and a list of up to `batch_size` result rows.
+        """
+        if self.is_sqlite:
+            cursor = self.connection.cursor()
+        else:
+            cursor = self.connection.cursor(name=f'stream_{id(self)}_{id(query)}')
+            cursor.itersize = batch_size
+        try:
+            cursor.execute(self._query(query), params or ())
+            columns = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if columns is None:
+                    columns = [description[0] for description in cursor.description] if cursor.description else []
+                    if not rows:
+                        # an empty result still reports its columns
+                        yield columns, rows
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            cursor.close()
+            if not self.is_sqlite:
+                # end the transaction holding the server-side cursor
+                self.connection.commit()
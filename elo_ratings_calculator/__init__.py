@@ -1 +1,8 @@
 from elo_ratings_calculator.elo_ratings_calculator import EloCalculator
+from elo_ratings_calculator.parameter_sweep import ParameterSweep
+from elo_ratings_calculator.rating_state import RatingState
+from elo_ratings_calculator.time_index import RatingHistory
+from elo_ratings_calculator.multi_season_calculator import MultiSeasonEloCalculator
+from elo_ratings_calculator.rating_engines import RatingEngine, ClassicElo, GoalDifferenceElo, Glicko2
+from elo_ratings_calculator.outcome_model import OrderedLogitModel
+from elo_ratings_calculator.result_cache import ResultCache
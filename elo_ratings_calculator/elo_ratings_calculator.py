@@ -1,34 +1,104 @@
+import os
 import pandas as pd
-import datetime
+import numpy as np
 from error_handler import ErrorHandler
-from logger import Logger
+from logger import Logger, Instrumentation, timed
 from csv_handler import CSVHandler
+from database import Database
+from match_store import MatchStore, TeamVocabulary
+from .replay_kernel import encode_matches
+from .replay_kernel import DEFAULT_INITIAL_RATING, DEFAULT_K_FACTORS, DEFAULT_K_THRESHOLDS, DEFAULT_HOME_ADVANTAGE
+from .match_results_builder import build_match_results
+from .rating_state import RatingState
+from .time_index import RatingHistory, matchweek_ends
+from .rating_engines import ClassicElo, replay_engines
+from .result_cache import data_hash
 
 class EloCalculator:
     """
     This class calculates Elo ratings for matches in a Premier League season from a CSV file containing processed matches data.
+    The rating configuration (initial rating, k-factor tiers and home advantage) defaults to the values in `replay_kernel`.
+    The matches are replayed by a rating engine (see `rating_engines`), by default the ClassicElo engine of the rating
+    configuration. Another engine, e.g. GoalDifferenceElo or Glicko2, can be passed as `engine`, and several engines can
+    be replayed side by side over the same matches with `replay_engines`.
+    The matches are replayed from a MatchStore of the data, built once per data instance, with the team names interned into
+    `vocabulary`, which can be shared by several calculators. Ratings at a point in time (a kick-off time, a matchweek or a date range)
+    are read off a RatingHistory time index of the data, also built once per data instance, instead of replaying the matches.
+    With a `result_cache` (see `ResultCache`), the per-match and weekly ratings are cached on disk, keyed on a hash of the match data
+    and the rating configuration, so a run on unchanged data returns the cached results and does not rewrite its csv outputs.
 
     Methods:
         calculate_individual_elo_ratings(home_score: int, away_score: int, home_elo: int, away_elo: int) -> Tuple[int, int]:
             Calculates individual Elo ratings based on the match result and the initial ratings of both teams.
         
+        match_store() -> MatchStore:
+            Returns the compact typed store of the matches in the data instance, built once per data instance.
+        
+        rating_engine() -> RatingEngine:
+            Returns the rating engine the matches are replayed with.
+        
+        replay_matches(nb_matches: int = None) -> Dict[str, np.ndarray]:
+            Replays the matches on integer-encoded team ids with the rating engine and returns the pre- and post-match ratings in a dictionary.
+        
+        replay_engines(engines: list) -> Dict[str, Dict[str, np.ndarray]]:
+            Replays the matches with several rating engines side by side, in one pass.
+        
+        calculate_ratings_for_each_engine(data_source: str, file_or_query: str, engines: list):
+            Calculates the ratings of several rating engines for each match and saves them side by side to an output file.
+        
+        rating_history() -> RatingHistory:
+            Returns the time index of the ratings after each match, built once per data instance.
+        
+        ratings_as_of(timestamp: int) -> pd.DataFrame:
+            Returns the Elo rating of every team after the matches that kicked off at or before a time.
+        
         calculate_elo_ratings_for_one_week(csv_file:str, output_file:str, weeks: int = None):
             Calculates Elo ratings for one week of matches and saves the result to an output file.
         
-        calculate_elo_ratings_for_each_week(csv_file:str, output_dir:str, week:int):
-            Calculates Elo ratings for each week in a season, up to a specified week, and saves the results as CSV files in the output directory.
+        calculate_weekly_snapshots(target_week: int = None) -> pd.DataFrame:
+            Replays the season once and returns a weeks x teams matrix of the Elo ratings at each week boundary.
+        
+        calculate_elo_ratings_for_each_week(csv_file:str, output_dir:str, week:int, consolidated: bool = False):
+            Calculates Elo ratings for each week in a season, up to a specified week, and saves the results as CSV files in the output directory, or as one consolidated CSV file.
+        
+        archive_weekly_ratings(archive: RatingArchive, league: str, season: str, target_week: int = None) -> pd.DataFrame:
+            Appends the weekly snapshots of the season to a memory-mapped rating archive.
+        
+        calculate_elo_ratings_for_each_match(csv_file:str, output_file:str, outcome_model: OrderedLogitModel = None):
+            Calculates Elo ratings for each match in a season and saves the results to an output file, with the home win, draw
+            and away win probabilities of a fitted outcome model if given.
+        
+        update_with_new_matches(state_file: str) -> pd.DataFrame:
+            Applies only the matches that are newer than a persisted rating state checkpoint, and saves the updated checkpoint.
         
-        calculate_elo_ratings_for_each_match(csv_file:str, output_file:str):
-            Calculates Elo ratings for each match in a season and saves the results to an output file.
+        data_hash() -> str:
+            Returns the content hash of the data instance, computed once per data instance.
+        
+        invalidate_cached_results() -> int:
+            Deletes the cached results of the data instance from the result cache.
     """
 
-    def __init__(self, data_source, file_or_query):
+    def __init__(self, data_source, file_or_query, initial_rating=DEFAULT_INITIAL_RATING, k_factors=DEFAULT_K_FACTORS,
+                 k_thresholds=DEFAULT_K_THRESHOLDS, home_advantage=DEFAULT_HOME_ADVANTAGE, vocabulary=None, engine=None, result_cache=None):
+        self.initial_rating = initial_rating
+        self.k_factors = k_factors
+        self.k_thresholds = k_thresholds
+        self.home_advantage = home_advantage
+        self.engine = engine
+        self.result_cache = result_cache
         self.error_handler = ErrorHandler(log_destination='file')
         self.csv_handler = CSVHandler()
-        # self.sql_handler = TODO
         self.logger = Logger().logger
+        self.vocabulary = vocabulary if vocabulary is not None else TeamVocabulary()
+        self._match_store = None
+        self._match_store_data = None
+        self._rating_history = None
+        self._rating_history_key = (None, None)
+        self._data_hash = None
+        self._data_hash_data = None
         self.data = self.read_data(data_source, file_or_query)
 
+    @timed('elo.read')
     def read_data(self, data_source, file_or_query):
         if data_source == 'csv':
             result = self.csv_handler.read_csv(file_or_query)
@@ -38,24 +108,41 @@ class EloCalculator:
             self.data = result['data']
             return self.data
         elif data_source == 'db':
-            # TODO
-            return
+            database = Database()
+            if database.conn is None:
+                self.error_handler.log_error('Error: Could not connect to the database.')
+                return
+            try:
+                self.data = database.read_dataframe(file_or_query)
+                return self.data
+            except Exception as e:
+                self.error_handler.log_error(f'Error: An error occurred while reading from the database: {e}')
+            finally:
+                database.close()
         else:
             self.error_handler.log_error(f'Invalid data source: {data_source}. Only "csv" and "db" are supported.')
 
+    @timed('elo.write')
     def write_data(self, data, data_source, file_or_query):
         if data_source == 'csv':
             result = self.csv_handler.write_csv(data, file_or_query)
             return result
-            if 'error' in result:
-                self.error_handler.log_error(result['error'])
-                return
         elif data_source == 'db':
-            # TODO
-            return
+            if not isinstance(data, pd.DataFrame) or data.empty:
+                return {'error': 'Error: No data in the dataframe to save.'}
+            database = Database()
+            if database.conn is None:
+                return {'error': 'Error: Could not connect to the database.'}
+            try:
+                nb_rows = database.write_dataframe(data, file_or_query)
+                return {'message': f'{nb_rows} rows saved to table {file_or_query}'}
+            except Exception as e:
+                return {'error': f'Error: An error occurred while writing to the table {file_or_query}: {e}'}
+            finally:
+                database.close()
         else:
-            self.error_handler.log_error(f'Invalid data source: {data_source}. Only "csv" and "db" are supported.')
-            
+            return {'error': f'Invalid data source: {data_source}. Only "csv" and "db" are supported.'}
+
     def calculate_individual_elo_ratings(self, home_score: int, away_score: int, home_elo: int, away_elo: int):
         """
         Updates the Elo ratings of the home and away teams based on the outcome of the game.
@@ -73,16 +160,16 @@ class EloCalculator:
         """
 
         # expected scores for the home and away teams based on their current ratings
-        home_exp = 1 / (1 + 10 ** ((away_elo - home_elo) / 400))
+        home_exp = 1 / (1 + 10 ** ((away_elo - (home_elo + self.home_advantage)) / 400))
         away_exp = 1 - home_exp
 
         # determine k-factor based on the rating difference between the two teams
-        if abs(home_elo - away_elo) <= 400:
-            k = 32
-        elif abs(home_elo - away_elo) <= 800:
-            k = 24
+        if abs(home_elo - away_elo) <= self.k_thresholds[0]:
+            k = self.k_factors[0]
+        elif abs(home_elo - away_elo) <= self.k_thresholds[1]:
+            k = self.k_factors[1]
         else:
-            k = 16
+            k = self.k_factors[2]
             
         # update Elo ratings based on the outcome of the game and the expected scores
         if home_score > away_score:
@@ -96,11 +183,171 @@ class EloCalculator:
             away_new_elo = away_elo + k * (0.5 - away_exp)
         return home_new_elo, away_new_elo
 
+    def match_store(self):
+        """
+        Returns the MatchStore of the matches in the EloCalculator data instance, interning the team names into the vocabulary.
+        The store, and its encoding, are built once and reused until the data instance is replaced.
+        """
+        if self._match_store is None or self._match_store_data is not self.data:
+            with Instrumentation().timer('elo.match_store'):
+                self._match_store = MatchStore.from_dataframe(self.data, self.vocabulary)
+            self._match_store_data = self.data
+        return self._match_store
+
+    def data_hash(self):
+        """
+        Returns the content hash of the EloCalculator data instance, see `result_cache.data_hash`, computed once per data instance.
+        """
+        if self._data_hash is None or self._data_hash_data is not self.data:
+            with Instrumentation().timer('elo.data_hash'):
+                self._data_hash = data_hash(self.data)
+            self._data_hash_data = self.data
+        return self._data_hash
+
+    def _cached_result(self, method, arguments, compute):
+        """
+        Returns the result of `compute()` and its result cache key, looking the result up in the result cache first, and caching
+        it on a miss. Without a result cache, the key is None.
+        """
+        if self.result_cache is None:
+            return compute(), None
+        key = self.result_cache.key(self.data_hash(), {'method': method, 'arguments': arguments, 'rating_config': self.rating_config()})
+        result = self.result_cache.get(key)
+        if result is not None:
+            Instrumentation().count('result cache hits')
+            return result, key
+        result = compute()
+        if result is not None:
+            self.result_cache.put(key, result, self.data_hash(), method)
+        return result, key
+
+    def _outputs_up_to_date(self, key, data_source, outputs):
+        """
+        Checks whether the csv outputs have already been written from the cached result of a key and have not changed since.
+        """
+        return key is not None and data_source == 'csv' and self.result_cache.outputs_up_to_date(key, outputs)
+
+    def _record_outputs(self, key, data_source, outputs):
+        if key is not None and data_source == 'csv':
+            self.result_cache.record_outputs(key, outputs)
+
+    def invalidate_cached_results(self):
+        """
+        Deletes every result of the data instance from the result cache, whatever the configuration it was calculated with.
+        
+        Returns:
+            int: the number of deleted results
+        """
+        if self.result_cache is None or not isinstance(self.data, pd.DataFrame):
+            return 0
+        return self.result_cache.invalidate(data_hash=self.data_hash())
+
+    def rating_engine(self):
+        """
+        Returns the rating engine the matches are replayed with: the `engine` of the EloCalculator, or the ClassicElo engine
+        of its rating configuration.
+        """
+        if self.engine is not None:
+            return self.engine
+        return ClassicElo(self.k_factors, self.k_thresholds, self.home_advantage)
+
+    def _encoded_matches(self, nb_matches=None):
+        teams, home_idx, away_idx, home_goals, away_goals = self.match_store().encode()
+        timestamps = self.match_store().columns['timestamp']
+        if nb_matches is not None:
+            home_idx, away_idx, home_goals, away_goals = home_idx[:nb_matches], away_idx[:nb_matches], home_goals[:nb_matches], away_goals[:nb_matches]
+            timestamps = timestamps[:nb_matches]
+        return teams, home_idx, away_idx, home_goals, away_goals, timestamps
+
+    @timed('elo.replay')
+    def replay_matches(self, nb_matches: int = None):
+        """
+        Replays the matches in the EloCalculator data instance with the rating engine, starting every team at the initial rating.
+        Engines with rating periods, e.g. Glicko2, use the matchweeks as periods, see `time_index.matchweek_ends`.
+        
+        Args:
+            nb_matches (int): optional number of matches from the start of the season to replay. If not specified, all matches are replayed.
+        
+        Returns:
+            dict: the encoded matches ('teams', 'home_idx', 'away_idx') and the replayed ratings
+            ('pre_home', 'pre_away', 'post_home', 'post_away', 'expected_home', 'ratings'), see `replay_elo_ratings`
+        """
+        teams, home_idx, away_idx, home_goals, away_goals, timestamps = self._encoded_matches(nb_matches)
+        engine = self.rating_engine()
+        initial_ratings = np.full(len(teams), float(self.initial_rating))
+        period_ends = matchweek_ends(home_idx, away_idx, timestamps) if engine.rating_period else ()
+        replay = engine.replay(home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends)
+        Instrumentation().count('matches replayed', len(home_idx))
+        return {'teams': teams, 'home_idx': home_idx, 'away_idx': away_idx, 'pre_home': replay['pre_home'], 'pre_away': replay['pre_away'],
+                'post_home': replay['post_home'], 'post_away': replay['post_away'], 'expected_home': replay['expected_home'], 'ratings': replay['ratings']}
+
+    @timed('elo.replay')
+    def replay_engines(self, engines):
+        """
+        Replays the matches in the EloCalculator data instance with several rating engines side by side, in one pass over
+        batches of matches, see `rating_engines.replay_engines`. The matchweeks are the rating periods.
+        
+        Args:
+            engines (list): the rating engines, with distinct names
+        
+        Returns:
+            dict: the replay of each engine, keyed by engine name, in the form returned by `replay_matches`
+        
+        Raises:
+            ValueError: if two engines have the same name
+        """
+        teams, home_idx, away_idx, home_goals, away_goals, timestamps = self._encoded_matches()
+        initial_ratings = np.full(len(teams), float(self.initial_rating))
+        replays = replay_engines(engines, home_idx, away_idx, home_goals, away_goals, initial_ratings,
+                                 matchweek_ends(home_idx, away_idx, timestamps))
+        Instrumentation().count('matches replayed', len(home_idx) * len(engines))
+        return {name: {'teams': teams, 'home_idx': home_idx, 'away_idx': away_idx,
+                       **{key: values for key, values in replay.items() if key != 'state'}} for name, replay in replays.items()}
+
+    def rating_history(self):
+        """
+        Returns the RatingHistory time index of the matches in the EloCalculator data instance: the ratings of every team after
+        each match, indexed by kick-off time and matchweek. The matches are replayed once, and the index is reused until the data
+        instance or the rating configuration changes.
+        
+        Raises:
+            ValueError: if the matches are not in kick-off order
+        """
+        key = (self.data, self.rating_config())
+        if self._rating_history is None or self._rating_history_key[0] is not key[0] or self._rating_history_key[1] != key[1]:
+            replay = self.replay_matches()
+            teams = replay['teams']
+            with Instrumentation().timer('elo.rating_history'):
+                self._rating_history = RatingHistory(teams, self.match_store().columns['timestamp'], replay['home_idx'], replay['away_idx'],
+                                                     replay['post_home'], replay['post_away'], np.full(len(teams), float(self.initial_rating)))
+            self._rating_history_key = key
+        return self._rating_history
+
+    def ratings_as_of(self, timestamp: int):
+        """
+        Returns the Elo rating of every team after the matches that kicked off at or before a time, see `RatingHistory.as_of`.
+        
+        Args:
+            timestamp (int): a kick-off time, in the unit of the 'date-start-timestamp' column
+        
+        Returns:
+            pd.DataFrame: the 'Team' and 'Rating' of every team
+        """
+        if not isinstance(self.data, pd.DataFrame) or self.data.empty:
+            self.error_handler.log_error(f'No data to calculate ratings from. Make sure to read in data first.')
+            return
+        try:
+            return self.rating_history().as_of(timestamp).reset_index()
+        except (KeyError, ValueError) as e:
+            self.error_handler.log_error(f'Error when accessing match data: {e}')
+
     def calculate_elo_ratings_for_one_week(self, data_source:str,  dir_or_query: str, target_week: int = None):
         """
         Calculates the Elo ratings for all teams in a premier league season, based on the outcome of the games. 
         The function takes a csv file containing match information as an input, and outputs the Elo ratings as a csv file.
         Optionally, the number of weeks of the season to consider can be specified. If not specified, the entire season will be considered.
+        Matchweeks are derived from the kick-off times and the games played by each team, see `RatingHistory`, so postponed matches
+        and midweek rounds are handled.
         
         Args:
             csv_file (str): path to the csv file containing the match information
@@ -113,87 +360,160 @@ class EloCalculator:
             self.error_handler.log_error(f'No data to calculate ratings from. Make sure to read in data first.')
             return
         
-        df = self.data
-
-        matches = df.to_dict('records')
-        # number of games per week for the league
-        nb_games_per_week = 10
-        nb_weeks_in_season = len(matches) / nb_games_per_week
+        try:
+            history = self.rating_history()
+        except (KeyError, ValueError) as e:
+            self.error_handler.log_error(f'Error when accessing match data: {e}')
+            return
         # if weeks is not specified, we consider the whole season
         if target_week is None:
-            matches_considered = matches
-        # if the number of weeks specified is greater than the total number of weeks in the season,
+            ratings = history.after_matches(history.nb_matches)
+        # if the number of weeks specified is greater than the number of matchweeks played,
         # prompt the user to specify a valid number of weeks
-        elif target_week > nb_weeks_in_season:
-            return {'error': f"Please specify a valid number of weeks (up to {nb_weeks_in_season})"}
+        elif target_week > history.nb_matchweeks:
+            return {'error': f"Please specify a valid number of weeks (up to {history.nb_matchweeks})"}
         else:
-            # calculate number of matches to be taken into account 
-            matches_to_consider = target_week * nb_games_per_week
-            matches_considered = matches[:matches_to_consider]
-        # Initialise Elo ratings for all 20 teams
-        elo_ratings = {}
-        teams = pd.unique(df[['home-name', 'away-name']].values.ravel())
-        for team in teams:
-            elo_ratings[team] = 1000
-        # Iterate through each game
-        for match in matches_considered:
-            home_team = match['home-name']
-            away_team = match['away-name']
-            home_score = match['home-result']
-            away_score = match['away-result']
-            home_elo = elo_ratings[home_team]
-            away_elo = elo_ratings[away_team]
-            # Update Elo ratings for both teams
-            home_new_elo, away_new_elo = self.calculate_individual_elo_ratings(home_score, away_score, home_elo, away_elo)
-            elo_ratings[home_team] = home_new_elo
-            elo_ratings[away_team] = away_new_elo
-        # Save the results as a csv file
-        df = pd.DataFrame(list(elo_ratings.items()), columns=['Team', 'Rating'])
-        df.to_csv(dir_or_query, index=False)
-        self.logger.info(f'Elo ratings for week {target_week} have been calculated and saved to {dir_or_query}')
+            # the ratings at the end of the matchweek, read off the rating history
+            ratings = history.as_of_matchweek(target_week)
+        df = ratings.reset_index()
 
         # Save the results
         result = self.write_data(df, data_source, dir_or_query)
-        return result
         if 'error' in result:
             self.error_handler.log_error(result['error'])
         else:
-            self.logger.info(f'Elo ratings for matches in the season have been calculated. {result["message"]}')
+            self.logger.info(f'Elo ratings for week {target_week} have been calculated. {result["message"]}')
+        return result
 
-    def calculate_elo_ratings_for_each_week(self, data_source:str, dir_or_query:str, target_week):
+    def calculate_weekly_snapshots(self, target_week: int = None):
+        """
+        Records the Elo ratings of every team at each matchweek boundary, read off the rating history of the season.
+        Week 0 holds the initial ratings, and week n holds the ratings at the end of matchweek n, see `RatingHistory`,
+        i.e. the same table `calculate_elo_ratings_for_one_week` produces for `target_week=n`.
+        
+        Args:
+            target_week (int): optional number of weeks to take snapshots for (weeks 0 to target_week - 1).
+                If not specified, snapshots are taken for every matchweek played.
+        
+        Returns:
+            pd.DataFrame: a weeks x teams matrix of Elo ratings, indexed by week.
+        """
+        if not isinstance(self.data, pd.DataFrame) or self.data.empty:
+            self.error_handler.log_error(f'No data to calculate ratings from. Make sure to read in data first.')
+            return
+        
+        try:
+            return self._weekly_snapshots(target_week)[0]
+        except (KeyError, ValueError) as e:
+            self.error_handler.log_error(f'Error when accessing match data: {e}')
+
+    def _weekly_snapshots(self, target_week):
+        """
+        Returns the weekly snapshots of `calculate_weekly_snapshots`, from the result cache if possible, and their cache key.
+        """
+        def compute():
+            history = self.rating_history()
+            # only the matchweeks played can be snapshotted
+            nb_weeks = history.nb_matchweeks + 1 if target_week is None else target_week
+            return history.matchweeks([week for week in range(nb_weeks) if week <= history.nb_matchweeks])
+        return self._cached_result('weekly_snapshots', {'target_week': target_week}, compute)
+
+    def calculate_elo_ratings_for_each_week(self, data_source:str, dir_or_query:str, target_week, consolidated: bool = False):
         """
         Calculates the Elo ratings of all teams in a premier league season based on the outcome of games, and saves the ratings for each week to a csv file.
         The function takes a csv file containing match information as an input, and the number of weeks in the season, and outputs the Elo ratings as csv files, one for each week.
+        The season is replayed only once, see `calculate_weekly_snapshots`.
         
         Args:
             csv_file (str): path to the csv file containing the match information
             output_dir (str): path to the directory where the Elo ratings will be saved as csv files
             week (int): the number of weeks in the season
-            
+            consolidated (bool): if True, `dir_or_query` is treated as a single csv file and the weeks x teams ratings matrix is saved to it.
+                With the 'db' data source, the ratings are always saved to the single table `dir_or_query`, with one (Week, Team, Rating) row per team and week.
+        
+        Returns:
+            pd.DataFrame: the weeks x teams matrix of Elo ratings, or None if the ratings could not be calculated or saved
         """
         if not isinstance(self.data, pd.DataFrame) or self.data.empty:
             self.error_handler.log_error(f'No data to calculate ratings from. Make sure to read in data first.')
             return
         try:
-            for week in range(target_week):
-                # call the calculate_elo_ratings function for each week
-                result = self.calculate_elo_ratings_for_one_week(data_source=data_source, dir_or_query=f'{dir_or_query}/week-{week}.csv', target_week=week)
-                if 'error' in result:
-                    self.error_handler.log_error(f"Error: Calculation of Elo ratings for week {week} failed. Process terminated. Details: {result['error']}")
-                    return
-            self.logger.info(f'Elo ratings for the season have been calculated and saved to {dir_or_query}')
+            snapshots, key = self._weekly_snapshots(target_week)
+            outputs = [dir_or_query] if consolidated else [f'{dir_or_query}/week-{week}.csv' for week in snapshots.index]
+            # outputs already written from the cached ratings are not rewritten
+            up_to_date = self._outputs_up_to_date(key, data_source, outputs)
+            if not up_to_date:
+                if data_source == 'db':
+                    df = snapshots.melt(ignore_index=False, var_name='Team', value_name='Rating').reset_index()
+                    result = self.write_data(df, data_source, dir_or_query)
+                    if 'error' in result:
+                        self.error_handler.log_error(f"Error: Saving the Elo ratings for each week failed. Details: {result['error']}")
+                        return
+                elif consolidated:
+                    result = self.write_data(snapshots.reset_index(), data_source, dir_or_query)
+                    if 'error' in result:
+                        self.error_handler.log_error(f"Error: Saving the Elo ratings for each week failed. Details: {result['error']}")
+                        return
+                else:
+                    for week, ratings in snapshots.iterrows():
+                        df = pd.DataFrame({'Team': snapshots.columns, 'Rating': ratings.values})
+                        result = self.write_data(df, data_source, f'{dir_or_query}/week-{week}.csv')
+                        if 'error' in result:
+                            self.error_handler.log_error(f"Error: Saving the Elo ratings for week {week} failed. Process terminated. Details: {result['error']}")
+                            return
+                self._record_outputs(key, data_source, outputs)
+            if target_week is not None and len(snapshots) < target_week:
+                # every matchweek played has been snapshotted, from matchweek 0
+                nb_matchweeks = len(snapshots) - 1
+                self.error_handler.log_error(f"Error: Calculation of Elo ratings for week {len(snapshots)} failed. Process terminated. Details: Please specify a valid number of weeks (up to {nb_matchweeks})")
+                return snapshots
+            if up_to_date:
+                self.logger.info(f'Elo ratings for the season are up to date in {dir_or_query}')
+            else:
+                self.logger.info(f'Elo ratings for the season have been calculated and saved to {dir_or_query}')
+            return snapshots
 
         except FileNotFoundError as e:
             self.error_handler.log_error(f'File not found: {e}')
         except Exception as e:
             self.error_handler.log_error(f'An error occurred: {e}')
 
-    def calculate_elo_ratings_for_each_match(self, data_source:str, file_or_query:str):
+    def archive_weekly_ratings(self, archive, league, season, target_week=None):
+        """
+        Appends the Elo ratings of every team at each matchweek boundary, see `calculate_weekly_snapshots`, to a rating archive,
+        as the block of (league, season). A block already archived for the season is superseded.
+        
+        Args:
+            archive (RatingArchive): the archive to append to
+            league (str): the league of the season, '' for the default league
+            season (str): the season
+            target_week (int): optional number of weeks to archive. If not specified, every matchweek played is archived.
+        
+        Returns:
+            pd.DataFrame: the archived weeks x teams matrix of Elo ratings
+        """
+        snapshots = self.calculate_weekly_snapshots(target_week)
+        if snapshots is None:
+            return
+        try:
+            archive.append(league, season, snapshots)
+        except (IOError, ValueError) as e:
+            self.error_handler.log_error(f'An error occurred while archiving the Elo ratings of {season}: {e}')
+            return
+        self.logger.info(f'Elo ratings for {len(snapshots)} weeks of {season} have been archived to {archive.path}')
+        return snapshots
+
+    def calculate_elo_ratings_for_each_match(self, data_source:str, file_or_query:str, outcome_model=None):
         """
         Calculates Elo ratings for each match in a Premier League season and outputs the results to a specified CSV file, while also appending selected match data, such as bookmakers' odds, date, and results, from the input CSV file.
         Args:
             csv_file: A string indicating the file path of the input CSV containing processed match results data.
             output_file: A string indicating the file path to save the output CSV with calculated Elo ratings and appended match data.
+            outcome_model: An optional fitted OrderedLogitModel. Its home win, draw and away win probabilities for each match are
+                added in the 'home-win-model', 'draw-model' and 'away-win-model' columns.
+
+        Returns:
+            pd.DataFrame: the ratings of each match, or None if they could not be calculated or saved
         """
         # get data from the EloCalculator data instance
         if not isinstance(self.data, pd.DataFrame) or self.data.empty:
@@ -201,58 +521,144 @@ class EloCalculator:
             return
         
         df = self.data
-        matches = df.to_dict('records')
-        # Initialise Elo ratings for all teams
-        elo_ratings = {}
-        try:
-            teams = pd.unique(df[['home-name', 'away-name']].values.ravel())
-            for team in teams:
-                elo_ratings[team] = 1000
-        except KeyError as e:
-            self.error_handler.log_error(f"KeyError: {e}. Make sure the data in the 'home-name' and 'away-name' columns is formatted as expected.")
-        # initialise the DataFrame to store the elo ratings and bookmakers odds
-        results_df = pd.DataFrame(columns=['home-name','away-name','home-elo','away-elo','home-win-odds','draw-odds','away-win-odds','home-result','away-result','match-date'])
-        # Iterate through each game
-        for match in matches:
+
+        def compute():
+            # Replay all the games
             try:
-                home_name = match['home-name']
-                away_name = match['away-name']
-                home_result = match['home-result']
-                away_result = match['away-result']
-                home_odds_avg = 1/(match['home-odds-avg'] + 1)
-                draw_odds_avg = 1/(match['draw-odds-avg'] + 1)
-                away_odds_avg = 1/(match['away-odds-avg'] + 1)
-                epoch_time = match['date-start-timestamp']
-                match_date = datetime.datetime.fromtimestamp(match['date-start-timestamp'])
-                home_elo = elo_ratings[home_name]
-                away_elo = elo_ratings[away_name]
-                # calculate the elo probability for home win, draw and away win
-                home_exp = 1 / (1 + 10 ** ((away_elo - home_elo) / 400))
-                away_exp = 1 - home_exp
-                draw_exp = 1 - home_exp - away_exp
-                # Calculate the Elo home/away win probabilities
-                home_win_elo = home_exp
-                away_win_elo = away_exp
-                draw_elo = 1 - (home_exp + away_exp)
-                # Calculate the probabilities using the bookmakers odds for a draw
-                # - allows for a direct comparison with the bookmakers
-                draw_elo_bookies_draw_odds = draw_odds_avg
-                home_win_elo_bookies_draw_odds = home_win_elo * (1 - draw_odds_avg)
-                away_win_elo_bookies_draw_odds = away_win_elo * (1 - draw_odds_avg)
-                # Update Elo ratings for both teams
-                home_new_elo, away_new_elo = self.calculate_individual_elo_ratings(home_result, away_result, home_elo, away_elo)
-                elo_ratings[home_name] = home_new_elo
-                elo_ratings[away_name] = away_new_elo
-                # append the results to the DataFrame
-                new_row = pd.DataFrame({'home-name':home_name,'away-name':away_name,'home-elo':home_new_elo,'away-elo':away_new_elo,'home-win-odds':home_odds_avg,'draw-odds':draw_odds_avg,'away-win-odds':away_odds_avg,'home-result':home_result,'away-result':away_result,'match-date':match_date, 'epoch_time': epoch_time, 'home-win-elo':home_win_elo,'draw-elo':draw_elo,'away-win-elo':away_win_elo, 'home_win_elo_bookies_draw_odds':home_win_elo_bookies_draw_odds, 'away_win_elo_bookies_draw_odds':away_win_elo_bookies_draw_odds, 'draw_elo_bookies_draw_odds':draw_elo_bookies_draw_odds }, index=[0])
-                results_df = pd.concat([results_df, new_row], ignore_index=True)
+                replay = self.replay_matches()
             except KeyError as e:
-                self.error_handler.log_error(f'Error when accessing match data: {e}')
+                self.error_handler.log_error(f"KeyError: {e}. Make sure the data in the 'home-name' and 'away-name' columns is formatted as expected.")
                 return
-            
+            # build the DataFrame of elo ratings and bookmakers odds column by column
+            try:
+                outcome_probabilities = outcome_model.predict(replay['expected_home']) if outcome_model is not None else None
+                with Instrumentation().timer('elo.build_match_results'):
+                    return build_match_results(df, replay['pre_home'], replay['pre_away'], replay['post_home'], replay['post_away'],
+                                               replay['expected_home'], outcome_probabilities)
+            except ValueError as e:
+                self.error_handler.log_error(f'Error when calculating the outcome probabilities: {e}')
+            except KeyError as e:
+                self.error_handler.log_error(f'Error when accessing match data: {e}')
+
+        results_df, key = self._cached_result('match_results', {'outcome_model': outcome_model.config() if outcome_model is not None else None}, compute)
+        if results_df is None:
+            return
+        # an output already written from the cached results is not rewritten
+        if self._outputs_up_to_date(key, data_source, [file_or_query]):
+            self.logger.info(f'Elo ratings for matches in the season are up to date in {file_or_query}')
+            return results_df
+
         # Save the results
         result = self.write_data(results_df, data_source, file_or_query)
         if 'error' in result:
             self.error_handler.log_error(result['error'])
+            return
+        self._record_outputs(key, data_source, [file_or_query])
+        self.logger.info(f'Elo ratings for matches in the season have been calculated. {result["message"]}')
+        return results_df
+
+    def calculate_ratings_for_each_engine(self, data_source:str, file_or_query:str, engines):
+        """
+        Replays the matches with several rating engines side by side and saves, for each match, the teams, the kick-off time and
+        the result, and for each engine the ratings of both teams after the match and the expected score of the home team,
+        in '<engine>-home-rating', '<engine>-away-rating' and '<engine>-expected-home' columns.
+        
+        Args:
+            data_source (str): 'csv' or 'db'
+            file_or_query (str): the csv file or table to save the ratings to
+            engines (list): the rating engines, with distinct names
+        
+        Returns:
+            pd.DataFrame: the saved ratings
+        """
+        if not isinstance(self.data, pd.DataFrame) or self.data.empty:
+            self.error_handler.log_error(f'No data to calculate ratings from. Make sure to read in data first.')
+            return
+        try:
+            replays = self.replay_engines(engines)
+            columns = {name: self.data[name].to_numpy() for name in ('home-name', 'away-name', 'home-result', 'away-result')}
+            columns['epoch_time'] = self.data['date-start-timestamp'].to_numpy()
+        except (KeyError, ValueError) as e:
+            self.error_handler.log_error(f'Error when accessing match data: {e}')
+            return
+        for name, replay in replays.items():
+            columns[f'{name}-home-rating'] = replay['post_home']
+            columns[f'{name}-away-rating'] = replay['post_away']
+            columns[f'{name}-expected-home'] = replay['expected_home']
+        df = pd.DataFrame(columns)
+
+        result = self.write_data(df, data_source, file_or_query)
+        if 'error' in result:
+            self.error_handler.log_error(result['error'])
+            return
+        self.logger.info(f'Ratings of {len(replays)} rating engines for matches in the season have been calculated. {result["message"]}')
+        return df
+
+    def rating_config(self):
+        """
+        Returns the rating configuration of the EloCalculator, in the form stored in rating state checkpoints.
+        The configuration of the rating engine is included when another engine than the default one is used.
+        """
+        config = {'initial_rating': self.initial_rating, 'k_factors': list(self.k_factors),
+                  'k_thresholds': list(self.k_thresholds), 'home_advantage': self.home_advantage}
+        if self.engine is not None:
+            config['engine'] = self.engine.config()
+        return config
+
+    def update_with_new_matches(self, state_file: str):
+        """
+        Updates a persisted rating state checkpoint with the matches in the EloCalculator data instance that are newer than it,
+        instead of replaying the whole history. If the checkpoint file does not exist yet, all the matches are replayed and
+        the checkpoint is created. Teams that are not in the checkpoint start at the initial rating.
+        
+        Args:
+            state_file (str): path to the JSON file holding the rating state checkpoint, see `RatingState`
+        
+        Returns:
+            pd.DataFrame: the Elo rating of every team after the update
+        """
+        if not isinstance(self.data, pd.DataFrame) or self.data.empty:
+            self.error_handler.log_error(f'No data to calculate ratings from. Make sure to read in data first.')
+            return
+
+        engine = self.rating_engine()
+        if engine.rating_period:
+            self.error_handler.log_error(f'Rating state checkpoints only hold ratings, so they cannot be updated with the {engine.name} rating engine.')
+            return
+
+        if os.path.exists(state_file):
+            try:
+                state = RatingState.load(state_file)
+            except (IOError, ValueError, KeyError) as e:
+                self.error_handler.log_error(f'An error occurred while reading the rating state {state_file}: {e}')
+                return
+            if state.config != self.rating_config():
+                self.error_handler.log_error(f'The rating state in {state_file} was calculated with a different configuration: {state.config}')
+                return
         else:
-            self.logger.info(f'Elo ratings for matches in the season have been calculated. {result["message"]}')
+            state = RatingState(config=self.rating_config())
+
+        try:
+            # select the matches the checkpoint has not seen, in kick-off order
+            df = self.data.sort_values('date-start-timestamp', kind='stable')
+            is_new = [state.is_new_match(home_name, away_name, timestamp) for home_name, away_name, timestamp
+                      in zip(df['home-name'], df['away-name'], df['date-start-timestamp'])]
+            new_matches = df[is_new]
+            if not new_matches.empty:
+                teams, home_idx, away_idx, home_goals, away_goals = encode_matches(new_matches)
+                initial_ratings = np.array([state.ratings.get(team, self.initial_rating) for team in teams], dtype=np.float64)
+                ratings = engine.replay(home_idx, away_idx, home_goals, away_goals, initial_ratings)['ratings']
+                state.ratings.update(zip(teams.tolist(), ratings.tolist()))
+                for home_name, away_name, timestamp in zip(new_matches['home-name'], new_matches['away-name'], new_matches['date-start-timestamp']):
+                    state.record_match(home_name, away_name, int(timestamp))
+        except KeyError as e:
+            self.error_handler.log_error(f'Error when accessing match data: {e}')
+            return
+
+        try:
+            state.save(state_file)
+        except IOError as e:
+            self.error_handler.log_error(f'An error occurred while saving the rating state to {state_file}: {e}')
+            return
+        self.logger.info(f'{len(new_matches)} new matches have been applied to the rating state in {state_file}')
+        return pd.DataFrame(list(state.ratings.items()), columns=['Team', 'Rating'])
@@ -0,0 +1,108 @@
+import datetime
+import numpy as np
+import pandas as pd
+from .outcome_model import OUTCOME_MODEL_COLUMNS
+
+# output columns of EloCalculator.calculate_elo_ratings_for_each_match and their types
+MATCH_RESULTS_COLUMNS = {
+    'home-name': object,
+    'away-name': object,
+    'home-elo': np.float64,
+    'away-elo': np.float64,
+    'home-win-odds': np.float64,
+    'draw-odds': np.float64,
+    'away-win-odds': np.float64,
+    'home-result': np.int64,
+    'away-result': np.int64,
+    'match-date': 'datetime64[us]',
+    'epoch_time': np.float64,
+    'home-win-elo': np.float64,
+    'draw-elo': np.float64,
+    'away-win-elo': np.float64,
+    'home_win_elo_bookies_draw_odds': np.float64,
+    'away_win_elo_bookies_draw_odds': np.float64,
+    'draw_elo_bookies_draw_odds': np.float64,
+}
+
+
+class MatchResultsBuilder:
+    """
+    Columnar builder for the per-match Elo ratings output. Typed arrays are preallocated for every output column,
+    filled one column at a time, and turned into a DataFrame once at the end, instead of appending one row at a time.
+
+    Attributes:
+        nb_matches (int): The number of rows in the output.
+        columns (dict): The preallocated column arrays, keyed by column name.
+        column_types (dict): The output columns and their types, by default MATCH_RESULTS_COLUMNS.
+
+    Methods:
+        set_column(name, values): Copies an array of values into the named column.
+        build() -> pd.DataFrame: Builds the DataFrame from the columns, in the order of column_types.
+    """
+
+    def __init__(self, nb_matches, column_types=MATCH_RESULTS_COLUMNS):
+        self.nb_matches = nb_matches
+        self.column_types = column_types
+        self.columns = {name: np.empty(nb_matches, dtype=dtype) for name, dtype in column_types.items()}
+
+    def set_column(self, name, values):
+        if name not in self.columns:
+            raise KeyError(f'{name} is not a match results column')
+        self.columns[name][:] = values
+
+    def build(self):
+        return pd.DataFrame(self.columns, columns=list(self.column_types))
+
+
+def build_match_results(df, pre_home, pre_away, post_home, post_away, expected_home, outcome_probabilities=None):
+    """
+    Builds the per-match Elo ratings output for a season from the processed match data and the replayed ratings.
+
+    Args:
+        df (pd.DataFrame): processed match results data for a season
+        pre_home, pre_away (np.ndarray): Elo ratings of the home and away teams before each match
+        post_home, post_away (np.ndarray): Elo ratings of the home and away teams after each match
+        expected_home (np.ndarray): expected score of the home team in each match, from the ratings before the match
+        outcome_probabilities (np.ndarray, optional): n x 3 home win, draw and away win probabilities of an outcome model,
+            see `OrderedLogitModel`, written to the OUTCOME_MODEL_COLUMNS after the other columns
+
+    Returns:
+        pd.DataFrame: one row per match with the columns in MATCH_RESULTS_COLUMNS, and the OUTCOME_MODEL_COLUMNS if given
+
+    Raises:
+        KeyError: if a column of the processed match data is missing
+    """
+    column_types = MATCH_RESULTS_COLUMNS
+    if outcome_probabilities is not None:
+        column_types = {**MATCH_RESULTS_COLUMNS, **{name: np.float64 for name in OUTCOME_MODEL_COLUMNS}}
+    builder = MatchResultsBuilder(len(df), column_types)
+    # bookmakers probabilities implied by the average odds
+    draw_odds_avg = 1 / (df['draw-odds-avg'].to_numpy(dtype=np.float64) + 1)
+    # the elo probability for home win, draw and away win
+    home_exp = expected_home
+    away_exp = 1 - home_exp
+    builder.set_column('home-name', df['home-name'].to_numpy())
+    builder.set_column('away-name', df['away-name'].to_numpy())
+    builder.set_column('home-elo', post_home)
+    builder.set_column('away-elo', post_away)
+    builder.set_column('home-win-odds', 1 / (df['home-odds-avg'].to_numpy(dtype=np.float64) + 1))
+    builder.set_column('draw-odds', draw_odds_avg)
+    builder.set_column('away-win-odds', 1 / (df['away-odds-avg'].to_numpy(dtype=np.float64) + 1))
+    builder.set_column('home-result', df['home-result'].to_numpy())
+    builder.set_column('away-result', df['away-result'].to_numpy())
+    # match dates are in local time, as with datetime.fromtimestamp
+    builder.set_column('match-date', [datetime.datetime.fromtimestamp(epoch_time) for epoch_time in df['date-start-timestamp'].tolist()])
+    builder.set_column('epoch_time', df['date-start-timestamp'].to_numpy())
+    builder.set_column('home-win-elo', home_exp)
+    builder.set_column('draw-elo', 1 - (home_exp + away_exp))
+    builder.set_column('away-win-elo', away_exp)
+    # Calculate the probabilities using the bookmakers odds for a draw
+    # - allows for a direct comparison with the bookmakers
+    builder.set_column('home_win_elo_bookies_draw_odds', home_exp * (1 - draw_odds_avg))
+    builder.set_column('away_win_elo_bookies_draw_odds', away_exp * (1 - draw_odds_avg))
+    builder.set_column('draw_elo_bookies_draw_odds', draw_odds_avg)
+    # the probabilities of an outcome model fitted to the results, with a draw probability of its own
+    if outcome_probabilities is not None:
+        for name, probabilities in zip(OUTCOME_MODEL_COLUMNS, np.asarray(outcome_probabilities).T):
+            builder.set_column(name, probabilities)
+    return builder.build()
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from error_handler import ErrorHandler
+from logger import Logger
+from csv_handler import CSVHandler
+from .replay_kernel import encode_matches, replay_elo_ratings
+from .replay_kernel import DEFAULT_INITIAL_RATING, DEFAULT_K_FACTORS, DEFAULT_K_THRESHOLDS, DEFAULT_HOME_ADVANTAGE
+from .match_results_builder import build_match_results
+
+
+class MultiSeasonEloCalculator:
+    """
+    This class calculates Elo ratings over several seasons in one continuous replay, carrying each team's rating over
+    from one season to the next instead of restarting every team at the initial rating.
+
+    The seasons are merged into a single match stream in kick-off order. At the start of each season after the first,
+    the ratings of returning teams are regressed towards the initial rating by `regression_to_mean`, and promoted teams
+    (teams that did not play in the previous season) start at `promoted_rating`. If `promoted_rating` is not set, promoted
+    teams take the average rating of the teams they replaced, or the initial rating if no team was replaced.
+
+    Attributes:
+        data (pd.DataFrame): The merged match data, with a 'season' column.
+        seasons (list): The season names, in the order they were played.
+        regression_to_mean (float): The fraction of the distance to the initial rating removed from each rating between seasons.
+        promoted_rating (float): The starting rating of promoted teams.
+
+    Methods:
+        replay_matches() -> Dict[str, np.ndarray]: Replays all the seasons in one pass and returns the pre- and post-match ratings.
+        calculate_elo_ratings_for_each_match(data_source: str, files_or_queries: dict) -> Dict[str, pd.DataFrame]:
+            Calculates Elo ratings for each match and saves one output per season, in the same layout as EloCalculator.
+    """
+
+    def __init__(self, data_source, files_or_queries, regression_to_mean=0.0, promoted_rating=None, initial_rating=DEFAULT_INITIAL_RATING,
+                 k_factors=DEFAULT_K_FACTORS, k_thresholds=DEFAULT_K_THRESHOLDS, home_advantage=DEFAULT_HOME_ADVANTAGE):
+        self.regression_to_mean = regression_to_mean
+        self.promoted_rating = promoted_rating
+        self.initial_rating = initial_rating
+        self.k_factors = k_factors
+        self.k_thresholds = k_thresholds
+        self.home_advantage = home_advantage
+        self.error_handler = ErrorHandler(log_destination='file')
+        self.csv_handler = CSVHandler()
+        self.logger = Logger().logger
+        self.seasons = []
+        self.data = self.read_data(data_source, files_or_queries)
+
+    def read_data(self, data_source, files_or_queries):
+        """
+        Reads the match data of each season and merges it into one match stream in kick-off order.
+
+        Args:
+            data_source (str): 'csv'
+            files_or_queries (dict): the csv file of each season, keyed by season name
+        """
+        if data_source != 'csv':
+            self.error_handler.log_error(f'Invalid data source: {data_source}. Only "csv" is supported.')
+            return
+        seasons = []
+        for season, csv_file in files_or_queries.items():
+            result = self.csv_handler.read_csv(csv_file)
+            if 'error' in result:
+                self.error_handler.log_error(result['error'])
+                return
+            seasons.append(result['data'].assign(season=season))
+        if not seasons:
+            self.error_handler.log_error('No seasons to calculate ratings from.')
+            return
+        # order the seasons by their first match, and the matches by kick-off time
+        seasons.sort(key=lambda df: df['date-start-timestamp'].min())
+        self.seasons = [df['season'].iloc[0] for df in seasons]
+        data = pd.concat(seasons, ignore_index=True)
+        return data.sort_values('date-start-timestamp', kind='stable', ignore_index=True)
+
+    def _start_season(self, ratings, teams, previous_teams):
+        """
+        Adjusts the ratings at the start of a season: returning teams are regressed to the mean and promoted teams are given a starting rating.
+        """
+        if previous_teams is None:
+            return
+        returning = np.intersect1d(teams, previous_teams)
+        promoted = np.setdiff1d(teams, previous_teams)
+        relegated = np.setdiff1d(previous_teams, teams)
+        if self.promoted_rating is not None:
+            promoted_rating = self.promoted_rating
+        elif len(relegated):
+            promoted_rating = ratings[relegated].mean()
+        else:
+            promoted_rating = self.initial_rating
+        ratings[returning] = self.initial_rating + (1 - self.regression_to_mean) * (ratings[returning] - self.initial_rating)
+        ratings[promoted] = promoted_rating
+
+    def replay_matches(self):
+        """
+        Replays all the seasons in one pass with the replay kernel, adjusting the ratings between seasons.
+
+        Returns:
+            dict: the encoded matches ('teams', 'home_idx', 'away_idx') and the replayed ratings
+            ('pre_home', 'pre_away', 'post_home', 'post_away', 'expected_home', 'ratings'), see `replay_elo_ratings`
+        """
+        teams, home_idx, away_idx, home_goals, away_goals = encode_matches(self.data)
+        ratings = np.full(len(teams), float(self.initial_rating))
+        n = len(self.data)
+        replay = {name: np.empty(n) for name in ('pre_home', 'pre_away', 'post_home', 'post_away', 'expected_home')}
+        season_labels = self.data['season'].to_numpy()
+        previous_teams = None
+        for season in self.seasons:
+            rows = np.flatnonzero(season_labels == season)
+            season_teams = np.union1d(home_idx[rows], away_idx[rows])
+            self._start_season(ratings, season_teams, previous_teams)
+            *season_replay, ratings = replay_elo_ratings(home_idx[rows], away_idx[rows], home_goals[rows], away_goals[rows], ratings,
+                                                         self.k_factors, self.k_thresholds, self.home_advantage)
+            for name, values in zip(('pre_home', 'pre_away', 'post_home', 'post_away', 'expected_home'), season_replay):
+                replay[name][rows] = values
+            previous_teams = season_teams
+        return {'teams': teams, 'home_idx': home_idx, 'away_idx': away_idx, **replay, 'ratings': ratings}
+
+    def calculate_elo_ratings_for_each_match(self, data_source: str, files_or_queries: dict):
+        """
+        Calculates Elo ratings for each match of every season in one continuous replay, and saves the results of each season
+        in the same layout as EloCalculator.calculate_elo_ratings_for_each_match (e.g. match-data/index.csv).
+
+        Args:
+            data_source (str): 'csv'
+            files_or_queries (dict): the output csv file of each season, keyed by season name. Seasons without an output file are not saved.
+
+        Returns:
+            dict: the per-match results of each season, keyed by season name
+        """
+        if not isinstance(self.data, pd.DataFrame) or self.data.empty:
+            self.error_handler.log_error(f'No data to calculate ratings from. Make sure to read in data first.')
+            return
+        if data_source != 'csv':
+            self.error_handler.log_error(f'Invalid data source: {data_source}. Only "csv" is supported.')
+            return
+        try:
+            replay = self.replay_matches()
+            results_df = build_match_results(self.data, replay['pre_home'], replay['pre_away'], replay['post_home'], replay['post_away'], replay['expected_home'])
+        except KeyError as e:
+            self.error_handler.log_error(f'Error when accessing match data: {e}')
+            return
+
+        season_labels = self.data['season'].to_numpy()
+        results = {}
+        for season in self.seasons:
+            results[season] = results_df[season_labels == season].reset_index(drop=True)
+            if season not in files_or_queries:
+                continue
+            result = self.csv_handler.write_csv(results[season], files_or_queries[season])
+            if 'error' in result:
+                self.error_handler.log_error(result['error'])
+            else:
+                self.logger.info(f'Elo ratings for matches in the {season} season have been calculated. {result["message"]}')
+        return results
@@ -0,0 +1,163 @@
+import json
+import numpy as np
+
+# output columns of EloCalculator.calculate_elo_ratings_for_each_match holding the probabilities of an outcome model
+OUTCOME_MODEL_COLUMNS = ['home-win-model', 'draw-model', 'away-win-model']
+# expected scores are clipped to this distance from 0 and 1 before taking their logit
+EPSILON = 1e-12
+
+
+def _sigmoid(x):
+    return 0.5 * (1 + np.tanh(0.5 * x))
+
+
+class OrderedLogitModel:
+    """
+    A three-outcome probability model of a match, fitted on the Elo expected scores. The Elo expected score of the home team
+    E has no draw probability, so the outcome is modelled with an ordered logit on the rating difference, taken as the logit
+    of the expected score x = log(E / (1 - E)) (for the ClassicElo engine, the rating difference with the home advantage, in
+    units of 400 / ln(10) points). Any rating engine giving expected scores can therefore be used:
+
+        P(away win) = sigmoid(away_cut - slope * x)
+        P(draw) = sigmoid(draw_cut - slope * x) - sigmoid(away_cut - slope * x)
+        P(home win) = 1 - sigmoid(draw_cut - slope * x)
+
+    The slope and the two cut points (away_cut < draw_cut) are fitted by maximum likelihood over every match of the history,
+    with a vectorised log-likelihood and its gradient, using scipy's L-BFGS-B, which takes well under a second for all the
+    seasons. The draw probability is highest for evenly matched teams, and the home advantage left in the results after the Elo
+    home advantage is absorbed by the cut points.
+
+    Attributes:
+        slope (float): The weight of the rating difference, or None if the model is not fitted.
+        away_cut (float): The cut point between an away win and a draw.
+        draw_cut (float): The cut point between a draw and a home win.
+        nb_matches (int): The number of matches the model was fitted on.
+        log_likelihood (float): The log-likelihood of those matches.
+
+    Methods:
+        features(expected_home) -> np.ndarray: Returns the logit of the expected scores.
+        predict(expected_home) -> np.ndarray: Returns the n x 3 home win, draw and away win probabilities.
+        fit(expected_home, home_goals, away_goals) -> OrderedLogitModel: Fits the model to the results of matches.
+        fit_calculators(elo_calculators) -> OrderedLogitModel: Fits the model to the matches of several EloCalculators.
+        config() -> dict: Returns the parameters of the model.
+        save(model_file): Saves the parameters to a JSON file.
+        load(model_file) -> OrderedLogitModel: Loads the parameters from a JSON file.
+    """
+
+    def __init__(self, slope=None, away_cut=None, draw_cut=None, nb_matches=0, log_likelihood=None):
+        self.slope = slope
+        self.away_cut = away_cut
+        self.draw_cut = draw_cut
+        self.nb_matches = nb_matches
+        self.log_likelihood = log_likelihood
+
+    @property
+    def is_fitted(self):
+        return self.slope is not None
+
+    def features(self, expected_home):
+        """
+        Returns the logit of the expected scores of the home team, clipped away from 0 and 1.
+        """
+        expected_home = np.clip(np.asarray(expected_home, dtype=np.float64), EPSILON, 1 - EPSILON)
+        return np.log(expected_home / (1 - expected_home))
+
+    def predict(self, expected_home):
+        """
+        Returns the n x 3 home win, draw and away win probabilities of matches, from the expected score of the home team.
+
+        Raises:
+            ValueError: if the model is not fitted
+        """
+        if not self.is_fitted:
+            raise ValueError('The outcome model has not been fitted')
+        x = self.features(expected_home)
+        away = _sigmoid(self.away_cut - self.slope * x)
+        away_or_draw = _sigmoid(self.draw_cut - self.slope * x)
+        return np.column_stack([1 - away_or_draw, away_or_draw - away, away])
+
+    @staticmethod
+    def _negative_log_likelihood(params, x, outcome):
+        """
+        Returns the negative log-likelihood of the outcomes (0 away win, 1 draw, 2 home win) and its gradient with respect to
+        (slope, away_cut, log(draw_cut - away_cut)). The gap between the cut points is optimised on a log scale, so they stay in order.
+        """
+        slope, away_cut, log_gap = params
+        gap = np.exp(log_gap)
+        z_away = away_cut - slope * x
+        z_draw = z_away + gap
+        s_away, s_draw = _sigmoid(z_away), _sigmoid(z_draw)
+        is_away, is_draw, is_home = outcome == 0, outcome == 1, outcome == 2
+        p_draw = np.maximum(s_draw - s_away, EPSILON)
+        # log-likelihood of each match, with log(sigmoid(z)) = -logaddexp(0, -z)
+        log_likelihood = np.where(is_away, -np.logaddexp(0, -z_away), np.where(is_home, -np.logaddexp(0, z_draw), np.log(p_draw)))
+        # derivatives of the log-likelihood of each match with respect to z_away and z_draw
+        d_away = np.where(is_away, 1 - s_away, np.where(is_draw, -s_away * (1 - s_away) / p_draw, 0.0))
+        d_draw = np.where(is_home, -s_draw, np.where(is_draw, s_draw * (1 - s_draw) / p_draw, 0.0))
+        gradient = np.array([-(x * (d_away + d_draw)).sum(), (d_away + d_draw).sum(), gap * d_draw.sum()])
+        return -log_likelihood.sum(), -gradient
+
+    def fit(self, expected_home, home_goals, away_goals):
+        """
+        Fits the model by maximum likelihood to the results of matches.
+
+        Args:
+            expected_home (np.ndarray): the expected score of the home team in each match, from the ratings before the match
+            home_goals, away_goals (np.ndarray): the number of goals of the home and away team in each match
+
+        Returns:
+            OrderedLogitModel: the fitted model
+
+        Raises:
+            ValueError: if the matches do not have all three outcomes, or the optimisation fails
+        """
+        # scipy is only imported when a model is fitted
+        from scipy.optimize import minimize
+        x = self.features(expected_home)
+        home_goals, away_goals = np.asarray(home_goals), np.asarray(away_goals)
+        outcome = np.where(home_goals > away_goals, 2, np.where(home_goals < away_goals, 0, 1))
+        frequencies = np.bincount(outcome, minlength=3) / max(len(outcome), 1)
+        if len(outcome) != len(x) or (frequencies == 0).any():
+            raise ValueError('The outcome model needs the expected scores of matches with home wins, draws and away wins')
+        # start from the outcome frequencies, with the slope of a logistic model of the expected score
+        away_cut = np.log(frequencies[0] / (1 - frequencies[0]))
+        draw_cut = np.log((frequencies[0] + frequencies[1]) / frequencies[2])
+        result = minimize(self._negative_log_likelihood, np.array([1.0, away_cut, np.log(draw_cut - away_cut)]),
+                          args=(x, outcome), jac=True, method='L-BFGS-B')
+        if not result.success:
+            raise ValueError(f'The outcome model could not be fitted: {result.message}')
+        slope, away_cut, log_gap = result.x
+        self.slope, self.away_cut, self.draw_cut = float(slope), float(away_cut), float(away_cut + np.exp(log_gap))
+        self.nb_matches, self.log_likelihood = len(outcome), float(-result.fun)
+        return self
+
+    def fit_calculators(self, elo_calculators):
+        """
+        Fits the model to the matches of several EloCalculators, e.g. one for each season of the history, with the expected
+        scores of their rating engine.
+
+        Raises:
+            KeyError: if a column of the processed match data is missing
+            ValueError: if the model cannot be fitted
+        """
+        expected_home, home_goals, away_goals = [], [], []
+        for elo_calculator in elo_calculators:
+            expected_home.append(elo_calculator.replay_matches()['expected_home'])
+            home_goals.append(elo_calculator.data['home-result'].to_numpy())
+            away_goals.append(elo_calculator.data['away-result'].to_numpy())
+        if not expected_home:
+            raise ValueError('No matches to fit the outcome model to')
+        return self.fit(np.concatenate(expected_home), np.concatenate(home_goals), np.concatenate(away_goals))
+
+    def config(self):
+        return {'model': 'ordered-logit', 'slope': self.slope, 'away_cut': self.away_cut, 'draw_cut': self.draw_cut}
+
+    def save(self, model_file):
+        with open(model_file, 'w') as f:
+            json.dump({**self.config(), 'nb_matches': self.nb_matches, 'log_likelihood': self.log_likelihood}, f, indent=2)
+
+    @classmethod
+    def load(cls, model_file):
+        with open(model_file, 'r') as f:
+            model = json.load(f)
+        return cls(model['slope'], model['away_cut'], model['draw_cut'], model['nb_matches'], model['log_likelihood'])
@@ -0,0 +1,137 @@
+import itertools
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from logger import Logger
+from error_handler import ErrorHandler
+from csv_handler import CSVHandler
+from .replay_kernel import encode_matches, replay_elo_ratings
+from .replay_kernel import DEFAULT_INITIAL_RATING, DEFAULT_K_FACTORS, DEFAULT_K_THRESHOLDS, DEFAULT_HOME_ADVANTAGE
+
+# the rating configuration parameters that can be swept, and their default values
+SWEEP_PARAMETERS = {
+    'k_factors': DEFAULT_K_FACTORS,
+    'k_thresholds': DEFAULT_K_THRESHOLDS,
+    'initial_rating': DEFAULT_INITIAL_RATING,
+    'home_advantage': DEFAULT_HOME_ADVANTAGE,
+}
+
+
+def score_expected_results(expected_home, home_goals, away_goals):
+    """
+    Scores the expected home scores of a set of matches against the actual results, where a home win scores 1,
+    a draw 0.5 and an away win 0.
+
+    Returns:
+        dict: the 'log_loss' and 'brier' score of the expected scores, lower is better
+    """
+    actual = np.where(home_goals > away_goals, 1.0, np.where(home_goals < away_goals, 0.0, 0.5))
+    expected = np.clip(expected_home, 1e-15, 1 - 1e-15)
+    log_loss = -np.mean(actual * np.log(expected) + (1 - actual) * np.log(1 - expected))
+    brier = np.mean((expected_home - actual) ** 2)
+    return {'log_loss': log_loss, 'brier': brier}
+
+
+def _score_configurations(seasons, configurations):
+    """
+    Replays every season once per configuration and scores the expected results. Runs in a worker process.
+    """
+    rows = []
+    for config_id, config in configurations:
+        for season, (n_teams, home_idx, away_idx, home_goals, away_goals) in seasons.items():
+            initial_ratings = np.full(n_teams, float(config['initial_rating']))
+            _, _, _, _, expected_home, _ = replay_elo_ratings(home_idx, away_idx, home_goals, away_goals, initial_ratings,
+                                                              config['k_factors'], config['k_thresholds'], config['home_advantage'])
+            scores = score_expected_results(expected_home, home_goals, away_goals)
+            rows.append({'config_id': config_id, 'season': season, 'nb_matches': len(home_idx), **config, **scores})
+    return rows
+
+
+class ParameterSweep:
+    """
+    This class evaluates a grid of Elo rating configurations over one or more seasons of processed match data.
+    Each season is replayed once per configuration with the replay kernel, and the expected results are scored
+    against the actual results with log-loss and the Brier score. Configurations are spread across a process pool.
+
+    Attributes:
+        seasons (dict): The processed match data for each season, keyed by season name.
+        grid (dict): The values to try for each of the parameters in SWEEP_PARAMETERS. Missing parameters use their default.
+        max_workers (int): The number of worker processes. If 1, the sweep runs in the current process.
+
+    Methods:
+        configurations() -> List[dict]: Expands the grid into a list of configurations.
+        run(by_season: bool = False) -> pd.DataFrame: Runs the sweep and returns the scored table, best configuration first.
+    """
+
+    def __init__(self, seasons, grid, max_workers=None):
+        """
+        Raises:
+            ValueError: if a parameter of the grid has no values to try
+        """
+        self.logger = Logger().logger
+        self.error_handler = ErrorHandler(log_destination='file')
+        self.csv_handler = CSVHandler()
+        self.grid = grid
+        self._check_grid()
+        self.max_workers = max_workers
+        self.seasons = {}
+        for season, data in seasons.items():
+            # seasons can be given as DataFrames or paths to processed csv files
+            if isinstance(data, str):
+                result = self.csv_handler.read_csv(data)
+                if 'error' in result:
+                    self.error_handler.log_error(result['error'])
+                    continue
+                data = result['data']
+            self.seasons[season] = data
+
+    def _check_grid(self):
+        # an empty list of values would give no configuration at all
+        empty = [name for name, values in self.grid.items() if len(values) == 0]
+        if empty:
+            raise ValueError(f'The sweep parameters {empty} have no values to try.')
+
+    def configurations(self):
+        unknown = set(self.grid) - set(SWEEP_PARAMETERS)
+        if unknown:
+            raise KeyError(f'Unknown sweep parameters: {sorted(unknown)}. Choose from {list(SWEEP_PARAMETERS)}.')
+        self._check_grid()
+        values = [self.grid.get(name, [default]) for name, default in SWEEP_PARAMETERS.items()]
+        return [dict(zip(SWEEP_PARAMETERS, combination)) for combination in itertools.product(*values)]
+
+    def run(self, by_season=False):
+        if not self.seasons:
+            self.error_handler.log_error('No seasons to run the parameter sweep on.')
+            return
+        try:
+            configurations = list(enumerate(self.configurations()))
+        except (KeyError, ValueError) as e:
+            self.error_handler.log_error(str(e))
+            return
+        # encode every season once, the workers only receive the arrays
+        seasons = {}
+        for season, df in self.seasons.items():
+            teams, home_idx, away_idx, home_goals, away_goals = encode_matches(df)
+            seasons[season] = (len(teams), home_idx, away_idx, home_goals, away_goals)
+
+        if self.max_workers == 1:
+            rows = _score_configurations(seasons, configurations)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                nb_chunks = (self.max_workers or os.cpu_count() or 1) * 4
+                chunks = [configurations[i::nb_chunks] for i in range(nb_chunks)]
+                rows = [row for chunk_rows in executor.map(_score_configurations, itertools.repeat(seasons), chunks) for row in chunk_rows]
+
+        results = pd.DataFrame(rows)
+        self.logger.info(f'Parameter sweep of {len(configurations)} configurations over {len(seasons)} seasons has finished.')
+        if by_season:
+            return results.sort_values(['config_id', 'season'], ignore_index=True)
+        # weight the scores of each season by its number of matches
+        for score in ('log_loss', 'brier'):
+            results[score] *= results['nb_matches']
+        summary = results.groupby('config_id').agg(
+            {**{name: 'first' for name in SWEEP_PARAMETERS}, 'nb_matches': 'sum', 'log_loss': 'sum', 'brier': 'sum'})
+        for score in ('log_loss', 'brier'):
+            summary[score] /= summary['nb_matches']
+        return summary.sort_values('log_loss').reset_index()
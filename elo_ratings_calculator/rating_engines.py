@@ -0,0 +1,365 @@
+import math
+from abc import ABC, abstractmethod
+import numpy as np
+from .replay_kernel import replay_elo_ratings
+from .replay_kernel import DEFAULT_INITIAL_RATING, DEFAULT_K_FACTORS, DEFAULT_K_THRESHOLDS, DEFAULT_HOME_ADVANTAGE
+
+# Glicko-2 scale factor between Glicko ratings and the Glicko-2 internal scale
+GLICKO2_SCALE = 173.7178
+
+
+def match_scores(home_goals, away_goals):
+    """
+    Returns the score of the home team in each match: 1 for a win, 0.5 for a draw and 0 for a loss.
+    """
+    return np.where(home_goals > away_goals, 1.0, np.where(home_goals < away_goals, 0.0, 0.5))
+
+
+def elo_expected_scores(home_ratings, away_ratings, home_advantage):
+    """
+    Returns the Elo expected score of the home team in each match, as one array operation. The vectorised power of NumPy
+    can differ from the scalar power of `replay_kernel.replay_elo_ratings` in the last bit, so ratings replayed in batches
+    agree with the kernel to a tolerance (about 1e-9 rating points over a season) rather than exactly.
+    """
+    return 1 / (1 + np.power(10.0, (away_ratings - (home_ratings + home_advantage)) / 400))
+
+
+class RatingEngine(ABC):
+    """
+    Base class of the rating engines. An engine updates the ratings of a batch of matches in which no team plays twice
+    as one array operation, see `replay_engines`. Engines that update the ratings once per rating period (`rating_period`
+    is True) collect the results of the batches of a period and update the ratings at the end of the period.
+
+    Subclasses must implement `update`, so an engine without it cannot be created, and implement `end_period` if they use
+    rating periods.
+
+    Attributes:
+        name (str): The name of the engine, used as the key of its results.
+        rating_period (bool): Whether the ratings are updated at the end of each rating period rather than after each batch.
+
+    Methods:
+        initial_state(initial_ratings) -> dict: Returns the state of the engine before the first match.
+        update(state, home_idx, away_idx, home_goals, away_goals) -> np.ndarray: Applies a batch of matches and returns the
+            expected score of the home team in each match.
+        end_period(state): Applies the results of a rating period.
+        replay(home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends=()) -> dict:
+            Replays a sequence of matches with this engine alone.
+        config() -> dict: Returns the parameters of the engine.
+    """
+    name = 'engine'
+    rating_period = False
+
+    def __init__(self, name=None):
+        if name is not None:
+            self.name = name
+
+    def initial_state(self, initial_ratings):
+        """
+        Returns the state of the engine before the first match: a dictionary of arrays indexed by team id, whose 'ratings'
+        array holds the current rating of each team.
+        """
+        return {'ratings': np.array(initial_ratings, dtype=np.float64)}
+
+    @abstractmethod
+    def update(self, state, home_idx, away_idx, home_goals, away_goals):
+        """
+        Applies a batch of matches to the state of the engine, in place.
+
+        Args:
+            state (dict): the state returned by `initial_state`, whose arrays are indexed by team id. The 'ratings' array must
+                hold the rating of each team after the batch, or at the end of the period for engines with rating periods.
+            home_idx, away_idx (np.ndarray): the team ids of the home and away teams of the matches. No team plays twice in a
+                batch, so the arrays can be updated with fancy indexing.
+            home_goals, away_goals (np.ndarray): the number of goals of the home and away team in each match
+
+        Returns:
+            np.ndarray: the expected score of the home team in each match, from the state before the batch
+        """
+
+    def end_period(self, state):
+        pass
+
+    def replay(self, home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends=()):
+        """
+        Replays a sequence of matches with this engine alone, see `replay_engines`.
+        """
+        return replay_engines([self], home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends)[self.name]
+
+    def config(self):
+        return {'engine': type(self).__name__}
+
+
+class ClassicElo(RatingEngine):
+    """
+    The Elo rating of EloCalculator: the k-factor depends on the rating difference of the teams, and the expected scores
+    include the home advantage. This engine is always replayed with `replay_kernel.replay_elo_ratings`, alone or side by side
+    with other engines, so it gives exactly the ratings of the kernel. Its batched `update`, used by the engines derived from
+    it, agrees with the kernel to a tolerance, see `elo_expected_scores`.
+    """
+    name = 'elo'
+
+    def __init__(self, k_factors=DEFAULT_K_FACTORS, k_thresholds=DEFAULT_K_THRESHOLDS, home_advantage=DEFAULT_HOME_ADVANTAGE, name=None):
+        super().__init__(name)
+        self.k_factors = tuple(k_factors)
+        self.k_thresholds = tuple(k_thresholds)
+        self.home_advantage = home_advantage
+
+    def k_factor(self, home_ratings, away_ratings, home_goals, away_goals):
+        difference = np.abs(home_ratings - away_ratings)
+        return np.where(difference <= self.k_thresholds[0], float(self.k_factors[0]),
+                        np.where(difference <= self.k_thresholds[1], float(self.k_factors[1]), float(self.k_factors[2])))
+
+    def update(self, state, home_idx, away_idx, home_goals, away_goals):
+        ratings = state['ratings']
+        home_ratings, away_ratings = ratings[home_idx], ratings[away_idx]
+        home_exp = elo_expected_scores(home_ratings, away_ratings, self.home_advantage)
+        away_exp = 1 - home_exp
+        k = self.k_factor(home_ratings, away_ratings, home_goals, away_goals)
+        home_score = match_scores(home_goals, away_goals)
+        ratings[home_idx] = home_ratings + k * (home_score - home_exp)
+        ratings[away_idx] = away_ratings + k * ((1 - home_score) - away_exp)
+        return home_exp
+
+    def replay(self, home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends=()):
+        """
+        Replays a sequence of matches with the replay kernel, which gives the same ratings as the batches and is faster
+        for a single engine, see `replay_kernel.replay_elo_ratings`.
+        """
+        if type(self) is not ClassicElo:
+            return super().replay(home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends)
+        pre_home, pre_away, post_home, post_away, expected_home, ratings = replay_elo_ratings(
+            home_idx, away_idx, home_goals, away_goals, initial_ratings, self.k_factors, self.k_thresholds, self.home_advantage)
+        return {'pre_home': pre_home, 'pre_away': pre_away, 'post_home': post_home, 'post_away': post_away,
+                'expected_home': expected_home, 'ratings': ratings, 'state': {'ratings': ratings.copy()}}
+
+    def config(self):
+        return {'engine': type(self).__name__, 'k_factors': list(self.k_factors), 'k_thresholds': list(self.k_thresholds),
+                'home_advantage': self.home_advantage}
+
+
+class GoalDifferenceElo(ClassicElo):
+    """
+    Elo rating with the k-factor of ClassicElo scaled by the goal difference, as in the World Football Elo Ratings:
+    by 1 for a draw or a one goal win, 1.5 for a two goal win, and (11 + goal difference) / 8 above.
+    """
+    name = 'goal_difference_elo'
+
+    def k_factor(self, home_ratings, away_ratings, home_goals, away_goals):
+        goal_difference = np.abs(np.asarray(home_goals) - np.asarray(away_goals))
+        multiplier = np.where(goal_difference <= 1, 1.0, np.where(goal_difference == 2, 1.5, (11 + goal_difference) / 8))
+        return super().k_factor(home_ratings, away_ratings, home_goals, away_goals) * multiplier
+
+
+class Glicko2(RatingEngine):
+    """
+    Glicko-2 rating (Glickman, "Example of the Glicko-2 system"), with each matchweek as a rating period. Every team has
+    a rating, a rating deviation (RD) and a volatility. The matches of a period are all evaluated against the ratings at the
+    start of the period, and the ratings, deviations and volatilities of the teams that played are updated together at the
+    end of the period, the volatility with the Illinois algorithm run on all the teams at once. The deviation of teams that
+    did not play grows with their volatility, up to the initial deviation. The home advantage is added to the rating of the
+    home team in the expected scores, in rating points.
+
+    The expected score of a match is E(mu_home - mu_away) with the g(phi) weight of the away team, so it also falls between
+    0 and 1 and can be evaluated like the Elo expected score.
+    """
+    name = 'glicko2'
+    rating_period = True
+
+    def __init__(self, initial_deviation=350.0, initial_volatility=0.06, tau=0.5, home_advantage=DEFAULT_HOME_ADVANTAGE,
+                 tolerance=1e-6, name=None):
+        super().__init__(name)
+        self.initial_deviation = initial_deviation
+        self.initial_volatility = initial_volatility
+        self.tau = tau
+        self.home_advantage = home_advantage
+        self.tolerance = tolerance
+
+    def initial_state(self, initial_ratings):
+        ratings = np.array(initial_ratings, dtype=np.float64)
+        n_teams = len(ratings)
+        return {
+            'ratings': ratings,
+            # the ratings on the Glicko-2 scale are relative to the initial rating of the first team
+            'origin': float(ratings[0]) if n_teams else float(DEFAULT_INITIAL_RATING),
+            'deviations': np.full(n_teams, float(self.initial_deviation)),
+            'volatilities': np.full(n_teams, float(self.initial_volatility)),
+            # results of the current period: sum of g^2 E (1 - E), sum of g (s - E) and whether the team played
+            'information': np.zeros(n_teams),
+            'improvement': np.zeros(n_teams),
+            'played': np.zeros(n_teams, dtype=bool),
+        }
+
+    @staticmethod
+    def _g(phi):
+        return 1 / np.sqrt(1 + 3 * phi ** 2 / math.pi ** 2)
+
+    def update(self, state, home_idx, away_idx, home_goals, away_goals):
+        mu_home = (state['ratings'][home_idx] + self.home_advantage - state['origin']) / GLICKO2_SCALE
+        mu_away = (state['ratings'][away_idx] - state['origin']) / GLICKO2_SCALE
+        phi_home = state['deviations'][home_idx] / GLICKO2_SCALE
+        phi_away = state['deviations'][away_idx] / GLICKO2_SCALE
+        home_score = match_scores(home_goals, away_goals)
+        # each side of the match is a game against the other team, weighted by the other team's deviation
+        g_away, g_home = self._g(phi_away), self._g(phi_home)
+        home_exp = 1 / (1 + np.exp(-g_away * (mu_home - mu_away)))
+        away_exp = 1 / (1 + np.exp(-g_home * (mu_away - mu_home)))
+        # no team plays twice in a batch, so the results can be added with fancy indexing
+        state['information'][home_idx] += g_away ** 2 * home_exp * (1 - home_exp)
+        state['information'][away_idx] += g_home ** 2 * away_exp * (1 - away_exp)
+        state['improvement'][home_idx] += g_away * (home_score - home_exp)
+        state['improvement'][away_idx] += g_home * ((1 - home_score) - away_exp)
+        state['played'][home_idx] = True
+        state['played'][away_idx] = True
+        return home_exp
+
+    def _new_volatilities(self, phi, sigma, delta, v):
+        """
+        Solves for the new volatility of each team with the Illinois algorithm, step 5 of Glicko-2, on all the teams at once.
+        """
+        a = np.log(sigma ** 2)
+        tau2 = self.tau ** 2
+
+        def f(x):
+            ex = np.exp(x)
+            return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau2
+
+        A = a.copy()
+        B = np.where(delta ** 2 > phi ** 2 + v, np.log(np.maximum(delta ** 2 - phi ** 2 - v, 1e-300)), a - self.tau)
+        # bracket the root from below where delta^2 <= phi^2 + v
+        needs_bracket = delta ** 2 <= phi ** 2 + v
+        k = np.ones_like(a)
+        while True:
+            f_b = f(a - k * self.tau)
+            extend = needs_bracket & (f_b < 0)
+            if not extend.any():
+                break
+            k[extend] += 1
+        B = np.where(needs_bracket, a - k * self.tau, B)
+        f_a, f_b = f(A), f(B)
+        for _ in range(100):
+            active = np.abs(B - A) > self.tolerance
+            if not active.any():
+                break
+            C = A + (A - B) * f_a / (f_b - f_a)
+            f_c = f(C)
+            replace_a = f_c * f_b <= 0
+            A = np.where(active, np.where(replace_a, B, A), A)
+            f_a = np.where(active, np.where(replace_a, f_b, f_a / 2), f_a)
+            B = np.where(active, C, B)
+            f_b = np.where(active, f_c, f_b)
+        return np.exp(A / 2)
+
+    def end_period(self, state):
+        played = state['played']
+        phi = state['deviations'] / GLICKO2_SCALE
+        sigma = state['volatilities']
+        max_phi = self.initial_deviation / GLICKO2_SCALE
+        # teams that did not play: only the deviation grows
+        new_phi = np.minimum(np.sqrt(phi ** 2 + sigma ** 2), max_phi)
+        if played.any():
+            v = 1 / state['information'][played]
+            delta = v * state['improvement'][played]
+            new_sigma = self._new_volatilities(phi[played], sigma[played], delta, v)
+            phi_star = np.sqrt(phi[played] ** 2 + new_sigma ** 2)
+            phi_played = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+            mu = (state['ratings'][played] - state['origin']) / GLICKO2_SCALE
+            state['ratings'][played] = state['origin'] + GLICKO2_SCALE * (mu + phi_played ** 2 * state['improvement'][played])
+            state['volatilities'][played] = new_sigma
+            new_phi[played] = phi_played
+        state['deviations'][:] = new_phi * GLICKO2_SCALE
+        state['information'][:] = 0
+        state['improvement'][:] = 0
+        played[:] = False
+
+    def config(self):
+        return {'engine': type(self).__name__, 'initial_deviation': self.initial_deviation, 'initial_volatility': self.initial_volatility,
+                'tau': self.tau, 'tolerance': self.tolerance, 'home_advantage': self.home_advantage}
+
+
+def replay_batches(home_idx, away_idx, period_ends=()):
+    """
+    Splits a sequence of matches into consecutive batches in which no team plays twice, and which do not cross the end of a
+    rating period. Applying the batches one after the other gives the same ratings as applying the matches one at a time.
+
+    Args:
+        home_idx, away_idx (np.ndarray): The team ids of the home and away team of each match.
+        period_ends (array-like): The number of matches played by the end of each rating period.
+
+    Returns:
+        np.ndarray: The start of each batch, followed by the number of matches.
+    """
+    period_ends = set(int(end) for end in period_ends)
+    starts = [0]
+    teams_in_batch = set()
+    for i, (home, away) in enumerate(zip(np.asarray(home_idx).tolist(), np.asarray(away_idx).tolist())):
+        if (home in teams_in_batch or away in teams_in_batch or i in period_ends) and i != starts[-1]:
+            starts.append(i)
+            teams_in_batch = set()
+        teams_in_batch.add(home)
+        teams_in_batch.add(away)
+    starts.append(len(home_idx))
+    return np.array(starts, dtype=np.int64)
+
+
+def replay_engines(engines, home_idx, away_idx, home_goals, away_goals, initial_ratings, period_ends=()):
+    """
+    Replays a sequence of matches with several rating engines side by side, in one pass over the batches of `replay_batches`.
+    ClassicElo engines are replayed with the replay kernel instead, which is faster for them and exact, see `ClassicElo.replay`.
+
+    Args:
+        engines (list): The rating engines, with distinct names.
+        home_idx, away_idx (np.ndarray): The team ids of the home and away team of each match.
+        home_goals, away_goals (np.ndarray): The goals scored by the home and away team in each match.
+        initial_ratings (np.ndarray): The rating of each team before the first match.
+        period_ends (array-like): The number of matches played by the end of each rating period, e.g. the matchweek ends of
+            `time_index.matchweek_ends`. The last period ends with the last match.
+
+    Returns:
+        dict: for each engine name, the replay in the form of `EloCalculator.replay_matches` ('pre_home', 'pre_away', 'post_home',
+            'post_away', 'expected_home', 'ratings') and the final 'state' of the engine. The post-match ratings of an engine with
+            rating periods are the ratings at the end of the period of the match.
+
+    Raises:
+        ValueError: if two engines have the same name
+    """
+    names = [engine.name for engine in engines]
+    if len(set(names)) != len(names):
+        raise ValueError(f'The rating engines must have distinct names: {names}')
+    n = len(home_idx)
+    home_idx, away_idx = np.asarray(home_idx), np.asarray(away_idx)
+    home_goals, away_goals = np.asarray(home_goals), np.asarray(away_goals)
+    kernel_replays = {engine.name: engine.replay(home_idx, away_idx, home_goals, away_goals, initial_ratings)
+                      for engine in engines if type(engine) is ClassicElo}
+    engines = [engine for engine in engines if engine.name not in kernel_replays]
+    if not engines:
+        return {name: kernel_replays[name] for name in names}
+    period_ends = np.asarray([end for end in period_ends if 0 < end < n] + [n], dtype=np.int64) if n else np.zeros(0, dtype=np.int64)
+    batches = replay_batches(home_idx, away_idx, period_ends)
+    replays = {}
+    for engine in engines:
+        replays[engine.name] = {'state': engine.initial_state(initial_ratings),
+                                **{name: np.empty(n) for name in ('pre_home', 'pre_away', 'post_home', 'post_away', 'expected_home')}}
+    period_start, next_period = 0, 0
+    for start, end in zip(batches[:-1].tolist(), batches[1:].tolist()):
+        home, away = home_idx[start:end], away_idx[start:end]
+        period_over = next_period < len(period_ends) and end == period_ends[next_period]
+        for engine in engines:
+            replay = replays[engine.name]
+            ratings = replay['state']['ratings']
+            replay['pre_home'][start:end] = ratings[home]
+            replay['pre_away'][start:end] = ratings[away]
+            replay['expected_home'][start:end] = engine.update(replay['state'], home, away, home_goals[start:end], away_goals[start:end])
+            if not engine.rating_period:
+                replay['post_home'][start:end] = ratings[home]
+                replay['post_away'][start:end] = ratings[away]
+            elif period_over:
+                engine.end_period(replay['state'])
+                ratings = replay['state']['ratings']
+                replay['post_home'][period_start:end] = ratings[home_idx[period_start:end]]
+                replay['post_away'][period_start:end] = ratings[away_idx[period_start:end]]
+        if period_over:
+            period_start, next_period = end, next_period + 1
+    for replay in replays.values():
+        replay['ratings'] = replay['state']['ratings'].copy()
+    replays.update(kernel_replays)
+    return {name: replays[name] for name in names}
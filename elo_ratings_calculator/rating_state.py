@@ -0,0 +1,53 @@
+import json
+
+
+class RatingState:
+    """
+    A checkpoint of an Elo replay: the rating of every team, the start timestamp ('date-start-timestamp') of the last
+    processed match, and the configuration the ratings were calculated with. Matches that kicked off at the last timestamp
+    are also recorded, so a match that shares its kick-off time with an already processed match is not skipped.
+
+    Attributes:
+        ratings (dict): The Elo rating of each team, keyed by team name.
+        last_timestamp (int): The start timestamp of the last processed match, or None if no match has been processed.
+        matches_at_last_timestamp (list): The [home team, away team] pairs of the processed matches that started at last_timestamp.
+        config (dict): The rating configuration (initial rating, k-factors, k-factor thresholds and home advantage).
+
+    Methods:
+        is_new_match(home_name, away_name, timestamp) -> bool: Checks whether a match has not been processed yet.
+        record_match(home_name, away_name, timestamp): Moves the checkpoint on to a newly processed match.
+        save(state_file): Saves the state to a JSON file.
+        load(state_file) -> RatingState: Loads a state from a JSON file.
+    """
+
+    def __init__(self, ratings=None, last_timestamp=None, matches_at_last_timestamp=None, config=None):
+        self.ratings = ratings if ratings is not None else {}
+        self.last_timestamp = last_timestamp
+        self.matches_at_last_timestamp = matches_at_last_timestamp if matches_at_last_timestamp is not None else []
+        self.config = config if config is not None else {}
+
+    def is_new_match(self, home_name, away_name, timestamp):
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            return True
+        return timestamp == self.last_timestamp and [home_name, away_name] not in self.matches_at_last_timestamp
+
+    def record_match(self, home_name, away_name, timestamp):
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+            self.matches_at_last_timestamp = []
+        self.matches_at_last_timestamp.append([home_name, away_name])
+
+    def save(self, state_file):
+        with open(state_file, 'w') as f:
+            json.dump({
+                'ratings': self.ratings,
+                'last_timestamp': self.last_timestamp,
+                'matches_at_last_timestamp': self.matches_at_last_timestamp,
+                'config': self.config,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, state_file):
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        return cls(state['ratings'], state['last_timestamp'], state['matches_at_last_timestamp'], state['config'])
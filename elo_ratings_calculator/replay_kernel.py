@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# rating of every team before its first match
+DEFAULT_INITIAL_RATING = 1000
+# k-factors for rating differences up to the first threshold, up to the second threshold, and above it
+DEFAULT_K_FACTORS = (32, 24, 16)
+DEFAULT_K_THRESHOLDS = (400, 800)
+# rating points added to the home team when calculating the expected scores
+DEFAULT_HOME_ADVANTAGE = 0
+
+
+def encode_matches(df):
+    """
+    Encodes the matches in a processed match results DataFrame as integer team ids and NumPy arrays.
+    Team ids are assigned in order of first appearance, which is the same order as
+    `pd.unique(df[['home-name', 'away-name']].values.ravel())`.
+
+    Args:
+        df (pd.DataFrame): processed match results, with 'home-name', 'away-name', 'home-result' and 'away-result' columns
+
+    Returns:
+        tuple: (teams, home_idx, away_idx, home_goals, away_goals), where teams is an array of team names indexed by team id
+    """
+    codes, teams = pd.factorize(df[['home-name', 'away-name']].values.ravel())
+    codes = codes.reshape(-1, 2)
+    home_idx = np.ascontiguousarray(codes[:, 0], dtype=np.int64)
+    away_idx = np.ascontiguousarray(codes[:, 1], dtype=np.int64)
+    home_goals = df['home-result'].to_numpy(dtype=np.int64)
+    away_goals = df['away-result'].to_numpy(dtype=np.int64)
+    return np.asarray(teams), home_idx, away_idx, home_goals, away_goals
+
+
+def _replay_loop(home_idx, away_idx, home_goals, away_goals, ratings, pre_home, pre_away, post_home, post_away, expected_home,
+                 k_low, k_mid, k_high, threshold_low, threshold_high, home_advantage):
+    # the same update as EloCalculator.calculate_individual_elo_ratings, one match at a time
+    for i in range(len(home_idx)):
+        h = home_idx[i]
+        a = away_idx[i]
+        home_elo = ratings[h]
+        away_elo = ratings[a]
+        home_exp = 1 / (1 + 10 ** ((away_elo - (home_elo + home_advantage)) / 400))
+        away_exp = 1 - home_exp
+        if abs(home_elo - away_elo) <= threshold_low:
+            k = k_low
+        elif abs(home_elo - away_elo) <= threshold_high:
+            k = k_mid
+        else:
+            k = k_high
+        if home_goals[i] > away_goals[i]:
+            home_score = 1.0
+        elif home_goals[i] < away_goals[i]:
+            home_score = 0.0
+        else:
+            home_score = 0.5
+        expected_home[i] = home_exp
+        pre_home[i] = home_elo
+        pre_away[i] = away_elo
+        ratings[h] = home_elo + k * (home_score - home_exp)
+        ratings[a] = away_elo + k * ((1 - home_score) - away_exp)
+        post_home[i] = ratings[h]
+        post_away[i] = ratings[a]
+
+
+_replay_loop_compiled = njit(cache=True)(_replay_loop) if njit is not None else None
+
+
+def replay_elo_ratings(home_idx, away_idx, home_goals, away_goals, ratings, k_factors=DEFAULT_K_FACTORS,
+                       k_thresholds=DEFAULT_K_THRESHOLDS, home_advantage=DEFAULT_HOME_ADVANTAGE):
+    """
+    Replays a sequence of matches on a rating vector indexed by team id.
+    The loop is compiled with numba when it is installed. Otherwise it runs over plain Python lists,
+    which avoids the per-element overhead of indexing NumPy arrays from Python.
+
+    Args:
+        home_idx (np.ndarray): team id of the home team for each match
+        away_idx (np.ndarray): team id of the away team for each match
+        home_goals (np.ndarray): goals scored by the home team for each match
+        away_goals (np.ndarray): goals scored by the away team for each match
+        ratings (np.ndarray): Elo rating of each team before the first match. It is not modified.
+        k_factors (tuple): k-factors for rating differences up to the first threshold, up to the second threshold, and above it
+        k_thresholds (tuple): the two rating difference thresholds between the k-factors
+        home_advantage (float): rating points added to the home team when calculating the expected scores
+
+    Returns:
+        tuple: (pre_home, pre_away, post_home, post_away, expected_home, ratings), the ratings of the home and away teams
+        before and after each match, the expected score of the home team in each match, and the rating of every team
+        after the last match
+    """
+    n = len(home_idx)
+    parameters = (float(k_factors[0]), float(k_factors[1]), float(k_factors[2]), float(k_thresholds[0]), float(k_thresholds[1]), float(home_advantage))
+    if _replay_loop_compiled is not None:
+        ratings = np.array(ratings, dtype=np.float64)
+        pre_home, pre_away, post_home, post_away, expected_home = (np.empty(n) for _ in range(5))
+        _replay_loop_compiled(home_idx, away_idx, home_goals, away_goals, ratings, pre_home, pre_away, post_home, post_away, expected_home, *parameters)
+        return pre_home, pre_away, post_home, post_away, expected_home, ratings
+
+    ratings = [float(rating) for rating in ratings]
+    pre_home, pre_away, post_home, post_away, expected_home = ([0.0] * n for _ in range(5))
+    _replay_loop(np.asarray(home_idx).tolist(), np.asarray(away_idx).tolist(), np.asarray(home_goals).tolist(), np.asarray(away_goals).tolist(),
+                 ratings, pre_home, pre_away, post_home, post_away, expected_home, *parameters)
+    return np.array(pre_home), np.array(pre_away), np.array(post_home), np.array(post_away), np.array(expected_home), np.array(ratings)
+
+
+def rating_history(home_idx, away_idx, post_home, post_away, initial_ratings):
+    """
+    Builds the cumulative rating history of a replay: row i holds the rating of every team after the first i matches,
+    so row 0 holds the initial ratings.
+
+    Args:
+        home_idx (np.ndarray): team id of the home team for each match
+        away_idx (np.ndarray): team id of the away team for each match
+        post_home (np.ndarray): rating of the home team after each match
+        post_away (np.ndarray): rating of the away team after each match
+        initial_ratings (np.ndarray): rating of each team before the first match
+
+    Returns:
+        np.ndarray: a (matches + 1) x teams matrix of ratings
+    """
+    n = len(home_idx)
+    n_teams = len(initial_ratings)
+    rows = np.arange(1, n + 1)
+    # index of the last row at which each team's rating changed, carried forward
+    last_update = np.zeros((n + 1, n_teams), dtype=np.int64)
+    last_update[rows, home_idx] = rows
+    last_update[rows, away_idx] = rows
+    np.maximum.accumulate(last_update, axis=0, out=last_update)
+    values = np.empty((n + 1, n_teams))
+    values[0] = initial_ratings
+    values[rows, home_idx] = post_home
+    values[rows, away_idx] = post_away
+    return values[last_update, np.arange(n_teams)]
@@ -0,0 +1,204 @@
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+# version of the cache layout and of the cached results, bumped when either changes so old entries are never used
+CACHE_VERSION = 1
+# default bound of the total size of the cached results
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def data_hash(df):
+    """
+    Returns a content hash of a DataFrame: the SHA-256 of its column names and types and of the hash of every row
+    (`pd.util.hash_pandas_object`). Two DataFrames with the same values have the same hash, whatever file they were read from.
+    """
+    digest = hashlib.sha256(json.dumps([[str(name), str(dtype)] for name, dtype in df.dtypes.items()]).encode())
+    digest.update(np.ascontiguousarray(pd.util.hash_pandas_object(df, index=False).to_numpy()).tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    A content-addressed cache of the results of EloCalculator runs on disk, so a run on match data that has not changed
+    returns its results without replaying the matches, and without rewriting its outputs. An entry is keyed on the SHA-256 of
+    the hash of the match data (see `data_hash`), the rating configuration, the method and its arguments, so any change to
+    the matches or the parameters gives a new key, and an entry never needs to be invalidated because its inputs changed.
+
+    Each entry is a directory named after its key, holding the pickled result and a meta.json file with the data hash, the
+    method and the outputs the result was last written to, with their modification time and size. Writing an output can be
+    skipped while it still has the recorded modification time and size. Files are written under a temporary name and moved
+    into place, so several processes (e.g. the pipeline workers) can share a cache.
+
+    The total size of the results is bounded by `max_bytes`: after each new entry, the least recently used entries are
+    evicted until the cache fits. Entries can also be invalidated by key, by data hash, or all at once.
+
+    Attributes:
+        cache_dir (str): The directory of the cache.
+        max_bytes (int): The bound of the total size of the cached results.
+        hits (int): The number of lookups that found a result, in this process.
+        misses (int): The number of lookups that did not.
+
+    Methods:
+        key(data_hash, config) -> str: Returns the key of a result.
+        get(key) -> object: Returns a cached result, or None.
+        put(key, result, data_hash, method): Caches a result and evicts the least recently used entries beyond max_bytes.
+        outputs_up_to_date(key, outputs) -> bool: Checks whether outputs still hold what was written from an entry.
+        record_outputs(key, outputs): Records the outputs an entry has been written to.
+        entries() -> pd.DataFrame: Returns the key, data hash, method, size and last use of every entry.
+        evict(max_bytes=None) -> int: Evicts the least recently used entries until the cache fits, and returns how many were evicted.
+        invalidate(key=None, data_hash=None) -> int: Deletes an entry, the entries of some match data, or every entry.
+        stats() -> dict: Returns the number of entries, their size, and the hits and misses.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, data_hash, config):
+        """
+        Returns the key of the result of a run on match data with the given hash, `config` holding the rating configuration,
+        the method and its arguments, in a JSON serialisable form.
+        """
+        return hashlib.sha256(json.dumps({'version': CACHE_VERSION, 'data_hash': data_hash, 'config': config},
+                                         sort_keys=True, default=str).encode()).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _write_atomic(self, path, write):
+        temporary_file = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_file, 'wb') as f:
+            write(f)
+        os.replace(temporary_file, path)
+
+    def _read_meta(self, key):
+        with open(os.path.join(self._entry_dir(key), 'meta.json'), 'r') as f:
+            return json.load(f)
+
+    def _write_meta(self, key, meta):
+        self._write_atomic(os.path.join(self._entry_dir(key), 'meta.json'), lambda f: f.write(json.dumps(meta).encode()))
+
+    def get(self, key):
+        """
+        Returns the cached result of a key, marking the entry as used, or None if it is not in the cache. An entry that cannot
+        be unpickled (e.g. truncated, or pickled with classes that have changed since) counts as a miss and is deleted.
+        """
+        result_file = os.path.join(self._entry_dir(key), 'result.pkl')
+        try:
+            with open(result_file, 'rb') as f:
+                result = pickle.load(f)
+            os.utime(result_file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result, data_hash, method):
+        """
+        Caches the result of a key, then evicts the least recently used entries until the cache fits in `max_bytes`.
+        A result that cannot be written is not cached.
+        """
+        try:
+            os.makedirs(self._entry_dir(key), exist_ok=True)
+            self._write_atomic(os.path.join(self._entry_dir(key), 'result.pkl'),
+                               lambda f: pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL))
+            self._write_meta(key, {'version': CACHE_VERSION, 'data_hash': data_hash, 'method': method, 'outputs': {}})
+        except OSError:
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            return
+        self.evict()
+
+    def outputs_up_to_date(self, key, outputs):
+        """
+        Checks whether every output (a list of file paths) has been written from the entry of a key and not changed since,
+        i.e. still has the modification time and size recorded by `record_outputs`.
+        """
+        try:
+            recorded = self._read_meta(key)['outputs']
+            for output in outputs:
+                stat = os.stat(output)
+                if recorded.get(os.path.abspath(output)) != [stat.st_mtime_ns, stat.st_size]:
+                    return False
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def record_outputs(self, key, outputs):
+        """
+        Records that the result of a key has been written to outputs (a list of file paths), with their current modification
+        time and size.
+        """
+        try:
+            meta = self._read_meta(key)
+            for output in outputs:
+                stat = os.stat(output)
+                meta['outputs'][os.path.abspath(output)] = [stat.st_mtime_ns, stat.st_size]
+            self._write_meta(key, meta)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def entries(self):
+        """
+        Returns the 'key', 'data_hash', 'method', 'bytes' and 'last_used' time of every entry, from the most recently used.
+        """
+        rows = []
+        if os.path.isdir(self.cache_dir):
+            for key in os.listdir(self.cache_dir):
+                try:
+                    stat = os.stat(os.path.join(self._entry_dir(key), 'result.pkl'))
+                    meta = self._read_meta(key)
+                except (OSError, ValueError):
+                    continue
+                rows.append({'key': key, 'data_hash': meta.get('data_hash'), 'method': meta.get('method'),
+                             'bytes': stat.st_size, 'last_used': stat.st_mtime})
+        entries = pd.DataFrame(rows, columns=['key', 'data_hash', 'method', 'bytes', 'last_used'])
+        return entries.sort_values('last_used', ascending=False, kind='stable', ignore_index=True)
+
+    def evict(self, max_bytes=None):
+        """
+        Evicts the least recently used entries until the total size of the results is at most `max_bytes`
+        (by default, the `max_bytes` of the cache).
+
+        Returns:
+            int: the number of evicted entries
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        # the entries kept are the most recently used ones that fit
+        evicted = entries[entries['bytes'].cumsum() > max_bytes]
+        for key in evicted['key']:
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        return len(evicted)
+
+    def invalidate(self, key=None, data_hash=None):
+        """
+        Deletes the entry of a key, or every entry of the match data with a given hash, or, if neither is given, every entry.
+
+        Returns:
+            int: the number of deleted entries
+        """
+        entries = self.entries()
+        if key is not None:
+            entries = entries[entries['key'] == key]
+        elif data_hash is not None:
+            entries = entries[entries['data_hash'] == data_hash]
+        for entry_key in entries['key']:
+            shutil.rmtree(self._entry_dir(entry_key), ignore_errors=True)
+        return len(entries)
+
+    def stats(self):
+        entries = self.entries()
+        return {'entries': len(entries), 'bytes': int(entries['bytes'].sum()), 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
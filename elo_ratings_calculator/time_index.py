@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+from .replay_kernel import rating_history
+
+
+def matchweek_ends(home_idx, away_idx, timestamps):
+    """
+    Returns the number of matches played by the end of each matchweek, from matchweek 0 to the most games played by a team.
+    Matchweek k ends just before the kick-off of the first match in which a team plays its (k+1)-th game, and the last
+    matchweek ends with the last match.
+
+    Args:
+        home_idx, away_idx (np.ndarray): The team ids of the home and away team of each match.
+        timestamps (np.ndarray): The kick-off time of each match, in kick-off order.
+    """
+    home_idx, away_idx, timestamps = np.asarray(home_idx), np.asarray(away_idx), np.asarray(timestamps)
+    if not len(home_idx):
+        return np.zeros(1, dtype=np.int64)
+    # the game number of the home and away team in each match
+    team_ids = np.column_stack([home_idx, away_idx]).ravel()
+    game_numbers = pd.Series(team_ids).groupby(team_ids).cumcount().to_numpy().reshape(-1, 2) + 1
+    most_games = np.maximum.accumulate(game_numbers.max(axis=1))
+    # the first match of each team's (k+1)-th game, for k = 0 to the last matchweek
+    weeks = np.arange(most_games[-1] + 1)
+    first_matches = np.searchsorted(most_games, weeks, side='right')
+    # matchweek k ends before the kick-off of that match; the last matchweek ends with the last match
+    ends = np.full(len(weeks), len(home_idx), dtype=np.int64)
+    has_next = first_matches < len(home_idx)
+    ends[has_next] = np.searchsorted(timestamps, timestamps[first_matches[has_next]], side='left')
+    return ends
+
+
+class RatingHistory:
+    """
+    A time index over a replay. The cumulative rating history of the replay (the ratings of every team after each match, see
+    `replay_kernel.rating_history`) is computed once, and point-in-time queries are answered by binary search on the kick-off
+    times of the matches, in O(log n), instead of replaying the matches.
+
+    Matchweeks are derived from the matches rather than from a fixed number of matches per week: matchweek k ends just before
+    the kick-off of the first match in which a team plays its (k+1)-th game, so after matchweek k no team has played more than
+    k games. Postponed and rearranged matches, midweek rounds and leagues of any size are handled the same way.
+
+    Attributes:
+        teams (np.ndarray): The team names, indexed by the team ids of the replay.
+        timestamps (np.ndarray): The kick-off time of each match, in kick-off order.
+        history (np.ndarray): The (matches + 1) x teams matrix of ratings, row i holding the ratings after the first i matches.
+        matchweek_ends (np.ndarray): The number of matches played by the end of each matchweek, from matchweek 0.
+        nb_matchweeks (int): The last matchweek of the matches, i.e. the most games played by a team.
+
+    Methods:
+        matches_before(timestamp) -> int: Returns the number of matches that kicked off at or before a time.
+        after_matches(nb_matches) -> pd.Series: Returns the ratings after the first nb_matches matches.
+        as_of(timestamp) -> pd.Series: Returns the ratings after the matches that kicked off at or before a time.
+        as_of_matchweek(week) -> pd.Series: Returns the ratings at the end of a matchweek.
+        matchweeks(weeks) -> pd.DataFrame: Returns the ratings at the end of several matchweeks.
+        date_range(start, end) -> pd.DataFrame: Returns the ratings after each kick-off time in a time range.
+    """
+
+    def __init__(self, teams, timestamps, home_idx, away_idx, post_home, post_away, initial_ratings):
+        """
+        Args:
+            teams (np.ndarray): The team names, indexed by team id.
+            timestamps (np.ndarray): The kick-off time of each match. The matches must be in kick-off order.
+            home_idx, away_idx (np.ndarray): The team ids of the home and away team of each match.
+            post_home, post_away (np.ndarray): The ratings of the home and away team after each match.
+            initial_ratings (np.ndarray): The rating of each team before the first match.
+
+        Raises:
+            ValueError: if the matches are not in kick-off order
+        """
+        self.teams = np.asarray(teams)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(self.timestamps) > 1 and (np.diff(self.timestamps) < 0).any():
+            raise ValueError('The matches must be in kick-off order to be indexed by time')
+        self.history = rating_history(home_idx, away_idx, post_home, post_away, initial_ratings)
+        self.matchweek_ends = matchweek_ends(home_idx, away_idx, self.timestamps)
+        self.nb_matchweeks = len(self.matchweek_ends) - 1
+
+    @property
+    def nb_matches(self):
+        return len(self.timestamps)
+
+    def matches_before(self, timestamp):
+        """
+        Returns the number of matches that kicked off at or before a time.
+        """
+        return int(np.searchsorted(self.timestamps, timestamp, side='right'))
+
+    def after_matches(self, nb_matches):
+        """
+        Returns the rating of every team after the first `nb_matches` matches, indexed by team.
+        """
+        return pd.Series(self.history[nb_matches], index=pd.Index(self.teams, name='Team'), name='Rating')
+
+    def as_of(self, timestamp):
+        """
+        Returns the rating of every team after the matches that kicked off at or before a time, indexed by team.
+        """
+        return self.after_matches(self.matches_before(timestamp))
+
+    def matchweek_end(self, week):
+        """
+        Returns the number of matches played by the end of a matchweek.
+
+        Raises:
+            ValueError: if the matchweek is after the last matchweek of the matches
+        """
+        if week < 0 or week > self.nb_matchweeks:
+            raise ValueError(f'Please specify a valid number of weeks (up to {self.nb_matchweeks})')
+        return int(self.matchweek_ends[week])
+
+    def as_of_matchweek(self, week):
+        """
+        Returns the rating of every team at the end of a matchweek, indexed by team. Matchweek 0 holds the initial ratings.
+        """
+        return self.after_matches(self.matchweek_end(week))
+
+    def matchweeks(self, weeks):
+        """
+        Returns the ratings at the end of several matchweeks, as a weeks x teams DataFrame indexed by week.
+        """
+        rows = [self.matchweek_end(week) for week in weeks]
+        return pd.DataFrame(self.history[rows], index=pd.Index(list(weeks), name='Week'), columns=self.teams)
+
+    def date_range(self, start, end):
+        """
+        Returns the ratings after each kick-off time from `start` to `end` (included), as a DataFrame indexed by kick-off time,
+        with one row per distinct kick-off time holding the ratings after all the matches that kicked off at that time.
+        """
+        first = int(np.searchsorted(self.timestamps, start, side='left'))
+        last = self.matches_before(end)
+        kick_offs = np.unique(self.timestamps[first:last])
+        rows = np.searchsorted(self.timestamps, kick_offs, side='right')
+        return pd.DataFrame(self.history[rows], index=pd.Index(kick_offs, name='date-start-timestamp'), columns=self.teams)
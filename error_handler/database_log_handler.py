@@ -0,0 +1,51 @@
+import logging
+import logging.handlers
+from datetime import datetime
+
+
+class DatabaseLogHandler(logging.handlers.BufferingHandler):
+    """
+    A logging handler that writes log records to a database table in batches. The records are buffered, and written with one
+    bulk insert when `capacity` records have been buffered, when the handler is flushed, and when the process exits (the
+    logging module flushes and closes every handler at exit). Each row holds the time, level, logger name and message of a record.
+
+    The database module is only imported when the first batch is written, so the handler can be created without a database.
+    If a batch cannot be written, the error is reported on stderr by the logging module and the batch is dropped.
+
+    Attributes:
+        table (str): The table the records are appended to. It is created if it does not exist.
+        backend (str): The database backend, see `Database`. Defaults to the DB_BACKEND environment variable.
+        database (str): The database name or file, see `Database`.
+    """
+    def __init__(self, table='error_log', capacity=100, backend=None, database=None):
+        super().__init__(capacity)
+        self.table = table
+        self.backend = backend
+        self.database = database
+
+    def flush(self):
+        self.acquire()
+        try:
+            records, self.buffer = self.buffer, []
+        finally:
+            self.release()
+        if not records:
+            return
+        try:
+            import pandas as pd
+            from database import Database
+            rows = pd.DataFrame({
+                'logged_at': [datetime.fromtimestamp(record.created) for record in records],
+                'level': [record.levelname for record in records],
+                'logger': [record.name for record in records],
+                'message': [record.getMessage() for record in records],
+            })
+            database = Database(self.backend, self.database)
+            if database.conn is None:
+                raise ConnectionError('Could not connect to the database')
+            try:
+                database.write_dataframe(rows, self.table, if_exists='append')
+            finally:
+                database.close()
+        except Exception:
+            self.handleError(records[-1])
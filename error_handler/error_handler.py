@@ -1,30 +1,56 @@
+import logging
 from logger import Logger
+from .database_log_handler import DatabaseLogHandler
 
 class ErrorHandler:
     """
     The ErrorHandler class logs error messages to a specified log destination.
 
+    Errors logged to the database are appended in batches to the ERROR_LOG_TABLE table by a DatabaseLogHandler, which is shared
+    by every ErrorHandler instance so that the errors of the whole run go into the same batches. The batches are written when
+    they are full, on `flush()` and when the process exits.
+
     Attributes:
         log_destination (str): The log destination for error messages, options are 'file', 'database', 'both'
         logger (Logger object): An instance of the Logger class.
 
     Methods:
         log_error(message): Logs an error message to the specified log destination.
+        flush(): Writes the errors buffered for the database.
     """
 
+    ERROR_LOG_TABLE = 'error_log'
+    BATCH_SIZE = 100
+    _database_handler = None
+
     def __init__(self, log_destination='file'):
         self.log_destination = log_destination
         self.logger = Logger().logger
 
+    @classmethod
+    def database_handler(cls):
+        """
+        Returns the DatabaseLogHandler shared by every ErrorHandler instance, creating it on first use.
+        """
+        if cls._database_handler is None:
+            cls._database_handler = DatabaseLogHandler(cls.ERROR_LOG_TABLE, cls.BATCH_SIZE)
+        return cls._database_handler
+
+    def _log_to_database(self, message):
+        record = self.logger.makeRecord(self.logger.name, logging.ERROR, '(unknown file)', 0, message, None, None)
+        self.database_handler().handle(record)
+
     def log_error(self, message):
         if self.log_destination == 'file':
             self.logger.error(message)
         elif self.log_destination == 'database':
-            # code to log to database
-            pass
+            self._log_to_database(message)
         elif self.log_destination == 'both':
             self.logger.error(message)
-            # code to log to database
+            self._log_to_database(message)
         else:
             self.logger.error("Invalid log destination. Choose 'file', 'database', or 'both'.")
 
+    def flush(self):
+        if self._database_handler is not None:
+            self._database_handler.flush()
@@ -0,0 +1 @@
+from evaluation.evaluator import Evaluator
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from logger import Logger, timed
+from error_handler import ErrorHandler
+from csv_handler import CSVHandler
+from elo_ratings_calculator import EloCalculator
+from elo_ratings_calculator.parameter_sweep import SWEEP_PARAMETERS
+from elo_ratings_calculator.replay_kernel import encode_matches, replay_elo_ratings
+from .metrics import ODDS_COLUMNS, outcomes, elo_probabilities
+from .metrics import grouped_metrics, grouped_calibration, grouped_edge_histogram
+
+# default bins of the edge distribution: 5% wide from -50% to +50%, the end bins also counting the edges outside
+DEFAULT_EDGE_BINS = np.linspace(-0.5, 0.5, 21)
+
+
+class Evaluator:
+    """
+    This class evaluates the Elo probabilities of one or more runs (e.g. every season and rating configuration of a parameter
+    search) against the results and the bookmakers odds. The matches of all the runs are concatenated and every metric is
+    computed in one vectorised pass, see `evaluation.metrics`:
+
+    - the Brier score and log-loss of the Elo probabilities, and of the probabilities implied by the average odds
+    - calibration bins of the Elo probabilities
+    - the distribution of the edges of the Elo probabilities against the average and the best (max) odds
+    - the profit and return on investment of staking one unit on every outcome whose edge is above `min_edge`,
+      at the average and at the best odds
+
+    The Elo probabilities of a match are the three-way probabilities of the per-match output of EloCalculator: the draw takes
+    the probability implied by the average draw odds, and the expected scores share the rest. As the draw is then borrowed from
+    the bookmakers, an `outcome_model` fitted to the results (see `OrderedLogitModel`) can be given instead, to evaluate
+    probabilities that only depend on the ratings.
+
+    Attributes:
+        nb_bins (int): The number of calibration bins.
+        min_edge (float): The edge above which a flat-stake bet is placed.
+        edge_bins (np.ndarray): The bin edges of the edge distribution.
+        outcome_model (OrderedLogitModel): The fitted outcome model giving the probabilities, or None to use the bookmakers draw odds.
+
+    Methods:
+        evaluate(runs: dict) -> Dict[str, pd.DataFrame]: Evaluates runs given as EloCalculators or (match data, expected home scores) pairs.
+        evaluate_configurations(seasons: dict, configurations: dict) -> Dict[str, pd.DataFrame]:
+            Replays every season with every rating configuration and evaluates all the runs in one pass.
+    """
+
+    def __init__(self, nb_bins=10, min_edge=0.0, edge_bins=DEFAULT_EDGE_BINS, outcome_model=None):
+        self.logger = Logger().logger
+        self.error_handler = ErrorHandler(log_destination='file')
+        self.csv_handler = CSVHandler()
+        self.nb_bins = nb_bins
+        self.min_edge = min_edge
+        self.edge_bins = np.asarray(edge_bins, dtype=np.float64)
+        self.outcome_model = outcome_model
+
+    def _forecasts(self, run):
+        """
+        Returns the processed match data and the expected home scores of a run.
+        """
+        if isinstance(run, EloCalculator):
+            return run.data, run.replay_matches()['expected_home']
+        df, expected_home = run
+        return df, np.asarray(expected_home, dtype=np.float64)
+
+    @timed('evaluation')
+    def evaluate(self, runs, names=None):
+        """
+        Evaluates the Elo probabilities of several runs in one pass.
+
+        Args:
+            runs (dict): the runs, keyed by name, each an EloCalculator holding the match data, or a pair of the processed match
+                data and the expected home score of each match (e.g. `replay_matches()['expected_home']`).
+                Tuple keys, e.g. (season, configuration), give a MultiIndex.
+            names (list, optional): the names of the levels of a MultiIndex
+
+        Returns:
+            dict: three DataFrames indexed by run:
+                'summary': one row per run with the metrics of `metrics.grouped_metrics`
+                'calibration': one row per run and non-empty bin, with the 'bin_lower' and 'bin_upper' probabilities of the bin,
+                    the 'count' of probabilities in it, their mean ('predicted') and the frequency of their outcomes ('observed')
+                'edges': one row per run and odds kind ('avg', 'max'), with the number of edges in each bin of `edge_bins`
+        """
+        if not runs:
+            self.error_handler.log_error('No runs to evaluate.')
+            return
+        keys = list(runs)
+        probabilities, odds, outcome, groups = [], {kind: [] for kind in ODDS_COLUMNS}, [], []
+        try:
+            for group, key in enumerate(keys):
+                df, expected_home = self._forecasts(runs[key])
+                if len(df) != len(expected_home):
+                    raise ValueError(f'Run {key} has {len(df)} matches but {len(expected_home)} expected scores')
+                if self.outcome_model is not None:
+                    probabilities.append(self.outcome_model.predict(expected_home))
+                else:
+                    probabilities.append(elo_probabilities(expected_home, df['draw-odds-avg'].to_numpy(dtype=np.float64)))
+                for kind, columns in ODDS_COLUMNS.items():
+                    odds[kind].append(df[columns].to_numpy(dtype=np.float64))
+                outcome.append(outcomes(df['home-result'].to_numpy(), df['away-result'].to_numpy()))
+                groups.append(np.full(len(df), group, dtype=np.int64))
+        except (KeyError, TypeError, ValueError) as e:
+            self.error_handler.log_error(f'Error when accessing match data: {e}')
+            return
+        probabilities, outcome, groups = np.concatenate(probabilities), np.concatenate(outcome), np.concatenate(groups)
+        odds = {kind: np.concatenate(kind_odds) for kind, kind_odds in odds.items()}
+        nb_groups = len(keys)
+        index = pd.Index(keys, name='run') if not isinstance(keys[0], tuple) else pd.MultiIndex.from_tuples(keys, names=names)
+
+        summary = pd.DataFrame(grouped_metrics(probabilities, odds, outcome, groups, nb_groups, self.min_edge), index=index)
+
+        calibration = grouped_calibration(probabilities, outcome, groups, nb_groups, self.nb_bins)
+        bin_lower = np.arange(self.nb_bins) / self.nb_bins
+        calibration = pd.DataFrame({
+            'bin_lower': np.tile(bin_lower, nb_groups),
+            'bin_upper': np.tile(bin_lower + 1 / self.nb_bins, nb_groups),
+            **{name: values.ravel() for name, values in calibration.items()},
+        }, index=index.repeat(self.nb_bins))
+        calibration = calibration[calibration['count'] > 0]
+
+        bin_names = [f'{lower:+.2f}..{upper:+.2f}' for lower, upper in zip(self.edge_bins[:-1], self.edge_bins[1:])]
+        histograms = np.stack([grouped_edge_histogram(probabilities, kind_odds, groups, nb_groups, self.edge_bins)
+                               for kind_odds in odds.values()], axis=1)
+        edge_index = pd.MultiIndex.from_tuples([(*(key if isinstance(key, tuple) else (key,)), kind) for key in keys for kind in odds],
+                                               names=[*index.names, 'odds'])
+        edge_distribution = pd.DataFrame(histograms.reshape(-1, len(bin_names)), index=edge_index, columns=bin_names)
+
+        self.logger.info(f'{nb_groups} runs of {len(outcome)} matches in total have been evaluated.')
+        return {'summary': summary, 'calibration': calibration, 'edges': edge_distribution}
+
+    def evaluate_configurations(self, seasons, configurations):
+        """
+        Replays every season with every rating configuration and evaluates all the (season, configuration) runs in one pass.
+        Each season is encoded once, and only the replay is repeated for each configuration.
+
+        Args:
+            seasons (dict): the processed match data of each season, as a DataFrame or the path to a csv file, keyed by season name
+            configurations (dict): the rating configuration of each run, keyed by name, with the parameters in
+                `parameter_sweep.SWEEP_PARAMETERS`. Missing parameters use their default.
+
+        Returns:
+            dict: see `evaluate`, indexed by (season, configuration)
+        """
+        runs = {}
+        for season, df in seasons.items():
+            if isinstance(df, str):
+                result = self.csv_handler.read_csv(df)
+                if 'error' in result:
+                    self.error_handler.log_error(result['error'])
+                    continue
+                df = result['data']
+            try:
+                teams, home_idx, away_idx, home_goals, away_goals = encode_matches(df)
+            except KeyError as e:
+                self.error_handler.log_error(f'Error when accessing match data: {e}')
+                continue
+            for name, configuration in configurations.items():
+                unknown = set(configuration) - set(SWEEP_PARAMETERS)
+                if unknown:
+                    self.error_handler.log_error(f'Unknown rating parameters: {sorted(unknown)}. Choose from {list(SWEEP_PARAMETERS)}.')
+                    return
+                config = {**SWEEP_PARAMETERS, **configuration}
+                initial_ratings = np.full(len(teams), float(config['initial_rating']))
+                expected_home = replay_elo_ratings(home_idx, away_idx, home_goals, away_goals, initial_ratings,
+                                                   config['k_factors'], config['k_thresholds'], config['home_advantage'])[4]
+                runs[(season, name)] = (df, expected_home)
+        return self.evaluate(runs, names=['season', 'configuration'])
@@ -0,0 +1,148 @@
+import numpy as np
+
+# outcome codes, in the order of the probability and odds columns
+HOME_WIN, DRAW, AWAY_WIN = 0, 1, 2
+# processed match results odds columns of each outcome, for the average and the best (max) bookmakers odds
+ODDS_COLUMNS = {
+    'avg': ['home-odds-avg', 'draw-odds-avg', 'away-odds-avg'],
+    'max': ['home-odds-max', 'draw-odds-max', 'away-odds-max'],
+}
+# probabilities are clipped to this distance from 0 and 1 in the log-loss
+EPSILON = 1e-15
+
+
+def outcomes(home_goals, away_goals):
+    """
+    Returns the outcome code of each match: HOME_WIN, DRAW or AWAY_WIN.
+    """
+    return np.where(home_goals > away_goals, HOME_WIN, np.where(home_goals < away_goals, AWAY_WIN, DRAW))
+
+
+def implied_probabilities(odds, normalise=True):
+    """
+    Returns the probabilities implied by an n x 3 array of fractional odds (the odds of the processed match results),
+    i.e. 1 / (odds + 1). If `normalise` is True, the bookmakers margin is removed by scaling each row to sum to 1.
+    """
+    probabilities = 1 / (np.asarray(odds, dtype=np.float64) + 1)
+    if normalise:
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+    return probabilities
+
+
+def elo_probabilities(expected_home, draw_odds):
+    """
+    Returns the n x 3 home win, draw and away win probabilities of the Elo ratings. The Elo expected score has no draw
+    probability, so, as in the per-match output of EloCalculator, the draw takes the probability implied by the average
+    bookmakers draw odds and the expected scores share the rest.
+    """
+    draw = 1 / (np.asarray(draw_odds, dtype=np.float64) + 1)
+    return np.column_stack([expected_home * (1 - draw), draw, (1 - expected_home) * (1 - draw)])
+
+
+def brier_scores(probabilities, outcome):
+    """
+    Returns the multi-class Brier score of each match: the squared distance between the n x 3 probabilities and the outcome.
+    """
+    actual = np.zeros_like(probabilities)
+    actual[np.arange(len(outcome)), outcome] = 1
+    return ((probabilities - actual) ** 2).sum(axis=1)
+
+
+def log_losses(probabilities, outcome):
+    """
+    Returns the log-loss of each match: minus the log of the probability given to the outcome.
+    """
+    return -np.log(np.clip(probabilities[np.arange(len(outcome)), outcome], EPSILON, 1 - EPSILON))
+
+
+def edges(probabilities, odds):
+    """
+    Returns the n x 3 expected return of a one unit stake on each outcome at fractional `odds`, if the outcome has the given
+    probability: probability * (odds + 1) - 1. A positive edge is a value bet.
+    """
+    return probabilities * (np.asarray(odds, dtype=np.float64) + 1) - 1
+
+
+def flat_stake_profits(probabilities, odds, outcome, min_edge=0.0):
+    """
+    Simulates staking one unit on every outcome whose edge is above `min_edge`.
+
+    Returns:
+        tuple: the n x 3 boolean array of the bets placed, and the n x 3 array of the profit of each bet
+            (the odds if the outcome happened, -1 otherwise, 0 if no bet was placed)
+    """
+    bets = edges(probabilities, odds) > min_edge
+    won = np.zeros(bets.shape, dtype=bool)
+    won[np.arange(len(outcome)), outcome] = True
+    return bets, np.where(bets, np.where(won, odds, -1.0), 0.0)
+
+
+def grouped_metrics(probabilities, odds, outcome, groups, nb_groups, min_edge=0.0):
+    """
+    Computes the evaluation metrics of the matches of several groups (e.g. the seasons and configurations of a parameter
+    search) in one vectorised pass, aggregating with `np.bincount` on the group of each match.
+
+    Args:
+        probabilities (np.ndarray): the n x 3 home win, draw and away win probabilities of the model
+        odds (dict): the n x 3 fractional odds of each odds kind, keyed by kind (e.g. 'avg' and 'max', see ODDS_COLUMNS).
+            The bookmakers probabilities are implied by the first kind.
+        outcome (np.ndarray): the outcome code of each match
+        groups (np.ndarray): the group of each match, from 0 to nb_groups - 1
+        nb_groups (int): the number of groups
+        min_edge (float): the edge above which a flat-stake bet is placed
+
+    Returns:
+        dict: an array of nb_groups values for each metric: 'nb_matches', 'brier', 'log_loss', 'bookmaker_brier',
+            'bookmaker_log_loss', and 'mean_edge_<kind>', 'bets_<kind>', 'profit_<kind>' and 'roi_<kind>' for each odds kind
+    """
+    def group_sum(values):
+        return np.bincount(groups, weights=values, minlength=nb_groups)
+
+    nb_matches = np.bincount(groups, minlength=nb_groups).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics = {'nb_matches': nb_matches.astype(np.int64),
+                   'brier': group_sum(brier_scores(probabilities, outcome)) / nb_matches,
+                   'log_loss': group_sum(log_losses(probabilities, outcome)) / nb_matches}
+        bookmaker_probabilities = implied_probabilities(next(iter(odds.values())))
+        metrics['bookmaker_brier'] = group_sum(brier_scores(bookmaker_probabilities, outcome)) / nb_matches
+        metrics['bookmaker_log_loss'] = group_sum(log_losses(bookmaker_probabilities, outcome)) / nb_matches
+        for kind, kind_odds in odds.items():
+            bets, profits = flat_stake_profits(probabilities, kind_odds, outcome, min_edge)
+            nb_bets = group_sum(bets.sum(axis=1))
+            metrics[f'mean_edge_{kind}'] = group_sum(edges(probabilities, kind_odds).mean(axis=1)) / nb_matches
+            metrics[f'bets_{kind}'] = nb_bets.astype(np.int64)
+            metrics[f'profit_{kind}'] = group_sum(profits.sum(axis=1))
+            metrics[f'roi_{kind}'] = metrics[f'profit_{kind}'] / nb_bets
+    return metrics
+
+
+def grouped_calibration(probabilities, outcome, groups, nb_groups, nb_bins=10):
+    """
+    Bins the probabilities given to every outcome of every match by value, and returns, for each group and bin, the number
+    of probabilities, their mean and the frequency of the outcomes they were given to. A calibrated model has a mean
+    probability close to the observed frequency in every bin.
+
+    Returns:
+        dict: nb_groups x nb_bins arrays 'count', 'predicted' and 'observed' (NaN for empty bins)
+    """
+    actual = np.zeros_like(probabilities)
+    actual[np.arange(len(outcome)), outcome] = 1
+    bins = np.minimum((probabilities * nb_bins).astype(np.int64), nb_bins - 1)
+    keys = (np.repeat(groups, 3) * nb_bins + bins.ravel())
+    size = nb_groups * nb_bins
+    count = np.bincount(keys, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        predicted = np.bincount(keys, weights=probabilities.ravel(), minlength=size) / count
+        observed = np.bincount(keys, weights=actual.ravel(), minlength=size) / count
+    return {'count': count.reshape(nb_groups, nb_bins), 'predicted': predicted.reshape(nb_groups, nb_bins),
+            'observed': observed.reshape(nb_groups, nb_bins)}
+
+
+def grouped_edge_histogram(probabilities, odds, groups, nb_groups, bin_edges):
+    """
+    Returns the nb_groups x (len(bin_edges) - 1) histogram of the edges of every outcome of every match at `odds`.
+    Edges outside the bins are counted in the first or last bin.
+    """
+    nb_bins = len(bin_edges) - 1
+    bins = np.clip(np.searchsorted(bin_edges, edges(probabilities, odds).ravel(), side='right') - 1, 0, nb_bins - 1)
+    return np.bincount(np.repeat(groups, 3) * nb_bins + bins, minlength=nb_groups * nb_bins).reshape(nb_groups, nb_bins)
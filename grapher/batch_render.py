@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from error_handler import ErrorHandler
+
+
+def _use_agg_backend():
+    # the workers never display figures, so they render with the non-interactive Agg backend
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render_scatter(job):
+    """
+    Renders the Elo vs bookmakers probabilities scatter graph of one job. Runs in a worker process.
+
+    Returns:
+        tuple: (output_file, error), where error is None if the graph was rendered.
+    """
+    from csv_handler import CSVHandler
+    from .plots import plot_elo_bookies_scatter
+    output_file = job['output_file']
+    try:
+        result = CSVHandler().read_csv(job['csv_file'])
+        if 'error' in result:
+            return output_file, result['error']
+        plot_elo_bookies_scatter(dataframe=result['data'], title=job.get('title'), show=False, output_file=output_file,
+                                 last_n_matches=job.get('last_n_matches', 180),
+                                 regression_line=job.get('regression_line', False))
+    except Exception as e:
+        return output_file, f'An error occurred while plotting {job["csv_file"]}: {e}'
+    return output_file, None
+
+
+def render_scatter_batch(jobs, max_workers=None):
+    """
+    Renders the Elo vs bookmakers probabilities scatter graphs of several seasons in parallel, one figure per worker process
+    at a time, on the Agg backend. Each figure is built and saved without pyplot, so nothing accumulates between figures, and
+    rendering in this process leaves the matplotlib backend of the caller unchanged.
+
+    Args:
+        - jobs (list): One dict per graph, with the keys 'csv_file' (the per-match Elo ratings file), 'output_file' and, optionally,
+          'title', 'last_n_matches' and 'regression_line'.
+        - max_workers (int, optional): The number of worker processes. Defaults to the number of CPUs. With 1, the graphs are rendered in this process.
+
+    Returns:
+        dict: {'message': ..., 'data': [output files rendered]} or {'error': ...} if any graph failed.
+    """
+    error_handler = ErrorHandler(log_destination='file')
+    if max_workers == 1 or len(jobs) <= 1:
+        results = [_render_scatter(job) for job in jobs]
+    else:
+        max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_use_agg_backend) as executor:
+            results = list(executor.map(_render_scatter, jobs))
+
+    rendered = [output_file for output_file, error in results if error is None]
+    errors = [error for _, error in results if error is not None]
+    for error in errors:
+        error_handler.log_error(error)
+    if errors:
+        return {'error': f'{len(errors)} of {len(jobs)} graphs failed to render.', 'data': rendered}
+    return {'message': f'{len(rendered)} graphs have been rendered.', 'data': rendered}
@@ -1,6 +1,9 @@
 from .plots import plot_elo_bookies_scatter
+from .batch_render import render_scatter_batch
 import pandas as pd
 from error_handler import ErrorHandler
+from csv_handler import CSVHandler
+from logger import timed
 
 class Grapher:
     """
@@ -13,30 +16,29 @@ class Grapher:
     Methods:
         - get_data_from_sql(database, query): Fetches data from a database using a query.
         - get_data_from_csv(csv_file): Loads data from a CSV file.
-        - plot_elo_bookies_scatter(csv_file=None, output_file=None, title=None, show=False): Generates a scatter plot of Elo ratings vs bookmaker odds.
+        - plot_elo_bookies_scatter(csv_file=None, output_file=None, title=None, show=False, last_n_matches=180, regression_line=False): Generates a scatter plot of Elo ratings vs bookmaker odds.
+        - plot_elo_bookies_scatter_batch(jobs, max_workers=None): Generates the scatter plots of several seasons in parallel.
     """
     def __init__(self):
         self.dataframe = []
         self.error_handler = ErrorHandler(log_destination='file')
+        self.csv_handler = CSVHandler()
 
     def get_data_from_sql(self, database, query):
-        # TODO
-        return
+        try:
+            self.dataframe = database.read_dataframe(query)
+        except Exception as e:
+            self.error_handler.log_error(f'An error occurred while reading from the database: {e}')
 
     def get_data_from_csv(self, csv_file):
-        if not csv_file.endswith('.csv'):
-            self.error_handler.log_error(f'{csv_file} is not a .csv file')
+        result = self.csv_handler.read_csv(csv_file)
+        if 'error' in result:
+            self.error_handler.log_error(result['error'])
             return
+        self.dataframe = result['data']
 
-        try:
-            df = pd.read_csv(csv_file, na_values=["N/A", "-", "?"])
-            self.dataframe = df
-        except FileNotFoundError:
-            self.error_handler.log_error(f'The file {csv_file} could not be found')
-        except Exception as e:
-            self.error_handler.log_error(f'An error occurred while reading the file: {e}')
-
-    def plot_elo_bookies_scatter(self, csv_file=None, output_file=None, title=None, show=False):
+    @timed('plot')
+    def plot_elo_bookies_scatter(self, csv_file=None, output_file=None, title=None, show=False, last_n_matches=180, regression_line=False):
         """
         This method generates a scatter plot of Elo ratings versus bookmakers' odds for a given data source. The data source can be provided as a csv file, or through the get_data_from_csv method. The scatter plot shows the relationship between the Elo ratings and bookmakers' odds, which can be used to evaluate the accuracy of the Elo ratings as a predictor of match outcomes.
         
@@ -45,16 +47,34 @@ class Grapher:
             - output_file (str, optional): The path and file name to save the generated scatter plot as an image file. If not provided, the scatter plot will not be saved.
             - title (str, optional): The title for the scatter plot. If not provided, a default title will be used.
             - show (bool, optional): A flag indicating whether to show the scatter plot. Default value is False.
+            - last_n_matches (int, optional): The number of matches at the end of the season to plot. Default value is 180.
+            - regression_line (bool, optional): A flag indicating whether to add a linear regression line to each subplot. Default value is False.
             
-        Raises:
-            Exception: Raises an error if the data source is not provided or an error occurs while plotting the data. The error message is logged by the logger class.
+        Returns:
+            matplotlib.figure.Figure: The figure, or None if the data source is not provided or an error occurs while plotting the data. The error message is logged by the logger class.
         """
+        if csv_file:
+            self.get_data_from_csv(csv_file)
         if not isinstance(self.dataframe, pd.DataFrame) or self.dataframe.empty:
             self.error_handler.log_error("No data to plot. Please provide the data source through csv_file argument or call get_data_from_csv method.")
             return
         try:
-            plot_elo_bookies_scatter(dataframe=self.dataframe, output_file=output_file, title=title, show=show)
+            return plot_elo_bookies_scatter(dataframe=self.dataframe, output_file=output_file, title=title, show=show,
+                                            last_n_matches=last_n_matches, regression_line=regression_line)
         except Exception as e:
             self.error_handler.log_error(f'An error occurred while plotting the data: {str(e)}')
 
+    def plot_elo_bookies_scatter_batch(self, jobs, max_workers=None):
+        """
+        This method generates the scatter plots of Elo ratings versus bookmakers' odds of several seasons in parallel, on the non-interactive Agg backend.
+
+        Args:
+            - jobs (list): One dict per plot, with the keys 'csv_file', 'output_file' and, optionally, 'title', 'last_n_matches' and 'regression_line'.
+            - max_workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+
+        Returns:
+            dict: {'message': ..., 'data': [output files]} or {'error': ...} if any plot failed.
+        """
+        return render_scatter_batch(jobs, max_workers=max_workers)
+
 
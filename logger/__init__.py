@@ -1 +1,2 @@
-from logger.logger import Logger
\ No newline at end of file
+from logger.logger import Logger
+from logger.instrumentation import Instrumentation, timed
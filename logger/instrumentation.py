@@ -0,0 +1,228 @@
+import os
+import io
+import time
+import cProfile
+import pstats
+import functools
+import threading
+from logger.logger import Logger
+
+
+class _NullTimer:
+    """
+    The timer returned while instrumentation is disabled. Entering and leaving it does nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    """
+    Times one run of a stage, and profiles it if profiling is enabled for the stage.
+    """
+    def __init__(self, instrumentation, stage):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.profiler = None
+
+    def __enter__(self):
+        if self.instrumentation._should_profile(self.stage):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # another profiler is already active, e.g. the one of an enclosing stage
+                self.profiler = None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.instrumentation._add_profile(self.stage, self.profiler)
+        self.instrumentation._add_timing(self.stage, elapsed)
+        return False
+
+
+class Instrumentation:
+    """
+    This class records where a run spends its time, with stage timers, counters and an opt-in profiling hook, and reports a summary
+    at the end of the run through the Logger.
+
+    Like the Logger, the Instrumentation class is a singleton, so every module records into the same instance. It is disabled by default:
+    `timer` then returns a shared no-op context manager and `count` returns immediately, so the instrumentation calls can stay in the hot
+    paths of production runs. It is enabled with `enable()`, or by setting the ELO_INSTRUMENTATION environment variable to 1. Profiling
+    is enabled per stage with `enable(profile=[...])` or the ELO_PROFILE environment variable (a comma-separated list of stage names,
+    or 'all'): the stages are then run under cProfile and the report includes their most expensive functions.
+
+    Usage:
+        instrumentation = Instrumentation()
+        with instrumentation.timer('elo.replay'):
+            ...
+        instrumentation.count('matches replayed', len(df))
+
+        @timed('csv.read')
+        def read_csv(...):
+            ...
+
+    Attributes:
+        - enabled (bool): Whether timings and counters are recorded.
+        - profile_stages (set): The stages to profile, or {'all'}.
+        - timings (dict): The number of runs, total and maximum time of each stage, keyed by stage name.
+        - counters (dict): The value of each counter, keyed by counter name.
+        - profiles (dict): The accumulated pstats.Stats of each profiled stage.
+
+    Methods:
+        - enable(profile=None): Enables the instrumentation, and profiling for the given stages.
+        - disable(): Disables the instrumentation.
+        - reset(): Clears the recorded timings, counters and profiles.
+        - timer(stage): Returns a context manager timing a run of a stage.
+        - count(name, value=1): Adds a value to a counter.
+        - summary() -> dict: Returns the recorded timings and counters.
+        - merge(summary): Adds the timings and counters of a summary, e.g. one recorded in a worker process.
+        - report() -> str: Formats the recorded timings, counters and profiles as a text report.
+        - log_report(): Logs the report.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'enabled'):
+            self._lock = threading.Lock()
+            self.enabled = os.getenv('ELO_INSTRUMENTATION', '') not in ('', '0')
+            self.profile_stages = {stage.strip() for stage in os.getenv('ELO_PROFILE', '').split(',') if stage.strip()}
+            self.reset()
+
+    def enable(self, profile=None):
+        self.enabled = True
+        if profile:
+            self.profile_stages = set(profile)
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.timings = {}
+        self.counters = {}
+        self.profiles = {}
+
+    def timer(self, stage):
+        """
+        Returns a context manager that times a run of a stage, or a no-op context manager if the instrumentation is disabled.
+
+        Args:
+            stage (str): The name of the stage, e.g. 'elo.replay'.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def count(self, name, value=1):
+        """
+        Adds a value to a counter, e.g. the number of matches processed, rows written or bytes read.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _should_profile(self, stage):
+        return bool(self.profile_stages) and ('all' in self.profile_stages or stage in self.profile_stages)
+
+    def _add_timing(self, stage, elapsed):
+        with self._lock:
+            runs, total, maximum = self.timings.get(stage, (0, 0.0, 0.0))
+            self.timings[stage] = (runs + 1, total + elapsed, max(maximum, elapsed))
+
+    def _add_profile(self, stage, profiler):
+        with self._lock:
+            if stage in self.profiles:
+                self.profiles[stage].add(profiler)
+            else:
+                self.profiles[stage] = pstats.Stats(profiler)
+
+    def summary(self):
+        """
+        Returns the recorded timings and counters.
+
+        Returns:
+            dict: {'timings': {stage: {'runs', 'total', 'max'}}, 'counters': {name: value}}
+        """
+        with self._lock:
+            return {
+                'timings': {stage: {'runs': runs, 'total': total, 'max': maximum} for stage, (runs, total, maximum) in self.timings.items()},
+                'counters': dict(self.counters),
+            }
+
+    def merge(self, summary):
+        """
+        Adds the timings and counters of a summary returned by `summary`, e.g. one recorded in a worker process, to this instance.
+        """
+        with self._lock:
+            for stage, timing in summary['timings'].items():
+                runs, total, maximum = self.timings.get(stage, (0, 0.0, 0.0))
+                self.timings[stage] = (runs + timing['runs'], total + timing['total'], max(maximum, timing['max']))
+            for name, value in summary['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self, nb_functions=10):
+        """
+        Formats the recorded timings, counters and profiles as a text report.
+
+        Args:
+            nb_functions (int, optional): The number of functions listed for each profiled stage, by cumulative time. Defaults to 10.
+        """
+        summary = self.summary()
+        lines = ['Instrumentation report', f"{'stage':<40} {'runs':>6} {'total (s)':>10} {'mean (s)':>10} {'max (s)':>10}"]
+        for stage, timing in sorted(summary['timings'].items(), key=lambda item: -item[1]['total']):
+            lines.append(f"{stage:<40} {timing['runs']:>6} {timing['total']:>10.4f} {timing['total'] / timing['runs']:>10.4f} {timing['max']:>10.4f}")
+        if summary['counters']:
+            lines.append(f"{'counter':<40} {'value':>17}")
+            for name, value in sorted(summary['counters'].items()):
+                lines.append(f'{name:<40} {value:>17,}')
+        for stage, stats in self.profiles.items():
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats('cumulative').print_stats(nb_functions)
+            lines.append(f'Profile of {stage}:')
+            lines.append(stream.getvalue().strip())
+        return '\n'.join(lines)
+
+    def log_report(self):
+        """
+        Logs the report, if the instrumentation is enabled.
+        """
+        if self.enabled:
+            Logger().logger.info(self.report())
+
+
+def timed(stage):
+    """
+    Decorator timing each call of a function as a run of a stage. The instrumentation is checked at call time, so the
+    decorated function only pays for an attribute lookup while the instrumentation is disabled.
+
+    Args:
+        stage (str): The name of the stage.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            instrumentation = Instrumentation._instance or Instrumentation()
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            with _StageTimer(instrumentation, stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,24 +1,96 @@
+import os
+import time
+import queue
+import atexit
 import logging
+import threading
+import logging.handlers
+
+
+class RepeatedMessageFilter(logging.Filter):
+    """
+    Rate-limits repeated log messages. Messages are grouped by level and message template (the format string before the
+    arguments are merged in, e.g. 'Game between %s and %s was postponed'), and only the first `burst` messages of each group
+    are let through in each `interval` seconds. The first message let through after a group was rate-limited says how many
+    similar messages were suppressed, and `flush` logs a summary of the groups still being suppressed, e.g. at the end of a run.
+
+    Messages are only grouped when they are logged with arguments (`logger.info('... %s', value)`), as an f-string gives
+    every message its own template.
+
+    Attributes:
+        - burst (int): The number of messages of a group let through per interval.
+        - interval (float): The length of the rate-limiting window, in seconds.
+    """
+    def __init__(self, burst=10, interval=60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not record.args or getattr(record, 'aggregated', False):
+            return True
+        key = (record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._groups.get(key, (now, 0, 0))
+            if now - window_start >= self.interval:
+                window_start, count = now, 0
+            if count >= self.burst:
+                self._groups[key] = (window_start, count, suppressed + 1)
+                return False
+            self._groups[key] = (window_start, count + 1, 0)
+        if suppressed and isinstance(record.args, tuple):
+            record.msg = f'{record.msg} (%d similar messages suppressed)'
+            record.args = record.args + (suppressed,)
+        return True
+
+    def flush(self, logger):
+        """
+        Logs one summary message for each group of messages that has been suppressed since its last message was let through.
+        """
+        with self._lock:
+            suppressed_groups = [(levelno, msg, suppressed) for (levelno, msg), (_, _, suppressed) in self._groups.items() if suppressed]
+            self._groups = {key: (window_start, count, 0) for key, (window_start, count, _) in self._groups.items()}
+        for levelno, msg, suppressed in suppressed_groups:
+            logger.log(levelno, '%d more messages like "%s" were suppressed', suppressed, msg, extra={'aggregated': True})
+
 
 class Logger:
     """
     This class provides a centralised and customisable logging solution for the application.
 
     The purpose of the Logger class is to provide a way to log messages in a consistent and standardised way throughout the application. This class uses the Python `logging` module and implements a singleton pattern to ensure that there is only one instance of the logger throughout the entire application.  If multiple instances are requested, the __new__ method is used to ensure that only one instance is created, and all subsequent attempts to create an instance will return the existing instance.
-    
-    The Logger class also provides an interface to log messages to a log file as well as to the console.  This can be controlled by setting the `level` parameter while instantiating the logger. By default, the log level is set to `logging.DEBUG` and the log messages will be written to the file `application.log`. The log messages can also be written to the console if the level of the message is at least 
-    `logging.WARNING`.
+
+    The Logger class also provides an interface to log messages to a log file as well as to the console. Each sink has its own level: `file_level`
+    defaults to `level`, which defaults to `logging.DEBUG`, and `console_level` defaults to `logging.DEBUG`. The log messages are written to the
+    file `application.log` by default. Repeated messages are rate-limited by a RepeatedMessageFilter, see `rate_limit`.
+
+    In asynchronous mode, the logger only puts the log records on a queue, and a QueueListener writes them to the sinks on a background
+    thread, so file and console I/O is kept off the hot paths. The queue is drained when the process exits, or with `stop()`. The mode is
+    enabled with `asynchronous=True` or the ELO_LOG_ASYNC environment variable, and the sink levels can also be set with the ELO_LOG_FILE_LEVEL
+    and ELO_LOG_CONSOLE_LEVEL environment variables (e.g. WARNING). Since the Logger is created by the first module that logs, use `configure`
+    to change the settings of the existing instance.
 
     The log messages have a standard format which includes the following information:
      - Timestamp (`asctime`)
      - Logger name (`name`)
      - Log level (`levelname`)
      - The actual message (`message`)
-    
+
     Attributes:
     - log_file (str): The name of the log file to write log messages to.
     - level (int): The level of log messages to log. Defaults to `logging.DEBUG`.
     - logger (logging.Logger): The logger instance.
+    - handlers (list): The sinks, the file handler and the console handler.
+    - rate_limiter (RepeatedMessageFilter): The filter rate-limiting repeated messages, or None.
+    - listener (logging.handlers.QueueListener): The listener writing the queued records to the sinks in asynchronous mode, or None.
+
+    Methods:
+    - configure(...): Changes the sink levels, rate limit and mode of the logger.
+    - flush(): Logs the summary of the suppressed messages and waits until the queued records are written.
+    - stop(): Flushes the logger and stops the background thread of the asynchronous mode.
     """
 
     _instance = None
@@ -28,19 +100,114 @@ class Logger:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, log_file='application.log', level=logging.DEBUG):
+    def __init__(self, log_file='application.log', level=logging.DEBUG, file_level=None, console_level=None, asynchronous=None,
+                 rate_limit=(10, 60.0)):
         if not hasattr(self, 'logger'):
+            self.log_file = log_file
+            self.level = level
             self.logger = logging.getLogger(__name__)
             self.logger.setLevel(level)
-
-            file_handler = logging.FileHandler(log_file)
-            file_handler.setLevel(level)
+            self.listener = None
+            self.rate_limiter = None
+            self._queue_handler = None
 
             formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            file_handler = logging.FileHandler(log_file)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
-
             console_handler = logging.StreamHandler()
-            console_handler.setLevel(logging.DEBUG)
             console_handler.setFormatter(formatter)
-            self.logger.addHandler(console_handler)
+            self.handlers = [file_handler, console_handler]
+
+            if asynchronous is None:
+                asynchronous = os.getenv('ELO_LOG_ASYNC', '') not in ('', '0')
+            self.configure(file_level=file_level or os.getenv('ELO_LOG_FILE_LEVEL') or level,
+                           console_level=console_level or os.getenv('ELO_LOG_CONSOLE_LEVEL') or logging.DEBUG,
+                           asynchronous=asynchronous, rate_limit=rate_limit)
+            atexit.register(self.stop)
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def configure(self, file_level=None, console_level=None, asynchronous=None, rate_limit=False):
+        """
+        Changes the settings of the logger. The settings that are not given are left unchanged.
+
+        Args:
+            file_level (int or str, optional): The level of the messages written to the log file.
+            console_level (int or str, optional): The level of the messages written to the console.
+            asynchronous (bool, optional): Whether the records are written to the sinks on a background thread.
+            rate_limit (tuple, optional): The (burst, interval) of the RepeatedMessageFilter, or None to let every message through.
+        """
+        file_handler, console_handler = self.handlers
+        if file_level is not None:
+            file_handler.setLevel(file_level)
+        if console_level is not None:
+            console_handler.setLevel(console_level)
+        if rate_limit is not False:
+            if self.rate_limiter is not None:
+                self.rate_limiter.flush(self.logger)
+                self.logger.removeFilter(self.rate_limiter)
+            self.rate_limiter = RepeatedMessageFilter(*rate_limit) if rate_limit else None
+            if self.rate_limiter is not None:
+                self.logger.addFilter(self.rate_limiter)
+        if asynchronous is not None and asynchronous != (self.listener is not None):
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+            if asynchronous:
+                self._start_listener()
+            else:
+                self._stop_listener()
+                for handler in self.handlers:
+                    self.logger.addHandler(handler)
+        elif not self.logger.handlers:
+            for handler in self.handlers:
+                self.logger.addHandler(handler)
+
+    def _start_listener(self):
+        records = queue.SimpleQueue()
+        self._queue_handler = logging.handlers.QueueHandler(records)
+        self.logger.addHandler(self._queue_handler)
+        # the listener applies the level of each sink
+        self.listener = logging.handlers.QueueListener(records, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def _stop_listener(self):
+        if self.listener is not None:
+            # stopping the listener writes the records left on the queue
+            self.listener.stop()
+            self.listener = None
+            self.logger.removeHandler(self._queue_handler)
+            self._queue_handler = None
+
+    def _after_fork_in_child(self):
+        # the listener thread does not exist in a forked process, so a new queue and listener are needed
+        if self.listener is not None:
+            self.logger.removeHandler(self._queue_handler)
+            self._start_listener()
+            # worker processes exit without running the atexit handlers, but they run the multiprocessing finalizers
+            from multiprocessing.util import Finalize
+            Finalize(self, self.stop, exitpriority=10)
+
+    def flush(self):
+        """
+        Logs the summary of the suppressed messages, and waits until the records queued so far have been written to the sinks.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.flush(self.logger)
+        if self.listener is not None:
+            # the listener writes the records left on the queue when it stops, and the records queued meanwhile when it restarts
+            self.listener.stop()
+            self.listener.start()
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        """
+        Flushes the logger and stops the background thread of the asynchronous mode, e.g. before the process exits.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.flush(self.logger)
+        if self.listener is not None:
+            self._stop_listener()
+            for handler in self.handlers:
+                self.logger.addHandler(handler)
+        for handler in self.handlers:
+            handler.flush()
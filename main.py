@@ -1,81 +1,218 @@
-from match_results_generator import JSONProcessor
-from elo_ratings_calculator import EloCalculator
-from grapher import Grapher
+import sys
+import argparse
+
+# Seasons to run the pipeline for, with the folder of raw JSON data for each season
+MANIFEST = [
+    {'league': 'Premier League', 'season': '19-20', 'raw_dir': './data/raw-data/19-20', 'title': '19-20 Premier League'},
+    {'league': 'Premier League', 'season': '20-21', 'raw_dir': './data/raw-data/20-21', 'title': '20-21 Premier League'},
+    {'league': 'Premier League', 'season': '21-22', 'raw_dir': './data/raw-data/21-22', 'title': '21-22 Premier League'},
+    {'league': 'Premier League', 'season': '22-23', 'raw_dir': './data/raw-data/22-23', 'title': '22-23 Premier League'},
+]
+
+# Stages of the pipeline, see pipeline.pipeline_runner.STAGES (not imported here to keep the startup fast)
+STAGES = ['ingest', 'match', 'weekly', 'plot']
+
+# The modules of each command are imported when the command runs, so that e.g. rating runs never import matplotlib or scipy.
+
+
+def ingest(args):
+    from match_results_generator import JSONProcessor
+    JSONProcessor(args.raw_dir, args.output_file).generate_match_results_csv(max_workers=args.workers)
+
+
+def rate(args):
+    from elo_ratings_calculator import EloCalculator, OrderedLogitModel, ResultCache
+    outcome_model = OrderedLogitModel.load(args.outcome_model) if args.outcome_model else None
+    result_cache = ResultCache(args.result_cache) if args.result_cache else None
+    elo_calculator = EloCalculator(args.source, args.input, result_cache=result_cache)
+    elo_calculator.calculate_elo_ratings_for_each_match(args.source, args.output, outcome_model)
+
+
+def fit_outcome_model(args):
+    from elo_ratings_calculator import EloCalculator, OrderedLogitModel
+    elo_calculators = [EloCalculator(args.source, file_or_query) for file_or_query in args.inputs]
+    try:
+        model = OrderedLogitModel().fit_calculators([elo_calculator for elo_calculator in elo_calculators if elo_calculator.data is not None])
+    except (KeyError, ValueError) as e:
+        print(f'The outcome model could not be fitted: {e}', file=sys.stderr)
+        return
+    model.save(args.output)
+    print(f'Outcome model fitted to {model.nb_matches} matches: slope {model.slope:.4f}, cut points {model.away_cut:.4f} and {model.draw_cut:.4f}')
+
+
+def weekly(args):
+    from elo_ratings_calculator import EloCalculator, ResultCache
+    result_cache = ResultCache(args.result_cache) if args.result_cache else None
+    elo_calculator = EloCalculator(args.source, args.input, result_cache=result_cache)
+    elo_calculator.calculate_elo_ratings_for_each_week(args.source, args.output, args.target_week, consolidated=args.consolidated)
+
+
+def archive(args):
+    from rating_archive import RatingArchive, WeeklyCSVConverter
+    rating_archive = RatingArchive(args.archive)
+    if args.results_dir:
+        WeeklyCSVConverter(rating_archive).convert(args.results_dir, league=args.league)
+    for season_input in args.season or []:
+        from elo_ratings_calculator import EloCalculator
+        season, file_or_query = season_input.split('=', 1)
+        EloCalculator(args.source, file_or_query).archive_weekly_ratings(rating_archive, args.league, season)
+    if args.compact:
+        rating_archive.compact()
+
+
+def plot(args):
+    import matplotlib
+    matplotlib.use('Agg')
+    from grapher import Grapher
+    Grapher().plot_elo_bookies_scatter(csv_file=args.input, output_file=args.output_file, title=args.title, show=False,
+                                       last_n_matches=args.last_n_matches, regression_line=args.regression_line)
+
+
+def pipeline(args):
+    from pipeline import PipelineRunner
+    runner = PipelineRunner(args.manifest or MANIFEST, max_workers=args.workers, instrument=args.instrument, profile=args.profile,
+                            outcome_model=args.outcome_model, result_cache=args.result_cache)
+    runner.run(stages=args.stages or STAGES, force=args.force, target_week=args.target_week)
+
+
+def cache(args):
+    from elo_ratings_calculator import ResultCache
+    result_cache = ResultCache(args.cache_dir, max_bytes=args.max_size * 1024 * 1024)
+    if args.clear:
+        print(f'{result_cache.invalidate()} cached results deleted')
+    elif args.evict:
+        print(f'{result_cache.evict()} cached results evicted')
+    print(result_cache.entries().to_string(index=False))
 
-if __name__ == "__main__":
 
-    """ Section 1: Process raw data """
-    
-    # # List of seasons and corresponding raw and processed data paths
-    # seasons = [
-    #     ('./data/raw-data/20-21', './data/processed-data/20-21.csv'),
-    #     ('./data/raw-data/19-20', './data/processed-data/19-20.csv'),
-    #     ('./data/raw-data/21-22', './data/processed-data/21-22.csv'),
-    #     ('./data/raw-data/22-23', './data/processed-data/22-23.csv')
-    # ]
-
-    # # Process raw data for each season
-    # for raw_data, processed_data in seasons:
-    #     processor = JSONProcessor(raw_data, processed_data)
-    #     processor.generate_match_results_csv()
-
-    """ Section 2: Calculate Elo ratings for each season """
-    
-    # # Input File paths
-    # file_paths = {
-    #     "20-21": "./data/processed-data/20-21.csv",
-    #     "19-20": "./data/processed-data/19-20.csv",
-    #     "21-22": "./data/processed-data/21-22.csv",
-    #     "22-23": "./data/processed-data/22-23.csv"
-    # }
-
-    # # Number of weeks to calculate Elo ratings for (valid range: 0 to 39)
-    # target_week = 39
-
-    # # Output Directories and Files for Elo Ratings by Match and Week
-    # output_dirs = {
-    #     "20-21": {
-    #         "week-data": "./data/results/elo-ratings/20-21/week-data",
-    #         "match-data": "./data/results/elo-ratings/20-21/match-data/index.csv"
-    #     },
-    #     "19-20": {
-    #         "week-data": "./data/results/elo-ratings/19-20/week-data",
-    #         "match-data": "./data/results/elo-ratings/19-20/match-data/index.csv"
-    #     },
-    #     "21-22": {
-    #         "week-data": "./data/results/elo-ratings/21-22/week-data",
-    #         "match-data": "./data/results/elo-ratings/21-22/match-data/index.csv"
-    #     },
-    #     "22-23": {
-    #         "week-data": "./data/results/elo-ratings/22-23/week-data",
-    #         "match-data": "./data/results/elo-ratings/22-23/match-data/index.csv"
-    #     }
-    # }
-
-    # for season, file_path in file_paths.items():
-    #     # Calculate Elo ratings for each season
-    #     elo_calculator = EloCalculator("csv", file_path)
-    #     elo_calculator.calculate_elo_ratings_for_each_match("csv", output_dirs[season]["match-data"])
-    #     elo_calculator.calculate_elo_ratings_for_each_week("csv", output_dirs[season]["week-data"], target_week)
-
-    """ Section 3: Scatter plot Elo probability vs bookmakers probability """
-
-    # Set up paths for input and output files
-    title_seasons = [('19-20 Premier League', '19-20'), 
-                    ('20-21 Premier League', '20-21'), 
-                    ('21-22 Premier League', '21-22'), 
-                    ('22-23 Premier League', '22-23')]
-    
-    data_dir = './data/results/elo-ratings/{}/match-data/'
-    csv_files = [data_dir.format(season) + 'index.csv' for _, season in title_seasons]
-    output_files = [data_dir.format(season) + 'elo-vs-bookies-probabilities-{}.png'.format(season) for _, season in title_seasons]
-
-    # Initialise an instance of the Grapher class
-    grapher = Grapher()
-
-    # Create scatter graphs for Elo vs bookmakers probabilities
-    for title, csv_file, output_file in zip(title_seasons, csv_files, output_files):
-        grapher.get_data_from_csv(csv_file)
-        grapher.plot_elo_bookies_scatter(output_file=output_file, title=title[0], show=False)
-
-    # Note: there is currently a bug causing all the graphs to display if only the last 'show' is set to True
+def simulate(args):
+    from elo_ratings_calculator import EloCalculator
+    from simulation import SeasonSimulator
+    elo_calculator = EloCalculator(args.source, args.input)
+    simulator = SeasonSimulator(elo_calculator, nb_simulations=args.simulations, seed=args.seed, max_workers=args.workers)
+    result = simulator.simulate(args.week)
+    if result is not None:
+        elo_calculator.write_data(result['summary'].reset_index(), args.source, args.output)
+
+
+def serve(args):
+    from rating_service import RatingService, serve
+    seasons = dict(season.split('=', 1) for season in args.season) if args.season else \
+        {entry['season']: f"./data/processed-data/{entry['season']}.csv" for entry in MANIFEST}
+    server = serve(RatingService(args.source, seasons, cache_size=args.cache_size), args.host, args.port)
+    print(f'Serving rating queries on http://{server.server_address[0]}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Calculate Elo ratings for football seasons. Without a command, runs the pipeline for each season in the manifest.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    parser_ingest = commands.add_parser('ingest', help='process a folder of raw JSON files into a match results file')
+    parser_ingest.add_argument('raw_dir', help='folder containing the raw JSON files')
+    parser_ingest.add_argument('output_file', help='.csv or .parquet file to write the processed matches to')
+    parser_ingest.add_argument('--workers', type=int, default=1, help='number of worker processes parsing the files (default: 1)')
+    parser_ingest.set_defaults(function=ingest)
+
+    parser_rate = commands.add_parser('rate', help='calculate the Elo ratings for each match')
+    parser_rate.add_argument('input', help='processed match results file, or query with --source db')
+    parser_rate.add_argument('output', help='file to write the ratings to, or table with --source db')
+    parser_rate.add_argument('--source', choices=['csv', 'db'], default='csv', help='data source of the input and output (default: csv)')
+    parser_rate.add_argument('--result-cache', metavar='DIR', help='directory of the result cache, to reuse the ratings of unchanged data')
+    parser_rate.add_argument('--outcome-model', help='JSON file of a fitted outcome model, see the fit-outcome-model command, to add its probabilities')
+    parser_rate.set_defaults(function=rate)
+
+    parser_fit = commands.add_parser('fit-outcome-model', help='fit the home win, draw and away win probability model to the matches of several seasons')
+    parser_fit.add_argument('inputs', nargs='+', help='processed match results files, or queries with --source db')
+    parser_fit.add_argument('--output', required=True, help='JSON file to save the fitted model to')
+    parser_fit.add_argument('--source', choices=['csv', 'db'], default='csv', help='data source of the inputs (default: csv)')
+    parser_fit.set_defaults(function=fit_outcome_model)
+
+    parser_weekly = commands.add_parser('weekly', help='calculate the Elo ratings of each team at the end of each week')
+    parser_weekly.add_argument('input', help='processed match results file, or query with --source db')
+    parser_weekly.add_argument('output', help='directory to write one file per week to, file with --consolidated, or table with --source db')
+    parser_weekly.add_argument('--source', choices=['csv', 'db'], default='csv', help='data source of the input and output (default: csv)')
+    # Number of weeks to calculate Elo ratings for (valid range: 0 to 39)
+    parser_weekly.add_argument('--target-week', type=int, default=39, help='number of weeks to calculate the Elo ratings for (default: 39)')
+    parser_weekly.add_argument('--consolidated', action='store_true', help='write the ratings of all the weeks to a single file')
+    parser_weekly.add_argument('--result-cache', metavar='DIR', help='directory of the result cache, to reuse the ratings of unchanged data')
+    parser_weekly.set_defaults(function=weekly)
+
+    parser_cache = commands.add_parser('cache', help='list, evict or clear the cached results of a result cache')
+    parser_cache.add_argument('cache_dir', help='directory of the result cache')
+    parser_cache.add_argument('--max-size', type=int, default=512, help='size bound of the cache in MB, used by --evict (default: 512)')
+    parser_cache.add_argument('--evict', action='store_true', help='evict the least recently used results beyond the size bound')
+    parser_cache.add_argument('--clear', action='store_true', help='delete every cached result')
+    parser_cache.set_defaults(function=cache)
+
+    parser_archive = commands.add_parser('archive', help='append weekly Elo ratings to a memory-mapped rating archive, see rating_archive')
+    parser_archive.add_argument('archive', help='directory of the rating archive, created if it does not exist')
+    parser_archive.add_argument('--results-dir', help='results tree of week-N.csv files to migrate, e.g. ./data/results/elo-ratings')
+    parser_archive.add_argument('--season', action='append', metavar='SEASON=FILE',
+                                help='season name and processed match results file (or query with --source db) to calculate and archive, can be repeated')
+    parser_archive.add_argument('--league', default='', help='league of the seasons (default: none)')
+    parser_archive.add_argument('--source', choices=['csv', 'db'], default='csv', help='data source of the seasons (default: csv)')
+    parser_archive.add_argument('--compact', action='store_true', help='drop the superseded blocks of the archive')
+    parser_archive.set_defaults(function=archive)
+
+    parser_plot = commands.add_parser('plot', help='plot the Elo vs bookmakers probabilities of a season')
+    parser_plot.add_argument('input', help='file of Elo ratings for each match, see the rate command')
+    parser_plot.add_argument('output_file', help='image file to save the plot to')
+    parser_plot.add_argument('--title', help='title of the plot')
+    parser_plot.add_argument('--last-n-matches', type=int, default=180, help='number of matches at the end of the season to plot (default: 180)')
+    parser_plot.add_argument('--regression-line', action='store_true', help='add a linear regression line to each subplot')
+    parser_plot.set_defaults(function=plot)
+
+    parser_pipeline = commands.add_parser('pipeline', help='run the pipeline for each season in the manifest')
+    parser_pipeline.add_argument('stages', nargs='*', help=f'stages to run, from {STAGES} (default: all)')
+    parser_pipeline.add_argument('--manifest', help='JSON file with the manifest entries to use instead of MANIFEST')
+    parser_pipeline.add_argument('--force', action='store_true', help='run the stages even if their outputs are up to date')
+    parser_pipeline.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser_pipeline.add_argument('--target-week', type=int, default=39, help='number of weeks to calculate the weekly Elo ratings for')
+    parser_pipeline.add_argument('--instrument', action='store_true', help='time the stages and log a report at the end of the run')
+    parser_pipeline.add_argument('--profile', nargs='+', metavar='STAGE', help="profile these stages (e.g. pipeline.match elo.replay, or 'all') with cProfile")
+    parser_pipeline.add_argument('--outcome-model', help='JSON file of the outcome model, refitted over all the seasons after ingest, whose probabilities the match stage adds')
+    parser_pipeline.add_argument('--result-cache', metavar='DIR', help='directory of the result cache, so only the seasons whose matches changed are recalculated')
+    parser_pipeline.set_defaults(function=pipeline)
+
+    parser_simulate = commands.add_parser('simulate', help='simulate the rest of a season and save the final table probabilities')
+    parser_simulate.add_argument('input', help='processed match results file, or query with --source db')
+    parser_simulate.add_argument('output', help='file to write the probabilities of each team to, or table with --source db')
+    parser_simulate.add_argument('--source', choices=['csv', 'db'], default='csv', help='data source of the input and output (default: csv)')
+    parser_simulate.add_argument('--week', type=int, help='matchweek to simulate from (default: the last matchweek played)')
+    parser_simulate.add_argument('--simulations', type=int, default=100000, help='number of simulated seasons (default: 100000)')
+    parser_simulate.add_argument('--seed', type=int, default=0, help='seed of the simulations (default: 0)')
+    parser_simulate.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser_simulate.set_defaults(function=simulate)
+
+    parser_serve = commands.add_parser('serve', help='answer rating queries over HTTP, see rating_service')
+    parser_serve.add_argument('--season', action='append', metavar='SEASON=FILE',
+                              help='season name and processed match results file (or query with --source db) to serve, can be repeated (default: the seasons in the manifest)')
+    parser_serve.add_argument('--source', choices=['csv', 'db'], default='csv', help='data source of the seasons (default: csv)')
+    parser_serve.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser_serve.add_argument('--port', type=int, default=8000, help='port to listen on (default: 8000)')
+    parser_serve.add_argument('--cache-size', type=int, default=1024, help='number of query results kept in the LRU cache (default: 1024)')
+    parser_serve.set_defaults(function=serve)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # without a command, run the whole pipeline
+    if not argv:
+        argv = ['pipeline']
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        build_parser().print_help()
+        return 2
+    args.function(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,108 @@
 import os
+import re
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from logger import Logger
+from logger import Logger, Instrumentation, timed
 from error_handler import ErrorHandler
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow when the first Parquet file is written, as it is slow to import and only needed for Parquet output.
+
+    Returns:
+        module: pyarrow, or None if it is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def iter_json_rows(file_path, read_size=65536):
+    """
+    Iteratively parses the `d.rows` array of a raw JSON file and yields its rows one at a time, without loading the whole file.
+    Uses ijson when it is installed. Otherwise the file is read in blocks, the start of the `"rows"` array is located,
+    and each row is decoded with `json.JSONDecoder.raw_decode` as soon as it is complete.
+
+    Args:
+        file_path (str): path to the raw JSON file
+        read_size (int): number of characters to read from the file at a time
+
+    Yields:
+        dict: the raw data of one match
+    """
+    with open(file_path, 'r') as f:
+        if ijson is not None:
+            yield from ijson.items(f, 'd.rows.item', use_float=True)
+            return
+
+        decoder = json.JSONDecoder()
+        rows_start = re.compile(r'"rows"\s*:\s*\[')
+        buffer = ''
+        # find the start of the rows array, keeping the end of each block in case the key is split across two blocks
+        while True:
+            block = f.read(read_size)
+            buffer += block
+            match = rows_start.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            if not block:
+                raise ValueError(f'No rows found in {file_path}')
+            buffer = buffer[-256:]
+
+        position = 0
+        while True:
+            # skip the separators between rows
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                block = f.read(read_size)
+                if not block:
+                    raise ValueError(f'The rows array in {file_path} is not terminated')
+                buffer, position = buffer[position:] + block, 0
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                row, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the row is not complete yet, read the next block
+                block = f.read(read_size)
+                if not block:
+                    raise
+                buffer, position = buffer[position:] + block, 0
+                continue
+            yield row
+            position = end
+
+
+def _process_json_file(folder_path, file_path):
+    """
+    Parses and processes one raw JSON file, returning its block of processed rows in output order. Runs in a worker process.
+
+    Returns:
+        tuple: (rows, error), where error is None or the message of the error that stopped the file from being read
+    """
+    processor = JSONProcessor(folder_path, None)
+    try:
+        match_results = list(iter_json_rows(file_path))
+    except Exception as e:
+        return [], f"An error occurred while reading file {os.path.basename(file_path)}: {str(e)}"
+    match_results.reverse()
+    rows = [processor.process_match_row(result, i) for i, result in enumerate(match_results)]
+    return [row for row in rows if row is not None], None
+
 class JSONProcessor:
     """
     This class processes all the JSON files in a given folder containing raw match result data, and converts the data into a CSV file in a format suitable for generating Elo ratings. The processed data includes information such as the home and away team names, scores, and odds from a range of bookmakers. The resulting CSV file can then be used as input for generating Elo ratings of teams in a given league or season, and the bookmakers odds can be used to test and optimise the algorithm to create a (hopefully successful) betting system.
@@ -11,6 +111,9 @@ class JSONProcessor:
         process_json_files(folder_path, process_json_callback): Processes all the JSON files in the given folder, passing each file to the `process_json_callback` function. The function accepts a path to the folder containing the JSON files, and a callback function to process the data from each JSON file.
         process_json_callback(data): The function to process the data from each JSON file. It accepts a dictionary of data and returns a dictionary of processed data.
         save_to_csv(data, file_name): Saves the processed data to a CSV file. It accepts a dictionary of data and a file name string and returns a CSV file.
+        process_match_row(result, i): Converts the raw data of one match into a row of processed data, or returns None if the match is skipped.
+        iter_match_results(max_workers): Streams every JSON file in the folder, optionally across worker processes, and yields the processed rows in file order.
+        stream_match_results(output_file, chunk_size, max_workers): Writes the streamed rows to a CSV or Parquet file in chunks.
         generate_match_results_csv(folder_path, csv_file): Brings everything together, processing all the data from a season and converting it to a CSV file. It accepts a path to the folder containing the JSON files and a file name string for the resulting CSV file.
 
     Attributes:
@@ -46,11 +149,47 @@ class JSONProcessor:
                 file_path = os.path.join(self.folder_path, file_name)
                 try:
                     with open(file_path, "r") as f:
-                        data = pd.read_json(file_path)
-                        process_json_callback(data)
+                        data = json.load(f)
+                    process_json_callback(data)
                 except Exception as e:
                     self.error_handler.log_error(f"An error occurred while reading file {file_name}: {str(e)}")
 
+    def process_match_row(self, result, i):
+        """
+        Converts the raw data of one match into a row of processed data. Postponed games and games without a result are skipped.
+
+        Args:
+            result (dict): The raw data of one match.
+            i (int): The position of the match in its JSON file, used in error messages.
+
+        Returns:
+            dict: The processed row, or None if the match is skipped.
+        """
+        if 'result' not in result.keys():
+            self.logger.warning("Game between %s and %s is missing the result key", result['home-name'], result['away-name'])
+            return # make sure the item has a results key
+        if result['result'] == 'postp.':
+            self.logger.info("Game between %s and %s was postponed", result['home-name'], result['away-name'])
+            return # Skip this game as it is postponed
+        try:
+            return {
+                'home-name': result['home-name'],
+                'away-name': result['away-name'],
+                'home-result': result['homeResult'],
+                'away-result': result['awayResult'],
+                'home-win': True if result['home-winner'] == 'win' else False,
+                'away-win': True if result['away-winner'] == 'win' else False,
+                'home-odds-avg': round(result['odds'][0]['avgOdds'] - 1,2),
+                'home-odds-max': round(result['odds'][0]['maxOdds'] - 1,2),
+                'draw-odds-avg': round(result['odds'][1]['avgOdds'] - 1,2),
+                'draw-odds-max': round(result['odds'][1]['maxOdds'] - 1,2),
+                'away-odds-avg': round(result['odds'][2]['avgOdds'] - 1,2),
+                'away-odds-max': round(result['odds'][2]['maxOdds'] - 1,2),
+                'date-start-timestamp': result['date-start-timestamp']
+            }
+        except KeyError as e:
+            self.error_handler.log_error(f"An error occurred while processing game {i}: {str(e)}")
+
     def process_json_callback(self, data):
         """
         A callback function that processes the data from one JSON file and appends the processed data to the `results` list of the JSONProcessor instance.
@@ -62,33 +201,128 @@ class JSONProcessor:
         match_results = data['d']['rows']
         match_results.reverse()
         for i, result in enumerate(match_results):
-            if result['result'] == 'postp.':
-                self.logger.info(f"Game between {result['home-name']} and {result['away-name']} was postponed")
-                continue # Skip this game as it is postponed
-            else:
-                if 'result' not in result.keys():
-                    self.logger.warning(f"Game between {result['home-name']} and {result['away-name']} is missing the result key")
-                    continue # make sure the item has a results key
-            try:
-                self.results.append({
-                    'home-name': result['home-name'],
-                    'home-name': result['home-name'],
-                    'away-name': result['away-name'],
-                    'home-result': result['homeResult'],
-                    'away-result': result['awayResult'],
-                    'home-win': True if result['home-winner'] == 'win' else False,
-                    'away-win': True if result['away-winner'] == 'win' else False,
-                    'home-odds-avg': round(result['odds'][0]['avgOdds'] - 1,2),
-                    'home-odds-max': round(result['odds'][0]['maxOdds'] - 1,2),
-                    'draw-odds-avg': round(result['odds'][1]['avgOdds'] - 1,2),
-                    'draw-odds-max': round(result['odds'][1]['maxOdds'] - 1,2),
-                    'away-odds-avg': round(result['odds'][2]['avgOdds'] - 1,2),
-                    'away-odds-max': round(result['odds'][2]['maxOdds'] - 1,2),
-                    'date-start-timestamp': result['date-start-timestamp']
-                })
-            except KeyError as e:
-                self.error_handler.log_error(f"An error occurred while processing game {i}: {str(e)}")
-   
+            row = self.process_match_row(result, i)
+            if row is not None:
+                self.results.append(row)
+
+    def json_file_paths(self):
+        """
+        Returns the paths of the JSON files in the folder specified in `folder_path`, in sorted order.
+        """
+        return [os.path.join(self.folder_path, file_name) for file_name in sorted(os.listdir(self.folder_path)) if file_name.endswith(".json")]
+
+    def iter_match_results(self, max_workers=1):
+        """
+        Yields the processed rows of every JSON file in the folder specified in `folder_path`, streaming each file with `iter_json_rows`.
+        The rows of a file are stored newest first, so the rows of one file are held in memory to be yielded in reverse order.
+        If `max_workers` is greater than 1, the files are parsed across a pool of worker processes. The blocks of rows are merged
+        in sorted file name order, so the output is the same as when parsing the files one after another, and only a few
+        files ahead of the one being yielded are parsed at any time.
+
+        Args:
+            max_workers (int, optional): The number of worker processes. Defaults to 1, which parses the files in the current process.
+
+        Yields:
+            dict: A row of processed data.
+        """
+        if not os.path.exists(self.folder_path):
+            self.error_handler.log_error(f"The folder path {self.folder_path} does not exist")
+            return
+        file_paths = self.json_file_paths()
+        instrumentation = Instrumentation()
+        if max_workers == 1:
+            for file_path in file_paths:
+                rows, error = _process_json_file(self.folder_path, file_path)
+                if error:
+                    self.error_handler.log_error(error)
+                instrumentation.count('json files read')
+                instrumentation.count('matches processed', len(rows))
+                yield from rows
+            return
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            max_pending = (max_workers or os.cpu_count() or 1) * 2
+            pending = deque()
+            file_paths = iter(file_paths)
+            while True:
+                # keep a bounded number of files in flight, and collect the results in submission order
+                for file_path in file_paths:
+                    pending.append(executor.submit(_process_json_file, self.folder_path, file_path))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    return
+                rows, error = pending.popleft().result()
+                if error:
+                    self.error_handler.log_error(error)
+                instrumentation.count('json files read')
+                instrumentation.count('matches processed', len(rows))
+                yield from rows
+
+    @timed('json.ingest')
+    def stream_match_results(self, output_file=None, chunk_size=10000, max_workers=1):
+        """
+        Streams the processed rows of every JSON file to a CSV or Parquet file in chunks of `chunk_size` rows,
+        so only one chunk of processed data is held in memory at a time. Parquet output requires pyarrow.
+
+        Args:
+            output_file (str, optional): The .csv or .parquet file to write to. Defaults to the `csv_file` attribute.
+            chunk_size (int, optional): The number of rows written at a time.
+            max_workers (int, optional): The number of worker processes parsing the JSON files, see `iter_match_results`.
+
+        Returns:
+            int: The number of rows written, or 0 if the output file could not be written.
+        """
+        output_file = output_file or self.csv_file
+        is_parquet = output_file.endswith('.parquet')
+        if is_parquet and _import_pyarrow() is None:
+            self.error_handler.log_error("pyarrow is required to write Parquet files")
+            return 0
+        if not is_parquet and not output_file.endswith('.csv'):
+            self.error_handler.log_error(f"The output file {output_file} is not a .csv or .parquet file")
+            return 0
+
+        nb_rows = 0
+        parquet_writer = None
+        chunk = []
+        try:
+            for row in self.iter_match_results(max_workers):
+                chunk.append(row)
+                if len(chunk) < chunk_size:
+                    continue
+                parquet_writer = self._write_chunk(chunk, output_file, nb_rows, parquet_writer)
+                nb_rows += len(chunk)
+                chunk = []
+            if chunk:
+                parquet_writer = self._write_chunk(chunk, output_file, nb_rows, parquet_writer)
+                nb_rows += len(chunk)
+        except IOError as e:
+            self.error_handler.log_error(f"An error occurred while creating the output file: {str(e)}")
+            return 0
+        finally:
+            if parquet_writer is not None:
+                parquet_writer.close()
+
+        if not nb_rows:
+            self.error_handler.log_error("No results to save to CSV file")
+            return 0
+        self.logger.info(f'{nb_rows} processed matches have been saved to {output_file}')
+        return nb_rows
+
+    def _write_chunk(self, chunk, output_file, nb_rows_written, parquet_writer):
+        df = pd.DataFrame(chunk)
+        if output_file.endswith('.parquet'):
+            pyarrow = _import_pyarrow()
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            if parquet_writer is None:
+                parquet_writer = pyarrow.parquet.ParquetWriter(output_file, table.schema)
+            parquet_writer.write_table(table)
+            return parquet_writer
+        # the first chunk creates the file and writes the header, the others are appended
+        first_chunk = nb_rows_written == 0
+        df.to_csv(output_file, index=False, mode='w' if first_chunk else 'a', header=first_chunk)
+        return None
+
     def save_to_csv(self):
         """
         Saves the processed data stored in the `results` list of the JSONProcessor instance to a CSV file.
@@ -105,7 +339,5 @@ class JSONProcessor:
         except IOError as e:
             self.error_handler.log_error(f"An error occurred while creating the CSV file: {str(e)}")
 
-    def generate_match_results_csv(self):
-        self.process_json_files(self.process_json_callback)
-        self.save_to_csv()
-        
\ No newline at end of file
+    def generate_match_results_csv(self, max_workers=1):
+        return self.stream_match_results(self.csv_file, max_workers=max_workers)
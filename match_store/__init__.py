@@ -0,0 +1,2 @@
+from match_store.team_vocabulary import TeamVocabulary
+from match_store.match_store import MatchStore
@@ -0,0 +1,192 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from .team_vocabulary import TeamVocabulary
+
+STORE_VERSION = 1
+
+# columns of the store and their types
+MATCH_STORE_COLUMNS = {
+    'home_id': np.int16,
+    'away_id': np.int16,
+    'home_goals': np.int8,
+    'away_goals': np.int8,
+    'home_odds_avg': np.float32,
+    'home_odds_max': np.float32,
+    'draw_odds_avg': np.float32,
+    'draw_odds_max': np.float32,
+    'away_odds_avg': np.float32,
+    'away_odds_max': np.float32,
+    'timestamp': np.int64,
+}
+
+# processed match results column of each odds and timestamp column of the store
+PROCESSED_COLUMNS = {
+    'home_odds_avg': 'home-odds-avg',
+    'home_odds_max': 'home-odds-max',
+    'draw_odds_avg': 'draw-odds-avg',
+    'draw_odds_max': 'draw-odds-max',
+    'away_odds_avg': 'away-odds-avg',
+    'away_odds_max': 'away-odds-max',
+    'timestamp': 'date-start-timestamp',
+}
+
+
+class MatchStore:
+    """
+    A compact store of processed match results. Team names are interned into a TeamVocabulary, which can be shared across seasons
+    and leagues, and each match is stored as fixed-width typed arrays: int16 team ids, int8 goals, float32 odds and int64 timestamps,
+    38 bytes per match. A store is saved as a directory of .npy files, one per column, with the vocabulary and a meta.json file,
+    and can be loaded memory-mapped.
+
+    The odds of the processed data are rounded to two decimals, so the float32 odds are rounded back to two decimals when the
+    store is converted back to a DataFrame, which gives the original values. The odds are optional: the odds columns missing
+    from the match data are stored as NaN, so match data with only the teams, goals and timestamps can still be replayed.
+
+    Attributes:
+        vocabulary (TeamVocabulary): The vocabulary of the team ids.
+        columns (dict): The typed column arrays, keyed by the names in MATCH_STORE_COLUMNS.
+
+    Methods:
+        from_dataframe(df, vocabulary=None) -> MatchStore: Builds a store from processed match results.
+        to_dataframe() -> pd.DataFrame: Converts the store back to processed match results.
+        encode() -> tuple: Returns the matches in the form returned by `replay_kernel.encode_matches`, computed once per store.
+        concat(stores) -> MatchStore: Concatenates stores sharing the same vocabulary.
+        nbytes() -> int: Returns the memory used by the columns.
+        save(path): Saves the store to a directory.
+        load(path, mmap_mode=None) -> MatchStore: Loads a store saved with `save`.
+    """
+
+    def __init__(self, columns, vocabulary):
+        self.columns = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in MATCH_STORE_COLUMNS.items()}
+        self.vocabulary = vocabulary
+        self._encoding = None
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def __getitem__(self, key):
+        """
+        Returns the matches selected by a slice, an array of positions or a boolean mask, as a store sharing the vocabulary.
+        """
+        return MatchStore({name: values[key] for name, values in self.columns.items()}, self.vocabulary)
+
+    @classmethod
+    def from_dataframe(cls, df, vocabulary=None):
+        """
+        Builds a store from processed match results, interning the team names into `vocabulary`.
+
+        Args:
+            df (pd.DataFrame): processed match results, in the schema written by JSONProcessor
+            vocabulary (TeamVocabulary, optional): the vocabulary to intern the team names into. Defaults to a new vocabulary.
+
+        Raises:
+            KeyError: if a team, goals or timestamp column of the processed match data is missing
+            ValueError: if goals do not fit in an int8 or a team name is missing
+        """
+        vocabulary = vocabulary if vocabulary is not None else TeamVocabulary()
+        team_ids = vocabulary.intern(df[['home-name', 'away-name']].to_numpy())
+        columns = {'home_id': team_ids[:, 0], 'away_id': team_ids[:, 1]}
+        for name, column in [('home_goals', 'home-result'), ('away_goals', 'away-result')]:
+            goals = df[column].to_numpy(dtype=np.int64)
+            if len(goals) and (goals.min() < 0 or goals.max() > np.iinfo(np.int8).max):
+                raise ValueError(f'The goals in {column} do not fit in an int8')
+            columns[name] = goals
+        for name, column in PROCESSED_COLUMNS.items():
+            if column not in df.columns and name != 'timestamp':
+                # the odds are only needed by the outputs comparing the ratings to the bookmakers
+                columns[name] = np.full(len(df), np.nan, dtype=MATCH_STORE_COLUMNS[name])
+            else:
+                columns[name] = df[column].to_numpy(dtype=MATCH_STORE_COLUMNS[name])
+        return cls(columns, vocabulary)
+
+    def to_dataframe(self):
+        """
+        Converts the store back to processed match results, in the schema written by JSONProcessor.
+        """
+        home_goals = self.columns['home_goals'].astype(np.int64)
+        away_goals = self.columns['away_goals'].astype(np.int64)
+        data = {
+            'home-name': self.vocabulary.names_of(self.columns['home_id']),
+            'away-name': self.vocabulary.names_of(self.columns['away_id']),
+            'home-result': home_goals,
+            'away-result': away_goals,
+            'home-win': home_goals > away_goals,
+            'away-win': away_goals > home_goals,
+        }
+        for name, column in PROCESSED_COLUMNS.items():
+            values = self.columns[name]
+            data[column] = values.astype(np.int64) if name == 'timestamp' else np.round(values.astype(np.float64), 2)
+        return pd.DataFrame(data)
+
+    def encode(self):
+        """
+        Returns the matches in the form returned by `replay_kernel.encode_matches`: (teams, home_idx, away_idx, home_goals, away_goals),
+        with team ids local to the store, in order of first appearance. The encoding is factorised from the integer team ids rather
+        than the names, and is computed once per store.
+        """
+        if self._encoding is None:
+            codes, uniques = pd.factorize(np.column_stack([self.columns['home_id'], self.columns['away_id']]).ravel())
+            codes = codes.reshape(-1, 2)
+            self._encoding = (self.vocabulary.names_of(uniques),
+                              np.ascontiguousarray(codes[:, 0], dtype=np.int64),
+                              np.ascontiguousarray(codes[:, 1], dtype=np.int64),
+                              self.columns['home_goals'].astype(np.int64),
+                              self.columns['away_goals'].astype(np.int64))
+        return self._encoding
+
+    @classmethod
+    def concat(cls, stores):
+        """
+        Concatenates stores that share the same vocabulary, e.g. the seasons of a league.
+
+        Raises:
+            ValueError: if the stores do not share the same vocabulary
+        """
+        vocabulary = stores[0].vocabulary
+        if any(store.vocabulary is not vocabulary for store in stores):
+            raise ValueError('Only stores sharing the same vocabulary can be concatenated')
+        return cls({name: np.concatenate([store.columns[name] for store in stores]) for name in MATCH_STORE_COLUMNS}, vocabulary)
+
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    def save(self, path):
+        """
+        Saves the store to a directory, with one .npy file per column, the vocabulary in vocabulary.json and the format in meta.json.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(path, f'{name}.npy'), values)
+        self.vocabulary.save(os.path.join(path, 'vocabulary.json'))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'version': STORE_VERSION, 'nb_matches': len(self),
+                       'columns': {name: np.dtype(dtype).name for name, dtype in MATCH_STORE_COLUMNS.items()}}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None, vocabulary=None):
+        """
+        Loads a store saved with `save`.
+
+        Args:
+            path (str): the directory of the store
+            mmap_mode (str, optional): 'r' to memory-map the columns instead of reading them, see `np.load`
+            vocabulary (TeamVocabulary, optional): a vocabulary to share with other stores. The saved team names are interned into it,
+                and the team ids are translated. Defaults to the saved vocabulary.
+
+        Raises:
+            ValueError: if the directory holds a store of another format
+        """
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported match store version {meta.get('version')} in {path}")
+        columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in MATCH_STORE_COLUMNS}
+        saved_vocabulary = TeamVocabulary.load(os.path.join(path, 'vocabulary.json'))
+        if vocabulary is None:
+            return cls(columns, saved_vocabulary)
+        translation = vocabulary.intern(np.array(saved_vocabulary.names, dtype=object))
+        columns['home_id'] = translation[columns['home_id']]
+        columns['away_id'] = translation[columns['away_id']]
+        return cls(columns, vocabulary)
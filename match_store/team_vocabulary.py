@@ -0,0 +1,93 @@
+import json
+import numpy as np
+import pandas as pd
+
+# team ids are stored as int16
+MAX_TEAMS = np.iinfo(np.int16).max + 1
+
+
+class TeamVocabulary:
+    """
+    Interns team names into compact integer ids. Each name is given the next free id the first time it is seen, and keeps it,
+    so one vocabulary can be shared by the match stores of several seasons and leagues and a team has the same id in all of them.
+
+    Attributes:
+        names (list): The team names, indexed by id.
+
+    Methods:
+        intern(names) -> np.ndarray: Returns the int16 ids of an array of team names, adding the new names to the vocabulary.
+        ids_of(names) -> np.ndarray: Returns the ids of team names that are already in the vocabulary.
+        names_of(ids) -> np.ndarray: Returns the names of an array of ids.
+        save(path): Saves the vocabulary to a JSON file.
+        load(path) -> TeamVocabulary: Loads a vocabulary saved with `save`.
+    """
+
+    def __init__(self, names=None):
+        self.names = []
+        self._ids = {}
+        self._names_array = None
+        if names is not None:
+            self.intern(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def intern(self, names):
+        """
+        Returns the ids of an array of team names, giving the names that are not in the vocabulary yet the next free ids,
+        in order of first appearance. Only the distinct names are looked up, so interning a season costs one dictionary
+        lookup per team rather than per match.
+
+        Args:
+            names (array-like): The team names.
+
+        Returns:
+            np.ndarray: The int16 id of each name.
+
+        Raises:
+            ValueError: if the vocabulary would hold more than MAX_TEAMS names.
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object).ravel())
+        if (codes < 0).any():
+            raise ValueError('Team names cannot be missing')
+        unique_ids = np.empty(len(uniques), dtype=np.int16)
+        for i, name in enumerate(uniques):
+            team_id = self._ids.get(name)
+            if team_id is None:
+                team_id = len(self.names)
+                if team_id >= MAX_TEAMS:
+                    raise ValueError(f'A team vocabulary holds at most {MAX_TEAMS} teams')
+                self._ids[name] = team_id
+                self.names.append(name)
+                self._names_array = None
+            unique_ids[i] = team_id
+        return unique_ids[codes].reshape(np.shape(names))
+
+    def ids_of(self, names):
+        """
+        Returns the ids of team names that are already in the vocabulary.
+
+        Raises:
+            KeyError: if a name is not in the vocabulary.
+        """
+        return np.array([self._ids[name] for name in names], dtype=np.int16)
+
+    def names_of(self, ids):
+        """
+        Returns the names of an array of ids, as an array of strings.
+        """
+        if self._names_array is None or len(self._names_array) != len(self.names):
+            self._names_array = np.array(self.names, dtype=object)
+        return self._names_array[np.asarray(ids, dtype=np.intp)]
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.names, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls(json.load(f))
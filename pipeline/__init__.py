@@ -0,0 +1 @@
+from pipeline.pipeline_runner import PipelineRunner
@@ -0,0 +1,299 @@
+import os
+import json
+import glob
+from concurrent.futures import ProcessPoolExecutor
+from logger import Logger, Instrumentation
+from error_handler import ErrorHandler
+
+# stages of the pipeline, in the order they run for each season
+STAGES = ['ingest', 'match', 'weekly', 'plot']
+
+# default locations of the outputs of each season, formatted with the manifest entry
+PROCESSED_FILE = './data/processed-data/{season}.csv'
+RESULTS_DIR = './data/results/elo-ratings/{season}'
+# format of the week-data directories written by the weekly stage, recorded in their meta.json file and bumped when the weeks
+# change, so the directories of an older format are rebuilt whatever their modification time. Version 2: the weeks are the
+# matchweeks of RatingHistory instead of blocks of 10 matches.
+WEEK_DATA_VERSION = 2
+WEEK_DATA_META_FILE = 'meta.json'
+
+
+def _is_up_to_date(inputs, outputs):
+    """
+    Checks whether all the outputs of a stage exist and are newer than all of its inputs.
+    """
+    if not outputs or not all(os.path.exists(output) for output in outputs):
+        return False
+    if not inputs:
+        return True
+    return min(os.path.getmtime(output) for output in outputs) >= max(os.path.getmtime(input) for input in inputs)
+
+
+def _week_data_version(week_dir):
+    """
+    Returns the format version recorded in a week-data directory, or None if it has none (written before the versions were recorded).
+    """
+    try:
+        with open(os.path.join(week_dir, WEEK_DATA_META_FILE), 'r') as f:
+            return json.load(f).get('version')
+    except (IOError, ValueError, AttributeError):
+        return None
+
+
+def _run_season(entry, stages, force, target_week, profile=None, outcome_model_file=None, result_cache_dir=None):
+    """
+    Runs the requested stages for one season of the manifest. Runs in a worker process.
+    If `profile` is not None, the instrumentation of the worker process is reset and enabled, profiling the stages in `profile`.
+    If `outcome_model_file` is not None, the match stage adds the probabilities of the outcome model saved in it.
+    If `result_cache_dir` is not None, the match and weekly stages use the result cache in it.
+    A stage that fails is reported with its error message, and the later stages of the season are not run.
+
+    Returns:
+        tuple: (statuses, summary), where statuses is a list of (stage, status) tuples, status being 'done', 'skipped' or an error message,
+        and summary is the instrumentation summary of the worker process, or None if `profile` is None
+    """
+    instrumentation = Instrumentation()
+    if profile is not None:
+        instrumentation.reset()
+        instrumentation.enable(profile)
+    season = entry['season']
+    processed_file = entry['processed_file']
+    results_dir = entry['results_dir']
+    match_file = os.path.join(results_dir, 'match-data', 'index.csv')
+    week_dir = os.path.join(results_dir, 'week-data')
+    plot_file = os.path.join(results_dir, 'match-data', f'elo-vs-bookies-probabilities-{season}.png')
+    raw_files = sorted(glob.glob(os.path.join(entry['raw_dir'], '*.json'))) if entry.get('raw_dir') else []
+
+    statuses = []
+    elo_calculator = None
+    for stage in stages:
+        if stage == 'ingest':
+            # without raw files there is nothing to rebuild the processed file from
+            inputs, outputs = raw_files, [processed_file]
+            if not raw_files and not os.path.exists(processed_file):
+                statuses.append((stage, f"No raw data in {entry.get('raw_dir')} to process"))
+                break
+            if not raw_files:
+                # the processed file is kept, even with force
+                statuses.append((stage, 'skipped'))
+                continue
+        elif stage == 'match':
+            inputs, outputs = [processed_file], [match_file]
+            if outcome_model_file is not None:
+                inputs.append(outcome_model_file)
+        elif stage == 'weekly':
+            inputs, outputs = [processed_file], glob.glob(os.path.join(week_dir, 'week-*.csv'))
+            if _week_data_version(week_dir) != WEEK_DATA_VERSION:
+                outputs = []
+        else:
+            inputs, outputs = [match_file], [plot_file]
+
+        if not force and _is_up_to_date(inputs, outputs):
+            statuses.append((stage, 'skipped'))
+            continue
+
+        # the methods of the stages log their errors and return a falsy value when they fail
+        with instrumentation.timer(f'pipeline.{stage}'):
+            # the modules of each stage are imported when the stage runs, so a run only imports what it needs
+            if stage == 'ingest':
+                from match_results_generator import JSONProcessor
+                os.makedirs(os.path.dirname(processed_file) or '.', exist_ok=True)
+                failed = not JSONProcessor(entry['raw_dir'], processed_file).generate_match_results_csv()
+                error = f"The raw data in {entry['raw_dir']} could not be processed to {processed_file}"
+            elif stage in ('match', 'weekly'):
+                if elo_calculator is None:
+                    from elo_ratings_calculator import EloCalculator, ResultCache
+                    result_cache = ResultCache(result_cache_dir) if result_cache_dir is not None else None
+                    elo_calculator = EloCalculator('csv', processed_file, result_cache=result_cache)
+                if stage == 'match':
+                    outcome_model = None
+                    if outcome_model_file is not None:
+                        from elo_ratings_calculator import OrderedLogitModel
+                        outcome_model = OrderedLogitModel.load(outcome_model_file)
+                    os.makedirs(os.path.dirname(match_file), exist_ok=True)
+                    failed = elo_calculator.calculate_elo_ratings_for_each_match('csv', match_file, outcome_model) is None
+                    error = f'The Elo ratings for each match could not be calculated from {processed_file} and saved to {match_file}'
+                else:
+                    os.makedirs(week_dir, exist_ok=True)
+                    # the weeks written before are removed, so no week of an older format is left behind
+                    for week_file in glob.glob(os.path.join(week_dir, 'week-*.csv')):
+                        os.remove(week_file)
+                    failed = elo_calculator.calculate_elo_ratings_for_each_week('csv', week_dir, target_week) is None
+                    error = f'The Elo ratings for each week could not be calculated from {processed_file} and saved to {week_dir}'
+                    if not failed:
+                        with open(os.path.join(week_dir, WEEK_DATA_META_FILE), 'w') as f:
+                            json.dump({'version': WEEK_DATA_VERSION}, f)
+            else:
+                from grapher import Grapher
+                failed = Grapher().plot_elo_bookies_scatter(csv_file=match_file, output_file=plot_file, title=entry['title'], show=False) is None
+                error = f'The Elo vs bookmakers probabilities of {match_file} could not be plotted to {plot_file}'
+        if failed:
+            # the later stages of the season depend on this one
+            statuses.append((stage, error))
+            break
+        statuses.append((stage, 'done'))
+    return statuses, instrumentation.summary() if profile is not None else None
+
+
+class PipelineRunner:
+    """
+    This class runs the stages of the Elo ratings pipeline for every season in a manifest: processing the raw JSON data (ingest),
+    calculating the Elo ratings for each match (match) and for each week (weekly), and plotting the Elo vs bookmakers probabilities (plot).
+    Seasons are spread across a process pool, and the stages of a season run in order. A stage is skipped when all of its outputs
+    are newer than its inputs, unless `force` is set. The weekly stage also records the format of its week-data directory in a
+    meta.json file, and rebuilds the directories of an older format, see WEEK_DATA_VERSION.
+
+    Each manifest entry is a dictionary with a 'season' and optionally a 'league', a 'raw_dir' containing the raw JSON files,
+    and a 'title' for the plot. The 'processed_file' and 'results_dir' default to the locations in PROCESSED_FILE and RESULTS_DIR,
+    which should include the league when running several leagues.
+
+    With an `outcome_model` file, the ingest stage runs first for every season, and an OrderedLogitModel is then refitted over
+    the processed matches of all the seasons and saved to the file whenever a processed file is newer than it. The match stage
+    adds the probabilities of the model to the ratings of each match, and reruns when the model has been refitted.
+
+    With a `result_cache` directory, the match and weekly stages return the cached ratings of seasons whose matches have not
+    changed, see `ResultCache`, and do not rewrite their outputs, so a run only recalculates the seasons with new matches.
+
+    With `instrument` set (or the ELO_INSTRUMENTATION environment variable), the stages are timed, and a report of the timings and
+    counters of all the seasons is logged at the end of the run, see `Instrumentation`. The stages listed in `profile` are also profiled
+    with cProfile. Profiles are only reported for the stages that run in the current process, so profile with `max_workers=1`.
+
+    Attributes:
+        manifest (list): The manifest entries, with their default paths filled in.
+        max_workers (int): The number of worker processes. If 1, the seasons run in the current process.
+        instrumentation (Instrumentation): The instrumentation the timings and counters of the run are recorded in.
+        outcome_model (str): The JSON file of the outcome model fitted over all the seasons, or None.
+        result_cache (str): The directory of the result cache of the match and weekly stages, or None.
+
+    Methods:
+        load_manifest(manifest) -> List[dict]: Loads the manifest from a list of entries or a JSON file.
+        fit_outcome_model(force) -> str: Refits the outcome model over the processed matches of all the seasons if they changed.
+        run(stages, force, target_week) -> Dict[str, list]: Runs the stages for every season and returns the status of each stage.
+    """
+
+    def __init__(self, manifest, max_workers=None, processed_file=PROCESSED_FILE, results_dir=RESULTS_DIR, instrument=False, profile=None,
+                 outcome_model=None, result_cache=None):
+        self.logger = Logger().logger
+        self.instrumentation = Instrumentation()
+        if instrument or profile:
+            self.instrumentation.enable(profile)
+        self.error_handler = ErrorHandler(log_destination='file')
+        self.max_workers = max_workers
+        self.processed_file = processed_file
+        self.results_dir = results_dir
+        self.outcome_model = outcome_model
+        self.result_cache = result_cache
+        self.manifest = self.load_manifest(manifest)
+
+    def load_manifest(self, manifest):
+        if isinstance(manifest, str):
+            try:
+                with open(manifest, 'r') as f:
+                    manifest = json.load(f)
+            except (IOError, ValueError) as e:
+                self.error_handler.log_error(f'An error occurred while reading the manifest {manifest}: {e}')
+                return []
+        entries = []
+        for entry in manifest:
+            if 'season' not in entry:
+                self.error_handler.log_error(f'Manifest entry {entry} has no season and will be ignored')
+                continue
+            entry = {'league': '', **entry}
+            entry.setdefault('processed_file', self.processed_file.format(**entry))
+            entry.setdefault('results_dir', self.results_dir.format(**entry))
+            entry.setdefault('title', ' '.join(part for part in [entry['season'], entry['league']] if part))
+            entries.append(entry)
+        return entries
+
+    def fit_outcome_model(self, force=False):
+        """
+        Fits an OrderedLogitModel over the processed matches of every season of the manifest and saves it to the `outcome_model`
+        file, unless the file is newer than all the processed files.
+
+        Returns:
+            str: the status of the fit: 'done', 'skipped' or an error message
+        """
+        processed_files = [entry['processed_file'] for entry in self.manifest if os.path.exists(entry['processed_file'])]
+        if not processed_files:
+            return 'No processed matches to fit the outcome model to'
+        if not force and _is_up_to_date(processed_files, [self.outcome_model]):
+            return 'skipped'
+        from elo_ratings_calculator import EloCalculator, OrderedLogitModel
+        with self.instrumentation.timer('pipeline.outcome_model'):
+            try:
+                model = OrderedLogitModel().fit_calculators([EloCalculator('csv', processed_file) for processed_file in processed_files])
+                os.makedirs(os.path.dirname(self.outcome_model) or '.', exist_ok=True)
+                model.save(self.outcome_model)
+            except (IOError, KeyError, TypeError, ValueError) as e:
+                return str(e)
+        self.logger.info(f'The outcome model has been fitted to {model.nb_matches} matches and saved to {self.outcome_model}')
+        return 'done'
+
+    def _run_stages(self, entries, keys, stages, force, target_week, outcome_model_file=None):
+        """
+        Runs stages for the seasons of manifest entries, across the process pool, and returns the list of statuses of each season.
+        """
+        if self.max_workers == 1:
+            results = []
+            for entry in entries:
+                try:
+                    season_statuses, _ = _run_season(entry, stages, force, target_week, outcome_model_file=outcome_model_file,
+                                                     result_cache_dir=self.result_cache)
+                except Exception as e:
+                    season_statuses = [('error', str(e))]
+                results.append(season_statuses)
+            return results
+        # the worker processes record into their own instrumentation, and return a summary to merge
+        profile = sorted(self.instrumentation.profile_stages) if self.instrumentation.enabled else None
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(_run_season, entry, stages, force, target_week, profile, outcome_model_file, self.result_cache) for entry in entries]
+            results = []
+            for key, future in zip(keys, futures):
+                try:
+                    season_statuses, summary = future.result()
+                except Exception as e:
+                    season_statuses, summary = [('error', str(e))], None
+                if summary is not None:
+                    self.instrumentation.merge(summary)
+                results.append(season_statuses)
+        return results
+
+    def run(self, stages=STAGES, force=False, target_week=39):
+        invalid_stages = [stage for stage in stages if stage not in STAGES]
+        if invalid_stages:
+            self.error_handler.log_error(f'Invalid stages: {invalid_stages}. Choose from {STAGES}.')
+            return
+        # run the stages in pipeline order, whatever order they were given in
+        stages = [stage for stage in STAGES if stage in stages]
+        keys = [f"{entry['league']} {entry['season']}".strip() for entry in self.manifest]
+
+        with self.instrumentation.timer('pipeline.run'):
+            if self.outcome_model is None or 'match' not in stages:
+                results = self._run_stages(self.manifest, keys, stages, force, target_week)
+            else:
+                # the outcome model is fitted over all the seasons, so every season is ingested before it is refitted
+                results = [[] for _ in keys]
+                if 'ingest' in stages:
+                    results = self._run_stages(self.manifest, keys, ['ingest'], force, target_week)
+                status = self.fit_outcome_model(force)
+                if status not in ('done', 'skipped'):
+                    self.error_handler.log_error(f'Fitting the outcome model failed. Details: {status}')
+                else:
+                    self.logger.info(f'outcome model {status}')
+                outcome_model_file = self.outcome_model if os.path.exists(self.outcome_model) else None
+                # the seasons whose ingest failed are not run any further
+                ingested = [i for i, season_statuses in enumerate(results) if all(status in ('done', 'skipped') for _, status in season_statuses)]
+                later_results = self._run_stages([self.manifest[i] for i in ingested], [keys[i] for i in ingested],
+                                                 [stage for stage in stages if stage != 'ingest'], force, target_week, outcome_model_file)
+                for i, later_statuses in zip(ingested, later_results):
+                    results[i] = results[i] + later_statuses
+
+        statuses = dict(zip(keys, results))
+        for key, season_statuses in statuses.items():
+            for stage, status in season_statuses:
+                if status in ('done', 'skipped'):
+                    self.logger.info(f'{key}: {stage} {status}')
+                else:
+                    self.error_handler.log_error(f'{key}: {stage} failed. Details: {status}')
+        self.instrumentation.log_report()
+        return statuses
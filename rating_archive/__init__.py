@@ -0,0 +1,2 @@
+from rating_archive.rating_archive import RatingArchive
+from rating_archive.csv_converter import WeeklyCSVConverter
@@ -0,0 +1,80 @@
+import os
+import re
+import glob
+import pandas as pd
+from logger import Logger
+from error_handler import ErrorHandler
+from csv_handler import CSVHandler
+
+# name of the weekly ratings files written by EloCalculator.calculate_elo_ratings_for_each_week
+WEEK_FILE_PATTERN = re.compile(r'week-(\d+)\.csv$')
+
+
+class WeeklyCSVConverter:
+    """
+    This class migrates the weekly ratings CSV trees written by the pipeline (`<results_dir>/<season>/week-data/week-N.csv`,
+    one 'Team', 'Rating' file per week) into a RatingArchive, with one block per season.
+
+    Attributes:
+        archive (RatingArchive): The archive the seasons are appended to.
+
+    Methods:
+        read_week_dir(week_dir) -> pd.DataFrame: Reads the week-N.csv files of a season into a weeks x teams matrix.
+        convert(results_dir, league='') -> Dict[str, str]: Appends every season of a results tree to the archive.
+    """
+
+    def __init__(self, archive):
+        self.logger = Logger().logger
+        self.error_handler = ErrorHandler(log_destination='file')
+        self.csv_handler = CSVHandler(use_cache=False)
+        self.archive = archive
+
+    def read_week_dir(self, week_dir):
+        """
+        Reads the week-N.csv files of a season into a weeks x teams matrix of ratings indexed by week, with the teams in the
+        order of the first week.
+
+        Raises:
+            ValueError: if the directory has no week files, a file cannot be read, or a week is missing
+        """
+        week_files = {}
+        for week_file in glob.glob(os.path.join(week_dir, 'week-*.csv')):
+            match = WEEK_FILE_PATTERN.search(os.path.basename(week_file))
+            if match:
+                week_files[int(match.group(1))] = week_file
+        if not week_files:
+            raise ValueError(f'No week files in {week_dir}')
+        weeks = sorted(week_files)
+        if weeks[-1] - weeks[0] + 1 != len(weeks):
+            raise ValueError(f'Weeks are missing in {week_dir}')
+        tables = []
+        for week in weeks:
+            result = self.csv_handler.read_csv(week_files[week])
+            if 'error' in result:
+                raise ValueError(result['error'])
+            tables.append(result['data'].set_index('Team')['Rating'].rename(week))
+        return pd.DataFrame(tables).rename_axis('Week')
+
+    def convert(self, results_dir, league=''):
+        """
+        Appends the weekly ratings of every season in a results tree to the archive.
+
+        Args:
+            results_dir (str): the directory holding one directory per season, e.g. './data/results/elo-ratings'
+            league (str): the league of the seasons
+
+        Returns:
+            dict: the status of each season: 'done' or an error message
+        """
+        statuses = {}
+        for week_dir in sorted(glob.glob(os.path.join(results_dir, '*', 'week-data'))):
+            season = os.path.basename(os.path.dirname(week_dir))
+            try:
+                self.archive.append(league, season, self.read_week_dir(week_dir))
+                statuses[season] = 'done'
+            except (KeyError, ValueError) as e:
+                self.error_handler.log_error(f'The weekly ratings of {season} could not be archived: {e}')
+                statuses[season] = str(e)
+        nb_done = sum(status == 'done' for status in statuses.values())
+        self.logger.info(f'The weekly ratings of {nb_done} seasons in {results_dir} have been archived to {self.archive.path}')
+        return statuses
@@ -0,0 +1,287 @@
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+from match_store import TeamVocabulary
+
+ARCHIVE_VERSION = 1
+# files of an archive directory. The data file of generation n > 0 (written by the n-th compaction) is DATA_FILE_PATTERN
+DATA_FILE = 'ratings.bin'
+DATA_FILE_PATTERN = 'ratings-{generation}.bin'
+INDEX_FILE = 'index.json'
+VOCABULARY_FILE = 'vocabulary.json'
+# ratings are stored as little-endian float64
+RATING_DTYPE = np.dtype('<f8')
+
+
+class RatingArchive:
+    """
+    An append-only archive of weekly rating tables, for any number of leagues and seasons, in a single binary file that is
+    memory-mapped for reads. Each (league, season) is one block of the file: a weeks x teams matrix of float64 ratings, row
+    major, so the table of a week is a contiguous row and the ratings of a team over the weeks a strided column. A JSON sidecar
+    index records the offset, the first week and the team ids of every block, the team names being interned into a
+    TeamVocabulary shared by all the blocks, so ratings are indexed by (league, season, week, team id).
+
+    Blocks are only ever appended. Writing a season again (e.g. after new matches) appends a new block, which supersedes the
+    previous one in the index, and `compact` writes the latest blocks to the data file of a new generation, named in the
+    index. The index is replaced atomically after the data is written and synced, so a crash at any point leaves either the
+    old or the new archive, and a reader never sees a block that is not fully written. Readers reload the index when it has
+    been replaced, so an open archive follows the appends and compactions of another instance. The archive supports one writer
+    at a time.
+
+    Reads return views of the memory-mapped file, without copying: loading the weekly tables of every season costs one
+    mmap instead of one file open per week.
+
+    Attributes:
+        path (str): The directory of the archive.
+        vocabulary (TeamVocabulary): The vocabulary of the team ids.
+        blocks (list): The index entries of the blocks, in the order they were appended.
+        generation (int): The number of compactions of the archive, which names its data file.
+
+    Methods:
+        append(league, season, snapshots): Appends the weeks x teams ratings of a season.
+        seasons() -> pd.DataFrame: Returns the (league, season) pairs in the archive with their weeks and teams.
+        read(league, season, weeks=None) -> np.ndarray: Returns the ratings of a season, or of some of its weeks, as a view.
+        teams(league, season) -> np.ndarray: Returns the names of the columns of a season.
+        team_ratings(league, season, team) -> np.ndarray: Returns the ratings of a team over the weeks of a season, as a view.
+        week_table(league, season, week) -> pd.DataFrame: Returns the table of a week, in the format of the week-N.csv files.
+        snapshots(league, season) -> pd.DataFrame: Returns the ratings of a season as a weeks x teams DataFrame.
+        compact(): Rewrites the archive without the superseded blocks.
+    """
+
+    def __init__(self, path):
+        """
+        Opens the archive in a directory, creating an empty archive if the directory does not hold one.
+
+        Raises:
+            ValueError: if the directory holds an archive of another format
+        """
+        self.path = path
+        self.vocabulary = TeamVocabulary()
+        self.blocks = []
+        self.generation = 0
+        self._data_file_name = DATA_FILE
+        self._index_stat = None
+        self._mmap = None
+        self._mmap_file = None
+        self._mmap_size = 0
+        self._refresh()
+
+    @property
+    def data_file(self):
+        return os.path.join(self.path, self._data_file_name)
+
+    @property
+    def _index_file(self):
+        return os.path.join(self.path, INDEX_FILE)
+
+    def _refresh(self):
+        """
+        Reloads the index if it has been replaced since it was last read, e.g. by an append or a compaction of another
+        instance, so the offsets of the blocks always refer to the current data file.
+
+        Raises:
+            ValueError: if the directory holds an archive of another format
+        """
+        try:
+            stat = os.stat(self._index_file)
+        except FileNotFoundError:
+            return
+        index_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if index_stat == self._index_stat:
+            return
+        with open(self._index_file, 'r') as f:
+            index = json.load(f)
+        if index.get('version') != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported rating archive version {index.get('version')} in {self.path}")
+        self.blocks = index['blocks']
+        self.generation = index.get('generation', 0)
+        self._data_file_name = index.get('data_file', DATA_FILE)
+        self.vocabulary = TeamVocabulary.load(os.path.join(self.path, VOCABULARY_FILE))
+        self._index_stat = index_stat
+
+    def _write_synced(self, path, data):
+        """
+        Writes bytes to a file through a temporary file that is synced, then moved into place, so the file is never partly written.
+        """
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    def _sync_dir(self):
+        # the directory is synced so the renames survive a crash
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.path, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _save_index(self):
+        self._write_synced(os.path.join(self.path, VOCABULARY_FILE), json.dumps(self.vocabulary.names).encode())
+        self._write_synced(self._index_file, json.dumps({'version': ARCHIVE_VERSION, 'generation': self.generation,
+                                                         'data_file': self._data_file_name, 'blocks': self.blocks}).encode())
+        self._sync_dir()
+        stat = os.stat(self._index_file)
+        self._index_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _block(self, league, season):
+        """
+        Returns the index entry of the latest block of a (league, season), reloading the index if it has been replaced.
+
+        Raises:
+            KeyError: if the season is not in the archive
+        """
+        self._refresh()
+        for block in reversed(self.blocks):
+            if block['league'] == league and block['season'] == season:
+                return block
+        raise KeyError(f"{' '.join(part for part in [season, league] if part)} is not in the rating archive")
+
+    def _data(self):
+        """
+        Returns the whole data file as a memory-mapped array of ratings, mapped again only when blocks have been appended
+        or the archive has been compacted.
+        """
+        size = os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0
+        if size == 0:
+            return np.empty(0, dtype=RATING_DTYPE)
+        if self._mmap is None or self._mmap_file != self.data_file or size != self._mmap_size:
+            self._mmap = np.memmap(self.data_file, dtype=RATING_DTYPE, mode='r')
+            self._mmap_file, self._mmap_size = self.data_file, size
+        return self._mmap
+
+    def append(self, league, season, snapshots):
+        """
+        Appends the weekly ratings of a season, superseding the block already in the archive for it, if any.
+
+        Args:
+            league (str): the league of the season, '' for the default league
+            season (str): the season
+            snapshots (pd.DataFrame): the weeks x teams matrix of ratings of consecutive weeks, indexed by week,
+                e.g. `EloCalculator.calculate_weekly_snapshots()`
+
+        Raises:
+            ValueError: if the weeks are not consecutive
+        """
+        weeks = np.asarray(snapshots.index, dtype=np.int64)
+        if len(weeks) and (np.diff(weeks) != 1).any():
+            raise ValueError('Only the ratings of consecutive weeks can be archived')
+        self._refresh()
+        team_ids = self.vocabulary.intern(np.asarray(snapshots.columns, dtype=object))
+        ratings = np.ascontiguousarray(snapshots.to_numpy(dtype=np.float64), dtype=RATING_DTYPE)
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.data_file, 'ab') as f:
+            offset = f.tell()
+            f.write(ratings.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.blocks.append({'league': league, 'season': season, 'offset': offset, 'first_week': int(weeks[0]) if len(weeks) else 0,
+                            'nb_weeks': len(weeks), 'team_ids': team_ids.tolist()})
+        self._save_index()
+
+    def seasons(self):
+        """
+        Returns the (league, season) pairs in the archive, with their 'first_week', 'nb_weeks' and 'nb_teams'.
+        """
+        self._refresh()
+        latest = {(block['league'], block['season']): block for block in self.blocks}
+        return pd.DataFrame([{'league': league, 'season': season, 'first_week': block['first_week'], 'nb_weeks': block['nb_weeks'],
+                              'nb_teams': len(block['team_ids'])} for (league, season), block in latest.items()],
+                            columns=['league', 'season', 'first_week', 'nb_weeks', 'nb_teams'])
+
+    def read(self, league, season, weeks=None):
+        """
+        Returns the ratings of a season as a read-only weeks x teams view of the memory-mapped archive, the columns being
+        in the order of `teams(league, season)`.
+
+        Args:
+            weeks (int or slice, optional): a week, or a slice of weeks (e.g. slice(10, 20) for weeks 10 to 19), to return
+                only those rows, still as a view. Defaults to all the weeks.
+
+        Raises:
+            KeyError: if the season is not in the archive, or the week is not archived for the season
+        """
+        block = self._block(league, season)
+        nb_teams = len(block['team_ids'])
+        start = block['offset'] // RATING_DTYPE.itemsize
+        ratings = self._data()[start:start + block['nb_weeks'] * nb_teams].reshape(block['nb_weeks'], nb_teams)
+        if weeks is None:
+            return ratings
+        first_week = block['first_week']
+        if isinstance(weeks, slice):
+            start = None if weeks.start is None else max(weeks.start - first_week, 0)
+            stop = None if weeks.stop is None else max(weeks.stop - first_week, 0)
+            return ratings[start:stop:weeks.step]
+        if not first_week <= weeks < first_week + block['nb_weeks']:
+            raise KeyError(f'Week {weeks} is not in the rating archive for {season}')
+        return ratings[weeks - first_week]
+
+    def teams(self, league, season):
+        """
+        Returns the names of the teams of a season, in the order of the columns returned by `read`.
+        """
+        return self.vocabulary.names_of(np.asarray(self._block(league, season)['team_ids'], dtype=np.int64))
+
+    def team_ratings(self, league, season, team):
+        """
+        Returns the ratings of a team over the weeks of a season, as a view of the memory-mapped archive.
+
+        Raises:
+            KeyError: if the season or the team is not in the archive
+        """
+        team_ids = self._block(league, season)['team_ids']
+        team_id = int(self.vocabulary.ids_of([team])[0]) if team in self.vocabulary else None
+        if team_id not in team_ids:
+            raise KeyError(f'{team} is not in the rating archive for {season}')
+        return self.read(league, season)[:, team_ids.index(team_id)]
+
+    def week_table(self, league, season, week):
+        """
+        Returns the ratings at the end of a week as a DataFrame of 'Team' and 'Rating', in the format of the week-N.csv files.
+        """
+        return pd.DataFrame({'Team': self.teams(league, season), 'Rating': self.read(league, season, week)})
+
+    def snapshots(self, league, season):
+        """
+        Returns the ratings of a season as a weeks x teams DataFrame indexed by week, in the format of
+        `EloCalculator.calculate_weekly_snapshots`.
+        """
+        block = self._block(league, season)
+        weeks = pd.RangeIndex(block['first_week'], block['first_week'] + block['nb_weeks'], name='Week')
+        return pd.DataFrame(self.read(league, season), index=weeks, columns=self.teams(league, season), copy=False)
+
+    def compact(self):
+        """
+        Rewrites the archive with only the latest block of each season, dropping the superseded blocks. The blocks are written
+        to the data file of the next generation, which is synced before the index is replaced to point at it, and the data file
+        of the previous generation is only deleted after that. A crash before the index is replaced leaves the archive unchanged,
+        and a crash after it leaves the compacted archive with an unused data file, deleted by the next compaction.
+        """
+        self._refresh()
+        os.makedirs(self.path, exist_ok=True)
+        latest = {(block['league'], block['season']): block for block in self.blocks}
+        data = self._data()
+        generation = self.generation + 1
+        data_file_name = DATA_FILE_PATTERN.format(generation=generation)
+        blocks, offset = [], 0
+        with open(os.path.join(self.path, data_file_name), 'wb') as f:
+            for block in latest.values():
+                start = block['offset'] // RATING_DTYPE.itemsize
+                ratings = data[start:start + block['nb_weeks'] * len(block['team_ids'])]
+                f.write(ratings.tobytes())
+                blocks.append({**block, 'offset': offset})
+                offset += ratings.nbytes
+            f.flush()
+            os.fsync(f.fileno())
+        self.blocks, self.generation, self._data_file_name = blocks, generation, data_file_name
+        self._save_index()
+        # the old mapping is released before the data files of the previous generations are deleted
+        self._mmap, self._mmap_file, self._mmap_size = None, None, 0
+        del data
+        for old_data_file in glob.glob(os.path.join(self.path, 'ratings*.bin')):
+            if os.path.basename(old_data_file) != data_file_name:
+                os.remove(old_data_file)
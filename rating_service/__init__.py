@@ -0,0 +1,3 @@
+from rating_service.lru_cache import LRUCache
+from rating_service.rating_service import RatingService
+from rating_service.http_server import RatingRequestHandler, serve
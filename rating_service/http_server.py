@@ -0,0 +1,66 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from logger import Logger
+
+# path: (RatingService method, required parameters, optional parameters)
+ROUTES = {
+    '/seasons': ('season_info', [], []),
+    '/rating': ('rating', ['season', 'team'], ['timestamp', 'week']),
+    '/table': ('table', ['season'], ['timestamp', 'week']),
+    '/range': ('rating_range', ['season', 'team', 'start', 'end'], []),
+    '/head-to-head': ('head_to_head', ['season', 'home_team', 'away_team'], ['timestamp']),
+}
+
+
+class RatingRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests on the routes in ROUTES with the JSON result of the RatingService query, e.g.
+    `/table?season=19-20&week=10` or `/rating?season=19-20&team=Arsenal&timestamp=1577836800`.
+    Errors are answered with status 400 (404 for an unknown route) and a JSON body with an 'error' key.
+    The service is set on the server, see `serve`.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/cache':
+            return self._send(200, {'data': self.server.service.cache.stats()})
+        if url.path not in ROUTES:
+            return self._send(404, {'error': f'Unknown route: {url.path}. Routes: {sorted(ROUTES)}'})
+        method, required, optional = ROUTES[url.path]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        missing = [name for name in required if name not in query]
+        if missing:
+            return self._send(400, {'error': f'Missing parameters: {missing}'})
+        unknown = [name for name in query if name not in required + optional]
+        if unknown:
+            return self._send(400, {'error': f'Unknown parameters: {unknown}'})
+        result = getattr(self.server.service, method)(**query)
+        self._send(400 if 'error' in result else 200, result)
+
+    def _send(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        Logger().logger.debug('%s - ' + format, self.address_string(), *args)
+
+
+def serve(service, host='127.0.0.1', port=8000):
+    """
+    Returns a threaded HTTP server answering rating queries with a RatingService, one thread per request.
+    Call `serve_forever()` on it to start serving, and `shutdown()` to stop.
+
+    Args:
+        service (RatingService): the service answering the queries
+        host (str): the address to listen on, the local host by default
+        port (int): the port to listen on, or 0 for any free port (see `server.server_address`)
+    """
+    server = ThreadingHTTPServer((host, port), RatingRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
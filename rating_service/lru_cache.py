@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+
+# marker for a missing cache entry, so None can be cached
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded cache that evicts the least recently used entry when it is full.
+
+    Attributes:
+        maxsize (int): The maximum number of entries. A maxsize of 0 disables the cache.
+        hits (int): The number of lookups that found an entry.
+        misses (int): The number of lookups that did not find an entry.
+
+    Methods:
+        get(key, default=None): Returns the entry of a key and marks it as the most recently used, or `default` if there is none.
+        put(key, value): Adds or replaces the entry of a key, evicting the least recently used entry if the cache is full.
+        get_or_compute(key, compute): Returns the entry of a key, computing and adding it if there is none.
+        clear(): Removes all the entries.
+        stats() -> dict: Returns the size, maxsize, hits and misses of the cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 0:
+            raise ValueError('The size of the cache cannot be negative')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the entry of a key, or computes it with `compute()` and adds it. The value is computed outside the lock,
+        so concurrent lookups of a missing key may compute it more than once, but never block each other.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
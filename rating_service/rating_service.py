@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+from error_handler import ErrorHandler
+from logger import Logger
+from elo_ratings_calculator import EloCalculator
+from .lru_cache import LRUCache
+
+
+class _SeasonIndex:
+    """
+    The indexes of one season: the RatingHistory time index, the column of each team in it, and the positions of the matches
+    between each pair of teams.
+    """
+
+    def __init__(self, elo_calculator):
+        self.history = elo_calculator.rating_history()
+        self.home_advantage = elo_calculator.home_advantage
+        store = elo_calculator.match_store()
+        _, self.home_idx, self.away_idx, self.home_goals, self.away_goals = store.encode()
+        self.team_columns = {team: column for column, team in enumerate(self.history.teams.tolist())}
+        # the positions of the matches of each pair of teams, whichever team is at home
+        pairs = np.minimum(self.home_idx, self.away_idx) * len(self.team_columns) + np.maximum(self.home_idx, self.away_idx)
+        order = np.argsort(pairs, kind='stable')
+        unique_pairs, starts = np.unique(pairs[order], return_index=True)
+        self.meetings = dict(zip(unique_pairs.tolist(), np.split(order, starts[1:])))
+
+    def pair_key(self, home_column, away_column):
+        return min(home_column, away_column) * len(self.team_columns) + max(home_column, away_column)
+
+
+class RatingService:
+    """
+    Answers point-in-time queries on the Elo ratings of one or more seasons: the rating of a team or the ratings table as of
+    a kick-off time or matchweek, the ratings of a team over a date range, and head-to-head comparisons. The rating history
+    of each season is computed once when the season is loaded, see `RatingHistory`, so a query is a binary search on the
+    kick-off times and a read of the history, never a replay. Query results are kept in an LRU cache keyed by the number
+    of matches played at the queried time, so all the times between two kick-offs share one entry.
+
+    The service only reads its indexes once they are loaded, so it can be queried from several threads, e.g. by the HTTP
+    endpoint in `rating_service.http_server`.
+
+    Each query returns a dictionary with a 'data' key holding the JSON-serialisable result, or an 'error' key holding the
+    error message. The results are shared with the cache, so they should not be modified.
+
+    Attributes:
+        seasons (dict): The indexes of each loaded season, keyed by season name.
+        cache (LRUCache): The cache of query results.
+
+    Methods:
+        add_season(season: str, elo_calculator: EloCalculator): Indexes the ratings of a season from an EloCalculator.
+        season_info() -> Dict[str, list]: Returns the loaded seasons, with their number of matches and matchweeks.
+        rating(season, team, timestamp=None, week=None) -> Dict: Returns the rating of a team at a point in time.
+        table(season, timestamp=None, week=None) -> Dict: Returns the ratings table at a point in time.
+        rating_range(season, team, start, end) -> Dict: Returns the rating of a team after each kick-off time in a date range.
+        head_to_head(season, home_team, away_team, timestamp=None) -> Dict: Returns the ratings of two teams, the expected score
+            of the home team and their meetings up to a point in time.
+    """
+
+    def __init__(self, data_source='csv', files_or_queries=None, cache_size=1024):
+        """
+        Args:
+            data_source (str): 'csv' or 'db', the data source of the processed match results, see EloCalculator
+            files_or_queries (dict, optional): the processed match results file or query of each season, keyed by season name
+            cache_size (int): the maximum number of query results kept in the cache
+        """
+        self.error_handler = ErrorHandler(log_destination='file')
+        self.logger = Logger().logger
+        self.cache = LRUCache(cache_size)
+        self.seasons = {}
+        for season, file_or_query in (files_or_queries or {}).items():
+            elo_calculator = EloCalculator(data_source, file_or_query)
+            if not isinstance(elo_calculator.data, pd.DataFrame) or elo_calculator.data.empty:
+                self.error_handler.log_error(f'No match data for season {season} in {file_or_query}. The season is not loaded.')
+                continue
+            self.add_season(season, elo_calculator)
+
+    def add_season(self, season, elo_calculator):
+        """
+        Indexes the ratings of a season from an EloCalculator holding its match data, replacing the season if it is loaded.
+        """
+        try:
+            index = _SeasonIndex(elo_calculator)
+        except (KeyError, ValueError) as e:
+            self.error_handler.log_error(f'Error when indexing the ratings of season {season}: {e}')
+            return
+        self.seasons[season] = index
+        self.cache.clear()
+        self.logger.info(f'Ratings of season {season} have been indexed ({index.history.nb_matches} matches)')
+
+    def season_info(self):
+        return {'data': [{'season': season, 'matches': index.history.nb_matches, 'matchweeks': index.history.nb_matchweeks,
+                          'teams': sorted(index.team_columns)} for season, index in self.seasons.items()]}
+
+    def _season(self, season):
+        if season not in self.seasons:
+            raise LookupError(f'Unknown season: {season}')
+        return self.seasons[season]
+
+    def _team_column(self, index, team):
+        if team not in index.team_columns:
+            raise LookupError(f'Unknown team: {team}')
+        return index.team_columns[team]
+
+    def _position(self, index, timestamp, week):
+        """
+        Returns the number of matches played at a point in time: the end of matchweek `week`, the kick-off time `timestamp`,
+        or the end of the season if neither is given.
+        """
+        if week is not None:
+            return index.history.matchweek_end(int(week))
+        if timestamp is not None:
+            return index.history.matches_before(int(timestamp))
+        return index.history.nb_matches
+
+    def _query(self, compute):
+        try:
+            return {'data': compute()}
+        except (LookupError, ValueError, TypeError) as e:
+            return {'error': str(e.args[0]) if e.args else str(e)}
+
+    def rating(self, season, team, timestamp=None, week=None):
+        """
+        Returns the rating of a team after the matches that kicked off at or before `timestamp`, at the end of matchweek `week`,
+        or at the end of the season if neither is given.
+        """
+        def compute():
+            index = self._season(season)
+            column = self._team_column(index, team)
+            position = self._position(index, timestamp, week)
+            return self.cache.get_or_compute(('rating', season, column, position), lambda: {
+                'season': season, 'team': team, 'matches': position, 'rating': float(index.history.history[position, column])})
+        return self._query(compute)
+
+    def table(self, season, timestamp=None, week=None):
+        """
+        Returns the ratings table after the matches that kicked off at or before `timestamp`, at the end of matchweek `week`,
+        or at the end of the season if neither is given, as a list of {'Rank', 'Team', 'Rating'} from the highest rating.
+        """
+        def compute():
+            index = self._season(season)
+            position = self._position(index, timestamp, week)
+
+            def build_table():
+                ratings = index.history.history[position]
+                order = np.argsort(-ratings, kind='stable')
+                teams = index.history.teams[order].tolist()
+                return {'season': season, 'matches': position,
+                        'table': [{'Rank': rank, 'Team': team, 'Rating': rating}
+                                  for rank, (team, rating) in enumerate(zip(teams, ratings[order].tolist()), 1)]}
+            return self.cache.get_or_compute(('table', season, position), build_table)
+        return self._query(compute)
+
+    def rating_range(self, season, team, start, end):
+        """
+        Returns the rating of a team after each kick-off time from `start` to `end` (included), as a list of
+        {'timestamp', 'rating'}.
+        """
+        def compute():
+            index = self._season(season)
+            column = self._team_column(index, team)
+            history = index.history
+            first = int(np.searchsorted(history.timestamps, int(start), side='left'))
+            last = history.matches_before(int(end))
+
+            def build_range():
+                kick_offs = np.unique(history.timestamps[first:last])
+                rows = np.searchsorted(history.timestamps, kick_offs, side='right')
+                return {'season': season, 'team': team,
+                        'ratings': [{'timestamp': timestamp, 'rating': rating}
+                                    for timestamp, rating in zip(kick_offs.tolist(), history.history[rows, column].tolist())]}
+            return self.cache.get_or_compute(('range', season, column, first, last), build_range)
+        return self._query(compute)
+
+    def head_to_head(self, season, home_team, away_team, timestamp=None):
+        """
+        Returns the ratings of two teams after the matches that kicked off at or before `timestamp` (or at the end of the
+        season), the expected score of `home_team` at home against `away_team`, and their meetings up to that time with the
+        ratings of both teams before each meeting.
+        """
+        def compute():
+            index = self._season(season)
+            home_column = self._team_column(index, home_team)
+            away_column = self._team_column(index, away_team)
+            position = self._position(index, timestamp, None)
+
+            def build_head_to_head():
+                history = index.history.history
+                home_rating, away_rating = float(history[position, home_column]), float(history[position, away_column])
+                expected_home = 1 / (1 + 10 ** ((away_rating - (home_rating + index.home_advantage)) / 400))
+                positions = index.meetings.get(index.pair_key(home_column, away_column), np.empty(0, dtype=np.int64))
+                meetings = [{'timestamp': int(index.history.timestamps[i]),
+                             'home': index.history.teams[index.home_idx[i]], 'away': index.history.teams[index.away_idx[i]],
+                             'home_goals': int(index.home_goals[i]), 'away_goals': int(index.away_goals[i]),
+                             'home_rating_before': float(history[i, index.home_idx[i]]),
+                             'away_rating_before': float(history[i, index.away_idx[i]])}
+                            for i in positions[positions < position].tolist()]
+                return {'season': season, 'matches': position, 'home_team': home_team, 'away_team': away_team,
+                        'home_rating': home_rating, 'away_rating': away_rating, 'expected_home': expected_home, 'meetings': meetings}
+            return self.cache.get_or_compute(('head_to_head', season, home_column, away_column, position), build_head_to_head)
+        return self._query(compute)
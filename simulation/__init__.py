@@ -0,0 +1 @@
+from simulation.season_simulator import SeasonSimulator
@@ -0,0 +1,199 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from logger import Logger, timed
+from error_handler import ErrorHandler
+
+# points for a win and a draw
+WIN_POINTS, DRAW_POINTS = 3, 1
+# draw rate used when the draw rate cannot be estimated from the played matches
+DEFAULT_DRAW_RATE = 0.25
+# number of simulated seasons per shard. The shards are seeded independently, so the results do not depend on the number of workers.
+SHARD_SIZE = 10000
+
+
+def outcome_probabilities(expected_home, draw_rate):
+    """
+    Returns the home win, draw and away win probabilities of each fixture: the draw has probability `draw_rate`, and the win
+    probabilities are set so the expected score of the home team (win + draw / 2) is the Elo expected score, within [0, 1].
+    """
+    home_win = np.clip(expected_home - draw_rate / 2, 0, 1 - draw_rate)
+    return np.column_stack([home_win, np.full(len(home_win), draw_rate), 1 - draw_rate - home_win])
+
+
+def _simulate_shard(seed, nb_simulations, probabilities, home_idx, away_idx, points, goal_difference, max_points):
+    """
+    Simulates `nb_simulations` seasons from the remaining fixtures. Runs in a worker process.
+
+    Returns:
+        tuple: the teams x positions counts of the final positions, and the teams x (max_points + 1) counts of the final points
+    """
+    rng = np.random.default_rng(seed)
+    n_teams = len(points)
+    draws = rng.random((nb_simulations, len(home_idx)))
+    home_wins = draws < probabilities[:, 0]
+    away_wins = draws >= probabilities[:, 0] + probabilities[:, 1]
+    home_points = np.where(home_wins, WIN_POINTS, np.where(away_wins, 0, DRAW_POINTS)).astype(np.float64)
+    away_points = np.where(away_wins, WIN_POINTS, np.where(home_wins, 0, DRAW_POINTS)).astype(np.float64)
+    # the points of each team, added up with one matrix product per side
+    home_teams = np.zeros((len(home_idx), n_teams))
+    home_teams[np.arange(len(home_idx)), home_idx] = 1
+    away_teams = np.zeros((len(away_idx), n_teams))
+    away_teams[np.arange(len(away_idx)), away_idx] = 1
+    final_points = (points + home_points @ home_teams + away_points @ away_teams).round().astype(np.int64)
+    # rank by points, then by the goal difference of the played matches, then at random. The goal difference rank is dense
+    # (0 to n_teams - 1, equal for equal goal differences), so teams level on both are only separated by the random term
+    goal_difference_rank = np.unique(goal_difference, return_inverse=True)[1].reshape(n_teams)
+    keys = final_points * (n_teams + 1) + goal_difference_rank + rng.random((nb_simulations, n_teams))
+    order = np.argsort(-keys, axis=1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(n_teams), axis=1)
+    teams = np.broadcast_to(np.arange(n_teams), positions.shape)
+    position_counts = np.bincount((teams * n_teams + positions).ravel(), minlength=n_teams * n_teams).reshape(n_teams, n_teams)
+    points_counts = np.bincount((teams * (max_points + 1) + final_points).ravel(),
+                                minlength=n_teams * (max_points + 1)).reshape(n_teams, max_points + 1)
+    return position_counts, points_counts
+
+
+class SeasonSimulator:
+    """
+    This class projects the rest of a season with Monte Carlo simulation. The ratings and the table at the end of a matchweek
+    are read from an EloCalculator, see `RatingHistory`, and the fixtures left in a double round robin are simulated with the
+    Elo expected scores of those ratings and the draw rate of the league. Every simulated season is one row of NumPy arrays,
+    and the simulations are split into shards of SHARD_SIZE seasons run across a process pool, each seeded from
+    `np.random.SeedSequence(seed)`, so a seed always gives the same results whatever the number of workers.
+
+    The ratings are not updated during a simulated season. Ties on points are broken by the goal difference of the played
+    matches, then at random.
+
+    Attributes:
+        elo_calculator (EloCalculator): The EloCalculator holding the matches of the season.
+        nb_simulations (int): The number of simulated seasons.
+        seed (int): The seed of the simulations.
+        max_workers (int): The number of worker processes. If 1, the simulations run in the current process.
+        draw_rate (float): The probability of a draw. If None, the draw rate of the played matches.
+        top (int): The number of places counted in the top probability, e.g. 4 for the Champions League places.
+        relegated (int): The number of relegation places.
+
+    Methods:
+        standings(week: int = None) -> pd.DataFrame: Returns the table and the ratings at the end of a matchweek.
+        remaining_fixtures(week: int = None) -> pd.DataFrame: Returns the fixtures of the double round robin left after a matchweek.
+        simulate(week: int = None, fixtures: pd.DataFrame = None) -> Dict[str, pd.DataFrame]: Simulates the rest of the season.
+    """
+
+    def __init__(self, elo_calculator, nb_simulations=100000, seed=0, max_workers=None, draw_rate=None, top=4, relegated=3):
+        self.logger = Logger().logger
+        self.error_handler = ErrorHandler(log_destination='file')
+        self.elo_calculator = elo_calculator
+        self.nb_simulations = nb_simulations
+        self.seed = seed
+        self.max_workers = max_workers
+        self.draw_rate = draw_rate
+        self.top = top
+        self.relegated = relegated
+
+    def _played_matches(self, week):
+        history = self.elo_calculator.rating_history()
+        nb_played = history.nb_matches if week is None else history.matchweek_end(week)
+        return history, self.elo_calculator.data.iloc[:nb_played]
+
+    def standings(self, week=None):
+        """
+        Returns the table at the end of a matchweek (the end of the played matches if not specified): the 'Rating', 'Played',
+        'Points' and 'GoalDifference' of each team, indexed by team.
+
+        Raises:
+            ValueError: if the matchweek is after the last matchweek played
+        """
+        history, played = self._played_matches(week)
+        teams = pd.Index(history.teams, name='Team')
+        home_goals, away_goals = played['home-result'].to_numpy(), played['away-result'].to_numpy()
+        home_points = np.where(home_goals > away_goals, WIN_POINTS, np.where(home_goals < away_goals, 0, DRAW_POINTS))
+        away_points = np.where(away_goals > home_goals, WIN_POINTS, np.where(home_goals > away_goals, 0, DRAW_POINTS))
+        home_idx, away_idx = teams.get_indexer(played['home-name']), teams.get_indexer(played['away-name'])
+        n_teams = len(teams)
+        return pd.DataFrame({
+            'Rating': history.after_matches(len(played)).to_numpy(),
+            'Played': np.bincount(home_idx, minlength=n_teams) + np.bincount(away_idx, minlength=n_teams),
+            'Points': np.bincount(home_idx, home_points, n_teams) + np.bincount(away_idx, away_points, n_teams),
+            'GoalDifference': np.bincount(home_idx, home_goals - away_goals, n_teams) + np.bincount(away_idx, away_goals - home_goals, n_teams),
+        }, index=teams).astype({'Points': np.int64, 'GoalDifference': np.int64})
+
+    def remaining_fixtures(self, week=None):
+        """
+        Returns the fixtures of the double round robin (every team plays every other team at home once) that are not played
+        by the end of a matchweek, as a DataFrame of 'home-name' and 'away-name'.
+        """
+        history, played = self._played_matches(week)
+        teams = history.teams
+        home, away = np.meshgrid(np.arange(len(teams)), np.arange(len(teams)), indexing='ij')
+        fixtures = pd.MultiIndex.from_arrays([teams[home[home != away]], teams[away[home != away]]], names=['home-name', 'away-name'])
+        played_fixtures = pd.MultiIndex.from_arrays([played['home-name'], played['away-name']])
+        return fixtures[~fixtures.isin(played_fixtures)].to_frame(index=False)
+
+    @timed('simulation')
+    def simulate(self, week=None, fixtures=None):
+        """
+        Simulates the rest of the season from the end of a matchweek.
+
+        Args:
+            week (int): the matchweek to simulate from. If not specified, from the end of the played matches.
+            fixtures (pd.DataFrame): the 'home-name' and 'away-name' of the fixtures left. If not specified, the fixtures left
+                in a double round robin, see `remaining_fixtures`.
+
+        Returns:
+            dict: three DataFrames indexed by team, from the highest expected points:
+                'summary': the current 'Rating', 'Played', 'Points' and 'GoalDifference', the 'ExpectedPoints', and the 'Title',
+                    'Top<top>' and 'Relegation' probabilities
+                'positions': the probability of each final position, in columns 1 to the number of teams
+                'points': the probability of each number of final points
+        """
+        if not isinstance(self.elo_calculator.data, pd.DataFrame) or self.elo_calculator.data.empty:
+            self.error_handler.log_error(f'No data to simulate the season from. Make sure to read in data first.')
+            return
+        try:
+            table = self.standings(week)
+            fixtures = self.remaining_fixtures(week) if fixtures is None else fixtures
+            home_idx = table.index.get_indexer(fixtures['home-name'])
+            away_idx = table.index.get_indexer(fixtures['away-name'])
+            if (home_idx < 0).any() or (away_idx < 0).any():
+                raise ValueError('The fixtures have teams that are not in the season')
+            _, played = self._played_matches(week)
+        except (KeyError, ValueError) as e:
+            self.error_handler.log_error(f'Error when preparing the season simulation: {e}')
+            return
+
+        draw_rate = self.draw_rate
+        if draw_rate is None:
+            draw_rate = float((played['home-result'] == played['away-result']).mean()) if len(played) else DEFAULT_DRAW_RATE
+        ratings = table['Rating'].to_numpy()
+        expected_home = 1 / (1 + 10 ** ((ratings[away_idx] - (ratings[home_idx] + self.elo_calculator.home_advantage)) / 400))
+        probabilities = outcome_probabilities(expected_home, draw_rate)
+
+        n_teams = len(table)
+        points = table['Points'].to_numpy()
+        games_left = np.bincount(home_idx, minlength=n_teams) + np.bincount(away_idx, minlength=n_teams)
+        max_points = int((points + WIN_POINTS * games_left).max())
+        shard_sizes = [SHARD_SIZE] * (self.nb_simulations // SHARD_SIZE) + ([self.nb_simulations % SHARD_SIZE] if self.nb_simulations % SHARD_SIZE else [])
+        seeds = np.random.SeedSequence(self.seed).spawn(len(shard_sizes))
+        arguments = [(seed, size, probabilities, home_idx, away_idx, points, table['GoalDifference'].to_numpy(), max_points)
+                     for seed, size in zip(seeds, shard_sizes)]
+        if self.max_workers == 1 or len(arguments) == 1:
+            results = [_simulate_shard(*shard_arguments) for shard_arguments in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers or os.cpu_count() or 1, len(arguments))) as executor:
+                results = list(executor.map(_simulate_shard, *zip(*arguments)))
+        position_counts = sum(result[0] for result in results)
+        points_counts = sum(result[1] for result in results)
+
+        positions = pd.DataFrame(position_counts / self.nb_simulations, index=table.index, columns=pd.RangeIndex(1, n_teams + 1, name='Position'))
+        points_distribution = pd.DataFrame(points_counts / self.nb_simulations, index=table.index, columns=pd.RangeIndex(max_points + 1, name='Points'))
+        summary = table.assign(
+            ExpectedPoints=points_distribution.to_numpy() @ np.arange(max_points + 1),
+            Title=positions[1].to_numpy(),
+            **{f'Top{self.top}': positions.iloc[:, :self.top].sum(axis=1).to_numpy(),
+               'Relegation': positions.iloc[:, n_teams - self.relegated:].sum(axis=1).to_numpy()})
+        order = summary['ExpectedPoints'].sort_values(ascending=False, kind='stable').index
+        self.logger.info(f'{self.nb_simulations} seasons have been simulated from {len(played)} played matches and {len(fixtures)} fixtures left.')
+        return {'summary': summary.loc[order], 'positions': positions.loc[order], 'points': points_distribution.loc[order]}